@@ -0,0 +1,164 @@
+"""Hot paths timed by the benchmark runner.
+
+Every case returns the seconds of one repetition (per call for the pure
+ones). Cases that write run in a session whose commits land in a SAVEPOINT
+of an outer transaction that is rolled back afterwards, so every
+repetition sees the same data; in-process caches are cleared where the
+case is meant to be cold.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, timedelta
+from time import perf_counter
+from typing import Callable, Iterator
+
+from sqlalchemy import Engine, select
+from sqlalchemy.orm import Session
+
+from app.models import Booking, BookingStatus, Elevator
+from app.notification_service.logic import process_notifications
+from app.notification_service.scheduler import ReminderScheduler
+from app.queue_engine import queue_engine
+from app.queue_logic import recalc_queue
+from app.slot_cache import available_slots, slot_cache
+from app.utils.csv_export import export_query, write_bookings_csv
+from app.utils.time_utils import build_daily_slots, now_tz
+
+# вызовов чистой функции на одно повторение
+PURE_CALLS = 1000
+
+
+@dataclass
+class Context:
+    engine: Engine
+    elevator_id: int
+    today: date
+    first_day: date
+
+
+@contextmanager
+def sandbox(engine: Engine) -> Iterator[Session]:
+    """Session whose commits are undone when the block exits."""
+    with engine.connect() as conn:
+        outer = conn.begin()
+        session = Session(bind=conn, join_transaction_mode="create_savepoint", autoflush=False)
+        try:
+            yield session
+        finally:
+            session.close()
+            outer.rollback()
+
+
+class _Sink:
+    """Outbound queue stand-in: process_notifications only enqueues."""
+
+    def __init__(self) -> None:
+        self.messages: list[tuple[int, str]] = []
+
+    def enqueue(self, chat_id: int, text: str, **kwargs) -> None:
+        self.messages.append((chat_id, text))
+
+
+def bench_build_daily_slots(ctx: Context) -> float:
+    with Session(ctx.engine) as session:
+        elevator = session.get(Elevator, ctx.elevator_id)
+    args = (elevator.work_day_start, elevator.work_day_end, elevator.bookable_slots_per_day)
+    started = perf_counter()
+    for _ in range(PURE_CALLS):
+        build_daily_slots(*args)
+    return (perf_counter() - started) / PURE_CALLS
+
+
+def _bench_available_slots(ctx: Context, warm: bool) -> float:
+    slot_cache.clear()
+    with Session(ctx.engine) as session:
+        elevator = session.get(Elevator, ctx.elevator_id)
+        if warm:
+            available_slots(session, elevator, ctx.today)
+        started = perf_counter()
+        available_slots(session, elevator, ctx.today)
+        return perf_counter() - started
+
+
+def bench_available_slots_cold(ctx: Context) -> float:
+    return _bench_available_slots(ctx, warm=False)
+
+
+def bench_available_slots_warm(ctx: Context) -> float:
+    return _bench_available_slots(ctx, warm=True)
+
+
+def bench_recalc_queue_cold(ctx: Context) -> float:
+    queue_engine.clear()
+    with sandbox(ctx.engine) as session:
+        started = perf_counter()
+        recalc_queue(session, ctx.elevator_id, ctx.today)
+        return perf_counter() - started
+
+
+def bench_recalc_queue_arrival(ctx: Context) -> float:
+    """Incremental recalculation after one truck arrives, as in the dispatcher's handler."""
+    queue_engine.clear()
+    with sandbox(ctx.engine) as session:
+        recalc_queue(session, ctx.elevator_id, ctx.today)
+        session.commit()
+        booking = session.scalars(
+            select(Booking)
+            .where(
+                Booking.elevator_id == ctx.elevator_id,
+                Booking.date == ctx.today,
+                Booking.status == BookingStatus.CONFIRMED,
+            )
+            .order_by(Booking.queue_index)
+            .limit(1)
+        ).one()
+        started = perf_counter()
+        booking.arrived_at = now_tz()
+        booking.status = BookingStatus.ARRIVED
+        recalc_queue(session, ctx.elevator_id, ctx.today)
+        return perf_counter() - started
+
+
+def bench_process_notifications(ctx: Context) -> float:
+    async def timed(session: Session, scheduler: ReminderScheduler) -> float:
+        started = perf_counter()
+        await process_notifications(session, _Sink(), scheduler)
+        return perf_counter() - started
+
+    with sandbox(ctx.engine) as session:
+        scheduler = ReminderScheduler()
+        scheduler.sync(session)
+        return asyncio.run(timed(session, scheduler))
+
+
+def _bench_csv(ctx: Context, date_from: date) -> float:
+    with Session(ctx.engine) as session, open(os.devnull, "wb") as out:
+        stmt = export_query(date_from, ctx.today)
+        started = perf_counter()
+        write_bookings_csv(session, stmt, out)
+        return perf_counter() - started
+
+
+def bench_bookings_csv_month(ctx: Context) -> float:
+    return _bench_csv(ctx, ctx.today - timedelta(days=30))
+
+
+def bench_bookings_csv_all(ctx: Context) -> float:
+    return _bench_csv(ctx, ctx.first_day)
+
+
+CASES: dict[str, tuple[Callable[[Context], float], int]] = {
+    # имя -> (функция, вызовов на повторение)
+    "build_daily_slots": (bench_build_daily_slots, PURE_CALLS),
+    "available_slots.cold": (bench_available_slots_cold, 1),
+    "available_slots.warm": (bench_available_slots_warm, 1),
+    "recalc_queue.cold": (bench_recalc_queue_cold, 1),
+    "recalc_queue.arrival": (bench_recalc_queue_arrival, 1),
+    "process_notifications": (bench_process_notifications, 1),
+    "bookings_csv.month": (bench_bookings_csv_month, 1),
+    "bookings_csv.all": (bench_bookings_csv_all, 1),
+}
@@ -0,0 +1,271 @@
+"""Seeded synthetic database for benchmarks.
+
+Bookings take random slots of every elevator over ``days`` days back from
+tomorrow; without ``days`` there are as many days as ``occupancy`` of the
+slots needs. Past bookings are unloaded (or cancelled, or no-shows) and
+have all reminders in the ledger; future ones have the reminders already
+due at generation time in the ledger and the next one in
+``reminder_schedule``, as if the notification service had been running.
+Rows are written with Core executemany, so the ORM hooks are bypassed and
+their tables (queue days, daily stats) are filled afterwards.
+"""
+from __future__ import annotations
+
+import json
+import math
+import random
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+
+from sqlalchemy import Engine, create_engine, event, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.db import Base, _setup_engine
+from app.hooks import install_session_hooks
+from app.migrations import migrate
+from app.models import Booking, BookingStatus, Driver, Elevator, Notification, QueueDay, ReminderSchedule
+from app.reminders import next_reminder, notif_type_for_offset, reminder_offsets
+from app.rollups import rebuild_daily_stats
+from app.utils.time_utils import build_daily_slots, combine_date_time, now_tz
+
+WORK_DAY = (time(6), time(22))
+CHUNK_ROWS = 20_000
+
+CANCEL_RATE = 0.05
+NO_SHOW_RATE = 0.03
+
+
+@dataclass
+class DatasetSpec:
+    bookings: int
+    elevators: int = 50
+    drivers: int = 5000
+    occupancy: float = 0.9
+    seed: int = 1
+    # дней броней (по завтрашний включительно); None — сколько нужно при заданной загрузке
+    days: int | None = None
+
+    def resolve_days(self, slots_per_day: int) -> int:
+        capacity = self.elevators * slots_per_day
+        days = self.days or math.ceil(self.bookings / (capacity * self.occupancy))
+        if self.bookings > days * capacity:
+            raise ValueError(f"{self.bookings} bookings do not fit into {days} day(s) of {capacity} slots")
+        return days
+
+    def filename(self, day: date) -> str:
+        # данные отсчитываются от даты генерации: на следующий день набор строится заново
+        days = f"-n{self.days}" if self.days else ""
+        return f"bench-{self.bookings}-e{self.elevators}-d{self.drivers}-s{self.seed}{days}-{day.isoformat()}.db"
+
+
+@dataclass
+class Dataset:
+    spec: DatasetSpec
+    path: Path
+    generated_at: datetime
+    days: int
+
+    def engine(self) -> Engine:
+        install_session_hooks()
+        return open_engine(self.path)
+
+
+def open_engine(path: Path) -> Engine:
+    """SQLite engine with the app's PRAGMAs whose sessions can commit into a SAVEPOINT."""
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    _setup_engine(engine)
+
+    # pysqlite сам открывает и закрывает транзакции и ломает SAVEPOINT — управляем BEGIN сами
+    @event.listens_for(engine, "connect")
+    def _autocommit_driver(dbapi_connection, connection_record) -> None:
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn) -> None:
+        conn.exec_driver_sql("BEGIN")
+
+    return engine
+
+
+def load_or_generate(spec: DatasetSpec, data_dir: Path, regenerate: bool = False) -> Dataset:
+    # неподходящие размеры отсекаются до того, как появится файл базы
+    spec.resolve_days(len(_day_slots()))
+    data_dir.mkdir(parents=True, exist_ok=True)
+    path = data_dir / spec.filename(date.today())
+    meta_path = path.with_suffix(".json")
+    if path.exists() and meta_path.exists() and not regenerate:
+        meta = json.loads(meta_path.read_text())
+        return Dataset(spec, path, datetime.fromisoformat(meta["generated_at"]), meta["days"])
+    for stale in (path, meta_path, path.with_name(path.name + "-wal"), path.with_name(path.name + "-shm")):
+        stale.unlink(missing_ok=True)
+    engine = open_engine(path)
+    try:
+        dataset = generate(engine, spec, path)
+    finally:
+        engine.dispose()
+    meta_path.write_text(
+        json.dumps({**asdict(spec), "generated_at": dataset.generated_at.isoformat(), "days": dataset.days}, indent=2)
+    )
+    return dataset
+
+
+def _day_slots() -> list:
+    return build_daily_slots(*WORK_DAY, 96)
+
+
+def _insert_chunks(conn, table, rows: list[dict]) -> None:
+    if rows:
+        conn.execute(insert(table), rows)
+        rows.clear()
+
+
+def generate(engine: Engine, spec: DatasetSpec, path: Path) -> Dataset:
+    rng = random.Random(spec.seed)
+    now = now_tz()
+    today = now.date()
+    offsets = reminder_offsets()
+    Base.metadata.create_all(engine)
+    migrate(engine)
+
+    slots = _day_slots()
+    days = spec.resolve_days(len(slots))
+    slot_minutes = int((datetime.combine(today, slots[0][1]) - datetime.combine(today, slots[0][0])).total_seconds() // 60)
+
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Elevator),
+            [
+                {
+                    "id": i,
+                    "name": f"Элеватор {i}",
+                    "work_day_start": WORK_DAY[0],
+                    "work_day_end": WORK_DAY[1],
+                    "bookable_slots_per_day": 96,
+                }
+                for i in range(1, spec.elevators + 1)
+            ],
+        )
+        conn.execute(
+            insert(Driver),
+            [
+                {
+                    "id": i,
+                    "telegram_user_id": 10_000_000 + i,
+                    "telegram_username": f"driver{i}" if rng.random() < 0.7 else None,
+                }
+                for i in range(1, spec.drivers + 1)
+            ],
+        )
+
+        bookings: list[dict] = []
+        ledger: list[dict] = []
+        schedule: list[dict] = []
+        per_day = spec.elevators * len(slots)
+        # занятые слоты выбираются из всех слотов всех дней: дней ровно days, броней ровно bookings
+        taken = sorted(rng.sample(range(days * per_day), spec.bookings))
+        # id убывают от последнего дня к первому: в базе они растут вместе со временем, как в жизни
+        booking_id = spec.bookings
+        elevator_day, queue_index = None, 0
+        for position in taken:
+            offset, rest = divmod(position, per_day)
+            elevator_id, slot = divmod(rest, len(slots))
+            elevator_id += 1
+            day = today + timedelta(days=1 - offset)
+            if (elevator_id, day) != elevator_day:
+                elevator_day, queue_index = (elevator_id, day), 0
+            slot_start = combine_date_time(day, slots[slot][0])
+            row = _booking(rng, booking_id, elevator_id, day, slot_start, slot_minutes, now, spec.drivers)
+            if row["status"] != BookingStatus.CANCELLED:
+                row["queue_index"] = queue_index
+                queue_index += 1
+                sent = [m for m in offsets if slot_start - timedelta(minutes=m) <= now]
+                ledger.extend(
+                    {
+                        "booking_id": booking_id,
+                        "notification_type": notif_type_for_offset(m),
+                        "sent_at": slot_start - timedelta(minutes=m),
+                    }
+                    for m in sent
+                )
+                due = next_reminder(slot_start, now, offsets, {notif_type_for_offset(m) for m in sent})
+                if due is not None and slot_start > now:
+                    schedule.append(
+                        {"booking_id": booking_id, "due_at": due[0], "notification_type": notif_type_for_offset(due[1])}
+                    )
+            bookings.append(row)
+            booking_id -= 1
+            if len(bookings) >= CHUNK_ROWS:
+                _insert_chunks(conn, Booking.__table__, bookings)
+            if len(ledger) >= CHUNK_ROWS:
+                _insert_chunks(conn, Notification.__table__, ledger)
+        queue_days = [
+            {
+                "elevator_id": elevator_id,
+                "date": today + timedelta(days=1 - offset),
+                "version": 1,
+                "recalculated_version": 1,
+            }
+            for offset in range(days)
+            for elevator_id in range(1, spec.elevators + 1)
+        ]
+        _insert_chunks(conn, Booking.__table__, bookings)
+        _insert_chunks(conn, Notification.__table__, ledger)
+        _insert_chunks(conn, ReminderSchedule.__table__, schedule)
+        _insert_chunks(conn, QueueDay.__table__, queue_days)
+        rebuild_daily_stats(conn)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    return Dataset(spec, path, now, days)
+
+
+def _booking(
+    rng: random.Random,
+    booking_id: int,
+    elevator_id: int,
+    day: date,
+    slot_start: datetime,
+    slot_minutes: int,
+    now: datetime,
+    drivers: int,
+) -> dict:
+    arrived_at = slot_start + timedelta(minutes=rng.randint(-20, 40))
+    unloaded_at = arrived_at + timedelta(minutes=rng.randint(20, 2 * slot_minutes))
+    row = {
+        "id": booking_id,
+        "driver_id": rng.randint(1, drivers),
+        "elevator_id": elevator_id,
+        "license_plate": f"{rng.choice('АВЕКМНОРСТУХ')}{rng.randint(0, 999):03d}{rng.choice('АВЕКМНОРСТУХ')}{rng.choice('АВЕКМНОРСТУХ')}",
+        "date": day,
+        "slot_start": slot_start,
+        "slot_end": slot_start + timedelta(minutes=slot_minutes),
+        "queue_index": 0,
+        "status": BookingStatus.CONFIRMED,
+        "created_at": slot_start - timedelta(days=rng.randint(1, 7), minutes=rng.randint(0, 24 * 60)),
+        "arrived_at": None,
+        "unloaded_at": None,
+        "cancelled_at": None,
+    }
+    chance = rng.random()
+    if chance < CANCEL_RATE:
+        row["status"] = BookingStatus.CANCELLED
+        row["cancelled_at"] = min(now, slot_start - timedelta(hours=rng.randint(1, 24)))
+    elif chance < CANCEL_RATE + NO_SHOW_RATE or arrived_at > now:
+        pass
+    elif unloaded_at > now:
+        row.update(status=BookingStatus.ARRIVED, arrived_at=arrived_at)
+    else:
+        row.update(status=BookingStatus.UNLOADED, arrived_at=arrived_at, unloaded_at=unloaded_at)
+    return row
+
+
+def sample_day(engine: Engine, day: date) -> tuple[int, int]:
+    """(elevator id, bookings) of the busiest elevator of a day."""
+    with Session(engine) as session:
+        return session.execute(
+            select(Booking.elevator_id, func.count())
+            .where(Booking.date == day, Booking.status != BookingStatus.CANCELLED)
+            .group_by(Booking.elevator_id)
+            .order_by(func.count().desc())
+            .limit(1)
+        ).one()
@@ -0,0 +1,175 @@
+"""Micro-benchmarks of the hot paths on seeded synthetic databases.
+
+    python -m app.benchmarks.main [--scales 10k,100k,1M] [--days 30] [--only recalc_queue] [--output results.json]
+    python -m app.benchmarks.main --compare baseline.json
+
+Each scale is a booking count spread over ``--days`` days (by default as
+many as 90% occupancy needs); its database is generated into
+``--data-dir`` once per day and seed, and reused. The clock is pinned at
+the first scheduled reminder, so there is a batch of reminders to send
+and slot availability is the same on every run. Results (with the commit
+they were taken at) are written as JSON; ``--compare`` prints median
+ratios against an earlier file and exits with status 1 if a median got
+slower than ``--tolerance`` allows.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import sqlalchemy
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.benchmarks.cases import CASES, Context
+from app.benchmarks.dataset import Dataset, DatasetSpec, load_or_generate, sample_day
+from app.config import settings
+from app.models import ReminderSchedule
+from app.queue_engine import queue_engine
+from app.slot_cache import slot_cache
+from app.utils.time_utils import VirtualClock, to_tz
+
+_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+
+def parse_scale(value: str) -> int:
+    value = value.strip().lower()
+    if value[-1:] in _SUFFIXES:
+        return int(float(value[:-1]) * _SUFFIXES[value[-1]])
+    return int(value)
+
+
+def _commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def _pinned_now(dataset: Dataset, engine: sqlalchemy.Engine) -> datetime:
+    # напоминания приходятся на границы слотов: «сейчас» — момент первой пачки
+    with Session(engine) as session:
+        first_due = session.scalar(select(func.min(ReminderSchedule.due_at)))
+    return to_tz(first_due or dataset.generated_at)
+
+
+def run_scale(dataset: Dataset, names: list[str], repeat: int) -> list[dict]:
+    engine = dataset.engine()
+    try:
+        now = _pinned_now(dataset, engine)
+        today = now.date()
+        elevator_id, _ = sample_day(engine, today)
+        ctx = Context(engine, elevator_id, today, today + timedelta(days=1) - timedelta(days=dataset.days - 1))
+        results = []
+        with VirtualClock(now):
+            for name in names:
+                fn, number = CASES[name]
+                samples = [fn(ctx) * 1000 for _ in range(repeat)]
+                result = {
+                    "case": name,
+                    "scale": dataset.spec.bookings,
+                    "repeat": repeat,
+                    "calls_per_repeat": number,
+                    "min_ms": min(samples),
+                    "median_ms": statistics.median(samples),
+                    "mean_ms": statistics.fmean(samples),
+                    "max_ms": max(samples),
+                    "samples_ms": samples,
+                }
+                print(
+                    f"{dataset.spec.bookings:>9} {name:<24} median {result['median_ms']:10.3f} ms"
+                    f"  min {result['min_ms']:10.3f}  max {result['max_ms']:10.3f}"
+                )
+                results.append(result)
+        return results
+    finally:
+        queue_engine.clear()
+        slot_cache.clear()
+        engine.dispose()
+
+
+def compare(results: list[dict], baseline_path: Path, tolerance: float) -> int:
+    """Print median ratios against a baseline file; return the number of regressions."""
+    baseline = {
+        (row["case"], row["scale"]): row["median_ms"] for row in json.loads(baseline_path.read_text())["results"]
+    }
+    regressions = 0
+    print(f"\nCompared with {baseline_path}:")
+    for row in results:
+        before = baseline.get((row["case"], row["scale"]))
+        if not before:
+            continue
+        ratio = row["median_ms"] / before
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{row['scale']:>9} {row['case']:<24} {before:10.3f} -> {row['median_ms']:10.3f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark hot paths on synthetic databases")
+    parser.add_argument("--scales", default="10k,100k,1M", help="booking counts, e.g. 10k,100k,1M")
+    parser.add_argument("--only", help="comma-separated case names or prefixes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--elevators", type=int, default=50)
+    parser.add_argument("--drivers", type=int, default=5000)
+    parser.add_argument("--days", type=int, help="days of bookings (default: as many as 90%% occupancy needs)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--data-dir", type=Path, default=Path(tempfile.gettempdir()) / "truck-queue-benchmarks")
+    parser.add_argument("--regenerate", action="store_true", help="rebuild cached databases")
+    parser.add_argument("--output", type=Path, default=Path("benchmark-results.json"))
+    parser.add_argument("--compare", type=Path, help="earlier results file to compare medians with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="median slowdown reported as a regression")
+    args = parser.parse_args()
+
+    names = list(CASES)
+    if args.only:
+        prefixes = [value.strip() for value in args.only.split(",")]
+        names = [name for name in names if any(name.startswith(prefix) for prefix in prefixes)]
+        if not names:
+            raise SystemExit(f"No benchmark matches {args.only!r}; known: {', '.join(CASES)}")
+
+    datasets, results = [], []
+    for scale in (parse_scale(value) for value in args.scales.split(",")):
+        spec = DatasetSpec(scale, args.elevators, args.drivers, seed=args.seed, days=args.days)
+        try:
+            dataset = load_or_generate(spec, args.data_dir, args.regenerate)
+        except ValueError as exc:
+            raise SystemExit(str(exc))
+        datasets.append({"bookings": scale, "elevators": spec.elevators, "drivers": spec.drivers, "days": dataset.days, "seed": spec.seed})
+        results.extend(run_scale(dataset, names, args.repeat))
+
+    report = {
+        "commit": _commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "platform": platform.platform(),
+        "settings": {
+            "slot_duration_minutes": settings.slot_duration_minutes,
+            "notification_offsets_minutes": settings.notification_offsets_minutes,
+            "sqlite_synchronous": settings.sqlite_synchronous,
+            "sqlite_journal_mode": settings.sqlite_journal_mode,
+        },
+        "datasets": datasets,
+        "results": results,
+    }
+    args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"Results written to {args.output}")
+    if args.compare and compare(results, args.compare, args.tolerance):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+
+from app.config import settings
+
+
+class PooledSession(AiohttpSession):
+    """aiohttp session with a bounded keep-alive connection pool."""
+
+    def __init__(self, limit: int, keepalive_timeout: float, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        # параметры TCPConnector, который aiogram создаёт при первом запросе
+        self._connector_init.update(limit=limit, keepalive_timeout=keepalive_timeout)
+
+
+_bots: dict[str, Bot] = {}
+
+
+def get_bot(token: str) -> Bot:
+    """Long-lived Bot per token, shared by handlers, offers and notifications."""
+    bot = _bots.get(token)
+    if bot is None:
+        session = PooledSession(
+            limit=settings.telegram_connection_limit,
+            keepalive_timeout=settings.telegram_keepalive_seconds,
+            api=TelegramAPIServer.from_base(settings.telegram_api_url) if settings.telegram_api_url else PRODUCTION,
+        )
+        bot = _bots[token] = Bot(token=token, session=session)
+    return bot
+
+
+async def close_bots() -> None:
+    for bot in list(_bots.values()):
+        await bot.session.close()
+    _bots.clear()
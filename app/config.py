@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dataclasses import dataclass
 from dotenv import load_dotenv
 
@@ -35,6 +36,36 @@ class Settings:
     notification_offsets_minutes: list[int]
     default_timezone: str
     slot_duration_minutes: int
+    telegram_global_rate: float
+    telegram_chat_interval_seconds: float
+    telegram_send_concurrency: int
+    telegram_send_max_attempts: int
+    telegram_connection_limit: int
+    telegram_keepalive_seconds: float
+    telegram_api_url: str
+    outbox_poll_interval_seconds: float
+    outbox_batch_size: int
+    event_socket_dir: str
+    event_retention_hours: int
+    sqlite_journal_mode: str
+    sqlite_synchronous: str
+    sqlite_busy_timeout_ms: int
+    sqlite_mmap_size: int
+    sqlite_cache_size: int
+    sqlite_temp_store: str
+    sqlite_checkpoint_interval_seconds: float
+    write_actor_enabled: bool
+    write_batch_window_ms: float
+    write_batch_max: int
+    schedule_page_size: int
+    board_edit_interval_seconds: float
+    board_poll_interval_seconds: float
+    queue_position_min_shift: int
+    reminder_coalesce_seconds: float
+    metrics_host: str
+    metrics_port: int
+    metrics_dir: str
+    metrics_write_interval_seconds: float
 
 
 def load_settings() -> Settings:
@@ -52,6 +83,49 @@ def load_settings() -> Settings:
         ),
         default_timezone=_get_env("DEFAULT_TIMEZONE", "Europe/Moscow"),
         slot_duration_minutes=int(_get_env("SLOT_DURATION_MINUTES", "60")),
+        # лимиты Bot API: ~30 сообщений/с на бота и ~1 сообщение/с в один чат
+        telegram_global_rate=float(_get_env("TELEGRAM_GLOBAL_RATE", "30")),
+        telegram_chat_interval_seconds=float(_get_env("TELEGRAM_CHAT_INTERVAL_SECONDS", "1")),
+        telegram_send_concurrency=int(_get_env("TELEGRAM_SEND_CONCURRENCY", "8")),
+        telegram_send_max_attempts=int(_get_env("TELEGRAM_SEND_MAX_ATTEMPTS", "5")),
+        telegram_connection_limit=int(_get_env("TELEGRAM_CONNECTION_LIMIT", "16")),
+        telegram_keepalive_seconds=float(_get_env("TELEGRAM_KEEPALIVE_SECONDS", "30")),
+        # свой сервер Bot API (telegram-bot-api, симулятор нагрузки); пусто — api.telegram.org
+        telegram_api_url=_get_env("TELEGRAM_API_URL", ""),
+        outbox_poll_interval_seconds=float(_get_env("OUTBOX_POLL_INTERVAL_SECONDS", "5")),
+        outbox_batch_size=int(_get_env("OUTBOX_BATCH_SIZE", "100")),
+        # пустое значение отключает сокеты: подписчики работают только опросом
+        event_socket_dir=_get_env(
+            "EVENT_SOCKET_DIR", os.path.join(tempfile.gettempdir(), "truck_queue_events")
+        ),
+        event_retention_hours=int(_get_env("EVENT_RETENTION_HOURS", "24")),
+        # общий queue.db для трёх процессов: WAL, чтобы чтения не блокировали запись
+        sqlite_journal_mode=_get_env("SQLITE_JOURNAL_MODE", "WAL"),
+        sqlite_synchronous=_get_env("SQLITE_SYNCHRONOUS", "NORMAL"),
+        sqlite_busy_timeout_ms=int(_get_env("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        sqlite_mmap_size=int(_get_env("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        # отрицательное значение — размер в КиБ
+        sqlite_cache_size=int(_get_env("SQLITE_CACHE_SIZE", "-20000")),
+        sqlite_temp_store=_get_env("SQLITE_TEMP_STORE", "MEMORY"),
+        sqlite_checkpoint_interval_seconds=float(_get_env("SQLITE_CHECKPOINT_INTERVAL_SECONDS", "300")),
+        # групповой commit записей бота одной транзакцией (выключен по умолчанию)
+        write_actor_enabled=_get_env("WRITE_ACTOR", "0").lower() in {"1", "true", "yes"},
+        write_batch_window_ms=float(_get_env("WRITE_BATCH_WINDOW_MS", "5")),
+        write_batch_max=int(_get_env("WRITE_BATCH_MAX", "64")),
+        schedule_page_size=int(_get_env("SCHEDULE_PAGE_SIZE", "10")),
+        # живое табло: не чаще одной правки в чат за интервал
+        board_edit_interval_seconds=float(_get_env("BOARD_EDIT_INTERVAL_SECONDS", "2")),
+        board_poll_interval_seconds=float(_get_env("BOARD_POLL_INTERVAL_SECONDS", "30")),
+        # гистерезис QUEUE_POSITION_CHANGED: на сколько позиций должна сдвинуться бронь
+        queue_position_min_shift=int(_get_env("QUEUE_POSITION_MIN_SHIFT", "2")),
+        # напоминания, наступающие в этом окне, уходят водителю одним сообщением
+        reminder_coalesce_seconds=float(_get_env("REMINDER_COALESCE_SECONDS", "60")),
+        # метрики Prometheus: бот водителя на METRICS_PORT, бот диспетчера на +1, уведомления на +2; 0 — выключено
+        metrics_host=_get_env("METRICS_HOST", "127.0.0.1"),
+        metrics_port=int(_get_env("METRICS_PORT", "0")),
+        # каталог для <процесс>.prom (textfile collector node_exporter); пусто — файлы не пишутся
+        metrics_dir=_get_env("METRICS_DIR", ""),
+        metrics_write_interval_seconds=float(_get_env("METRICS_WRITE_INTERVAL_SECONDS", "15")),
     )
 
 
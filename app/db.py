@@ -1,19 +1,82 @@
-from sqlalchemy import create_engine
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base, scoped_session
 
 from app.config import settings
 
 
+def _async_url(url: str) -> str:
+    parsed = make_url(url)
+    if parsed.drivername == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False)
+
+
+def _sqlite_pragmas() -> list[tuple[str, object]]:
+    return [
+        ("busy_timeout", settings.sqlite_busy_timeout_ms),
+        ("journal_mode", settings.sqlite_journal_mode),
+        ("synchronous", settings.sqlite_synchronous),
+        ("mmap_size", settings.sqlite_mmap_size),
+        ("cache_size", settings.sqlite_cache_size),
+        ("temp_store", settings.sqlite_temp_store),
+    ]
+
+
+def _configure_sqlite(dbapi_connection, connection_record) -> None:
+    # busy_timeout первым: смена journal_mode сама может ждать блокировку
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in _sqlite_pragmas():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def _setup_engine(target: Engine) -> None:
+    if target.dialect.name == "sqlite" and target.url.database not in (None, "", ":memory:"):
+        event.listen(target, "connect", _configure_sqlite)
+
+
 engine = create_engine(settings.database_url, connect_args={"check_same_thread": False})
+_setup_engine(engine)
 SessionLocal = scoped_session(sessionmaker(bind=engine, autoflush=False, autocommit=False))
+
+# Боты работают через асинхронный движок: запросы не блокируют event loop.
+# expire_on_commit=False — после commit атрибуты читаются без ленивых запросов.
+async_engine = create_async_engine(_async_url(settings.database_url))
+_setup_engine(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
 def init_db() -> None:
     # Late import to avoid circular dependency
     from app import models  # noqa: F401
+    from app.hooks import install_session_hooks
+    from app.migrations import migrate
 
     Base.metadata.create_all(bind=engine)
+    # create_all не меняет существующие таблицы: индексы добавляют миграции
+    migrate(engine)
+    # производные таблицы броней (события, сводки, очередь) ведут хуки сессии
+    install_session_hooks()
+
+
+def checkpoint_wal() -> tuple[int, int, int] | None:
+    """Run a PASSIVE WAL checkpoint: copies what it can without blocking writers.
+
+    Returns (busy, wal_frames, checkpointed_frames), or None outside WAL mode.
+    """
+    if engine.dialect.name != "sqlite":
+        return None
+    with engine.connect() as conn:
+        row = conn.exec_driver_sql("PRAGMA wal_checkpoint(PASSIVE)").one()
+    if row[1] < 0:
+        return None
+    return tuple(row)
 
 
 if __name__ == "__main__":
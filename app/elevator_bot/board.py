@@ -0,0 +1,316 @@
+"""Live queue board: one pinned message per dispatcher chat and elevator.
+
+The board is re-rendered from the booking event log whenever today's queue
+of its elevator changes. Edits are coalesced per chat: the first change
+waits ``SETTLE`` seconds for the rest of a burst, a chat is edited at most
+once per ``BOARD_EDIT_INTERVAL_SECONDS``, and an edit whose rendered text
+hashes the same as the one on screen is skipped.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from contextlib import suppress
+from dataclasses import dataclass
+from datetime import date
+
+from aiogram import Bot, Router
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.bots import get_bot
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.elevator_bot.handlers import STATUS_TEXT, get_selected_elevator_id, select_elevator_prompt
+from app.events import EventSubscriber
+from app.models import Booking, BookingStatus, DailyElevatorStats, Elevator, QueueBoard
+from app.rollups import format_day_stats
+from app.utils.time_utils import to_tz
+from app.writer import write
+
+router = Router()
+
+# строк очереди на табло: сообщение Telegram ограничено 4096 символами
+BOARD_ROWS = 30
+
+
+async def render_board(session: AsyncSession, elevator_id: int, day: date) -> str:
+    elevator = await session.get(Elevator, elevator_id)
+    rows = (
+        await session.execute(
+            select(Booking.slot_start, Booking.license_plate, Booking.status, func.count().over())
+            .where(
+                Booking.elevator_id == elevator_id,
+                Booking.date == day,
+                Booking.status.notin_([BookingStatus.CANCELLED, BookingStatus.UNLOADED]),
+            )
+            .order_by(Booking.queue_index)
+            .limit(BOARD_ROWS)
+        )
+    ).all()
+    lines = [f"Очередь — элеватор {elevator.name if elevator else elevator_id}, {day.strftime('%d.%m')}"]
+    stats = await session.get(DailyElevatorStats, (elevator_id, day))
+    if stats is not None:
+        lines.append(format_day_stats(stats))
+    lines.append("")
+    if not rows:
+        lines.append("Очередь пуста.")
+    for number, (slot_start, plate, status, _) in enumerate(rows, start=1):
+        lines.append(f"{number}. {to_tz(slot_start).strftime('%H:%M')} {plate} — {STATUS_TEXT.get(status, status)}")
+    if rows and rows[0][3] > len(rows):
+        lines.append(f"… и ещё {rows[0][3] - len(rows)}")
+    return "\n".join(lines)
+
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+@dataclass
+class _Board:
+    chat_id: int
+    elevator_id: int
+    message_id: int
+    # хэш текста, который сейчас на экране; None — неизвестен (после старта)
+    text_hash: str | None = None
+
+
+class LiveBoard:
+    """Keeps pinned queue boards of this bot current with debounced edits."""
+
+    # сколько ждать остальные изменения пачки перед первой правкой
+    SETTLE = 0.5
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+        interval: float | None = None,
+        poll_interval: float | None = None,
+    ) -> None:
+        self.session_factory = session_factory
+        self.interval = interval if interval is not None else settings.board_edit_interval_seconds
+        self.poll_interval = poll_interval or settings.board_poll_interval_seconds
+        self.events = EventSubscriber("board")
+        self._boards: dict[tuple[int, int], _Board] = {}
+        self._pending: dict[int, dict[int, None]] = {}
+        self._timers: dict[int, asyncio.Task] = {}
+        self._last_edit: dict[int, float] = {}
+        self._rendered: dict[int, tuple[int, date, str]] = {}
+        self._day = date.today()
+        self._stopping = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.edits = 0
+        self.skipped = 0
+
+    @property
+    def bot(self) -> Bot:
+        return get_bot(settings.elevator_bot_token)
+
+    def add(self, chat_id: int, elevator_id: int, message_id: int, text: str) -> None:
+        self._boards[(chat_id, elevator_id)] = _Board(chat_id, elevator_id, message_id, _digest(text))
+
+    def remove(self, chat_id: int, elevator_id: int) -> None:
+        self._boards.pop((chat_id, elevator_id), None)
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping.clear()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        # отложенные правки отбрасываются: после старта табло перерисуется целиком
+        self._stopping.set()
+        self.events.wake()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        for task in list(self._timers.values()):
+            task.cancel()
+        self._timers.clear()
+        self._pending.clear()
+
+    async def run(self) -> None:
+        self.events.open()
+        try:
+            async with self.session_factory() as session:
+                await session.run_sync(self.events.start_from_now)
+                for board in await session.scalars(select(QueueBoard)):
+                    self._boards.setdefault(
+                        (board.chat_id, board.elevator_id),
+                        _Board(board.chat_id, board.elevator_id, board.message_id),
+                    )
+            for chat_id, elevator_id in list(self._boards):
+                self._mark(chat_id, elevator_id)
+            while not self._stopping.is_set():
+                try:
+                    await self._poll()
+                except Exception as exc:  # pragma: no cover - runtime logging
+                    logging.exception("Live board error: %s", exc)
+                await self.events.wait(self.poll_interval)
+        finally:
+            self.events.close()
+
+    async def _poll(self) -> None:
+        async with self.session_factory() as session:
+            events = await session.run_sync(self.events.poll)
+        today = date.today()
+        if today != self._day:
+            # новый день — все табло показывают другую очередь
+            self._day = today
+            for chat_id, elevator_id in list(self._boards):
+                self._mark(chat_id, elevator_id)
+        changed = {event.elevator_id for event in events if event.date == today}
+        for chat_id, elevator_id in list(self._boards):
+            if elevator_id in changed:
+                self._mark(chat_id, elevator_id)
+
+    def _mark(self, chat_id: int, elevator_id: int) -> None:
+        self._pending.setdefault(chat_id, {})[elevator_id] = None
+        if chat_id not in self._timers:
+            self._schedule(chat_id)
+
+    def _schedule(self, chat_id: int) -> None:
+        loop = asyncio.get_running_loop()
+        last_edit = self._last_edit.get(chat_id)
+        delay = self.SETTLE
+        if last_edit is not None:
+            delay = max(delay, last_edit + self.interval - loop.time())
+        self._timers[chat_id] = loop.create_task(self._flush_later(chat_id, delay))
+
+    async def _flush_later(self, chat_id: int, delay: float) -> None:
+        await asyncio.sleep(delay)
+        try:
+            await self._flush(chat_id)
+        except TelegramRetryAfter as exc:
+            self._last_edit[chat_id] = asyncio.get_running_loop().time() + exc.retry_after
+        except Exception as exc:  # pragma: no cover - runtime logging
+            logging.exception("Live board edit in chat %s failed: %s", chat_id, exc)
+        finally:
+            self._timers.pop(chat_id, None)
+            if self._pending.get(chat_id) and not self._stopping.is_set():
+                self._schedule(chat_id)
+            else:
+                self._pending.pop(chat_id, None)
+
+    async def _flush(self, chat_id: int) -> None:
+        """Edit the first changed board of the chat; the rest wait for the next interval."""
+        pending = self._pending.get(chat_id, {})
+        while pending:
+            elevator_id = next(iter(pending))
+            board = self._boards.get((chat_id, elevator_id))
+            if board is None:
+                del pending[elevator_id]
+                continue
+            text = await self._render(elevator_id)
+            digest = _digest(text)
+            if digest == board.text_hash:
+                del pending[elevator_id]
+                self.skipped += 1
+                continue
+            del pending[elevator_id]
+            self._last_edit[chat_id] = asyncio.get_running_loop().time()
+            try:
+                await self._edit(board, text)
+            except TelegramRetryAfter:
+                # повторим после паузы, которую попросил Telegram
+                pending[elevator_id] = None
+                raise
+            board.text_hash = digest
+            self.edits += 1
+            return
+
+    async def _render(self, elevator_id: int) -> str:
+        # один рендер на элеватор для всех чатов, пока в журнале нет новых событий
+        cached = self._rendered.get(elevator_id)
+        if cached is not None and cached[:2] == (self.events.high_water, self._day):
+            return cached[2]
+        async with self.session_factory() as session:
+            text = await render_board(session, elevator_id, self._day)
+        self._rendered[elevator_id] = (self.events.high_water, self._day, text)
+        return text
+
+    async def _edit(self, board: _Board, text: str) -> None:
+        try:
+            await self.bot.edit_message_text(text, chat_id=board.chat_id, message_id=board.message_id)
+        except TelegramBadRequest as exc:
+            if "message is not modified" in exc.message:
+                return
+            if "message to edit not found" not in exc.message and "chat not found" not in exc.message:
+                raise
+        except TelegramForbiddenError:
+            pass
+        else:
+            return
+        # сообщение удалили или бота убрали из чата — табло больше некуда выводить
+        logging.info("Live board %s/%s is gone, dropping it", board.chat_id, board.elevator_id)
+        self.remove(board.chat_id, board.elevator_id)
+        async with self.session_factory() as session:
+            await write(session, _delete_board, board.chat_id, board.elevator_id)
+
+
+live_board = LiveBoard()
+
+
+def _save_board(session: Session, chat_id: int, elevator_id: int, message_id: int) -> int | None:
+    """Store the chat's board message for the elevator; return the previous message id."""
+    previous = session.scalar(
+        select(QueueBoard.message_id).where(QueueBoard.chat_id == chat_id, QueueBoard.elevator_id == elevator_id)
+    )
+    session.execute(
+        insert(QueueBoard)
+        .values(chat_id=chat_id, elevator_id=elevator_id, message_id=message_id)
+        .on_conflict_do_update(index_elements=["chat_id", "elevator_id"], set_={"message_id": message_id})
+    )
+    return previous
+
+
+def _delete_board(session: Session, chat_id: int, elevator_id: int) -> int | None:
+    return session.scalar(
+        delete(QueueBoard)
+        .where(QueueBoard.chat_id == chat_id, QueueBoard.elevator_id == elevator_id)
+        .returning(QueueBoard.message_id)
+    )
+
+
+@router.message(Command("board"))
+async def cmd_board(message: Message, state: FSMContext, session: AsyncSession) -> None:
+    """/board — закреплённое табло очереди выбранного элеватора, обновляется само."""
+    elevator_id = await get_selected_elevator_id(state)
+    if not elevator_id:
+        await select_elevator_prompt(message, state, session)
+        return
+    text = await render_board(session, elevator_id, date.today())
+    sent = await message.answer(text)
+    previous = await write(session, _save_board, message.chat.id, elevator_id, sent.message_id)
+    live_board.add(message.chat.id, elevator_id, sent.message_id, text)
+    if previous:
+        with suppress(TelegramBadRequest):
+            await message.bot.unpin_chat_message(message.chat.id, message_id=previous)
+    try:
+        await message.bot.pin_chat_message(message.chat.id, sent.message_id, disable_notification=True)
+    except TelegramBadRequest as exc:
+        logging.info("Cannot pin live board in chat %s: %s", message.chat.id, exc)
+        await message.answer("Табло будет обновляться, но закрепить его не удалось: нужны права на закрепление.")
+
+
+@router.message(Command("board_off"))
+async def cmd_board_off(message: Message, state: FSMContext, session: AsyncSession) -> None:
+    elevator_id = await get_selected_elevator_id(state)
+    if not elevator_id:
+        await select_elevator_prompt(message, state, session)
+        return
+    live_board.remove(message.chat.id, elevator_id)
+    message_id = await write(session, _delete_board, message.chat.id, elevator_id)
+    if message_id is None:
+        await message.answer("Табло для этого элеватора не включено.")
+        return
+    with suppress(TelegramBadRequest):
+        await message.bot.unpin_chat_message(message.chat.id, message_id=message_id)
+    await message.answer("Табло отключено.")
@@ -1,42 +1,52 @@
 from __future__ import annotations
 
 from datetime import date, timedelta
-import asyncio
 
 from aiogram import Router, F
-from aiogram.filters import Command, CommandStart
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.fsm.context import FSMContext
-from aiogram.types import CallbackQuery, Message
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
 
-from app.db import SessionLocal
+from app.analytics import collect_stats, format_stats
+from app.config import settings
 from app.elevator_bot.keyboards import (
     booking_actions_keyboard,
     elevators_keyboard,
     main_menu_keyboard,
+    schedule_keyboard,
 )
 from app.elevator_bot.states import ElevatorState
-from app.models import Booking, BookingStatus, Elevator
+from app.models import Booking, BookingStatus, DailyElevatorStats, Elevator
 from app.queue_logic import recalc_queue
-from app.utils.time_utils import now_tz
+from app.reminders import disarm_reminder
+from app.rollups import format_day_stats
+from app.utils.csv_export import SpooledInputFile, export_query, spooled_file, write_bookings_csv
+from app.utils.time_utils import now_tz, parse_date, to_tz
 from app.truck_bot import keyboards as driver_keyboards
-from aiogram import Bot
-from app.config import settings
+from app.outbox import add_message, outbox_relay
+from app.writer import write
 
 
 router = Router()
 
+_BOOKING_CARD = (joinedload(Booking.driver), joinedload(Booking.elevator))
+
+STATUS_TEXT = {
+    BookingStatus.PENDING: "Запрос",
+    BookingStatus.CONFIRMED: "Записан",
+    BookingStatus.ARRIVED: "Прибыл",
+    BookingStatus.UNLOADED: "Разгружен",
+    BookingStatus.CANCELLED: "Отменён",
+}
+
 
 def _format_booking(booking: Booking) -> str:
-    tz_now = now_tz()
-    slot_local = booking.slot_start.astimezone(tz_now.tzinfo)
-    status_map = {
-        BookingStatus.PENDING: "Запрос",
-        BookingStatus.CONFIRMED: "Записан",
-        BookingStatus.ARRIVED: "Прибыл",
-        BookingStatus.UNLOADED: "Разгружен",
-        BookingStatus.CANCELLED: "Отменён",
-    }
-    status = status_map.get(booking.status, booking.status)
+    slot_local = to_tz(booking.slot_start)
+    status = STATUS_TEXT.get(booking.status, booking.status)
     return (
         f"#{booking.id} | {slot_local.strftime('%Y-%m-%d %H:%M')}\n"
         f"Элеватор: {booking.elevator.name}\n"
@@ -46,9 +56,23 @@ def _format_booking(booking: Booking) -> str:
     )
 
 
-async def _select_elevator_prompt(message: Message, state: FSMContext) -> None:
-    with SessionLocal() as session:
-        elevators = [e.name for e in session.query(Elevator).order_by(Elevator.name).all()]
+def _format_row(booking: Booking) -> str:
+    status = STATUS_TEXT.get(booking.status, booking.status)
+    driver = booking.driver.telegram_username or booking.driver.telegram_user_id
+    return f"{to_tz(booking.slot_start).strftime('%H:%M')} {booking.license_plate} @{driver} — {status}"
+
+
+def _day_title(day: date) -> str:
+    today = date.today()
+    if day == today:
+        return "Сегодня"
+    if day == today + timedelta(days=1):
+        return "Завтра"
+    return day.isoformat()
+
+
+async def select_elevator_prompt(message: Message, state: FSMContext, session: AsyncSession) -> None:
+    elevators = list(await session.scalars(select(Elevator.name).order_by(Elevator.name)))
     if not elevators:
         await message.answer("Нет настроенных элеваторов. Добавьте в базе.")
         return
@@ -56,27 +80,102 @@ async def _select_elevator_prompt(message: Message, state: FSMContext) -> None:
     await message.answer("Выберите элеватор для работы:", reply_markup=elevators_keyboard(elevators))
 
 
-async def _get_selected_elevator_id(state: FSMContext) -> int | None:
+async def get_selected_elevator_id(state: FSMContext) -> int | None:
     data = await state.get_data()
     return data.get("elevator_id")
 
 
+async def _load_schedule_page(
+    session: AsyncSession, elevator_id: int, day: date, page: int
+) -> tuple[list[Booking], int, int]:
+    """Bookings of one schedule page with the (clamped) page number and the day's total."""
+    size = settings.schedule_page_size
+    while True:
+        # одна выборка: страница с водителями и элеватором, общее число — оконной функцией
+        rows = (
+            await session.execute(
+                select(Booking, func.count().over())
+                .options(*_BOOKING_CARD)
+                .where(
+                    Booking.date == day,
+                    Booking.status != BookingStatus.CANCELLED,
+                    Booking.elevator_id == elevator_id,
+                )
+                .order_by(Booking.slot_start)
+                .limit(size)
+                .offset(page * size)
+                # брони, изменённые писателем в другой сессии, перечитываются
+                .execution_options(populate_existing=True)
+            )
+        ).all()
+        if rows or page == 0:
+            break
+        # последнюю страницу опустошила отмена — показываем предыдущую
+        page -= 1
+    total = rows[0][1] if rows else 0
+    return [booking for booking, _ in rows], page, total
+
+
+async def _render_schedule(
+    session: AsyncSession, elevator_id: int, day: date, page: int
+) -> tuple[str, InlineKeyboardMarkup | None]:
+    bookings, page, total = await _load_schedule_page(session, elevator_id, day, page)
+    if not bookings:
+        return f"{_day_title(day)}: бронирований нет.", None
+    size = settings.schedule_page_size
+    lines = [f"{_day_title(day)}, {day.isoformat()} — элеватор {bookings[0].elevator.name}"]
+    # итоги дня — одна строка сводки вместо агрегации броней
+    stats = await session.get(DailyElevatorStats, (elevator_id, day))
+    if stats is not None:
+        lines.append(format_day_stats(stats))
+    lines.append("")
+    for number, booking in enumerate(bookings, start=page * size + 1):
+        lines.append(f"{number}. {_format_row(booking)}")
+    pages = -(-total // size)
+    markup = schedule_keyboard(bookings, day, page, pages, with_actions=day == date.today())
+    return "\n".join(lines), markup
+
+
+async def _send_schedule(message: Message, state: FSMContext, session: AsyncSession, day: date) -> None:
+    elevator_id = await get_selected_elevator_id(state)
+    if not elevator_id:
+        await select_elevator_prompt(message, state, session)
+        return
+    text, markup = await _render_schedule(session, elevator_id, day, 0)
+    await message.answer(text, reply_markup=markup)
+
+
+async def _edit_schedule(call: CallbackQuery, session: AsyncSession, elevator_id: int, day: date, page: int) -> None:
+    text, markup = await _render_schedule(session, elevator_id, day, page)
+    try:
+        await call.message.edit_text(text, reply_markup=markup)
+    except TelegramBadRequest as exc:
+        # повторное нажатие на номер страницы без изменений в расписании
+        if "message is not modified" not in exc.message:
+            raise
+
+
+def _callback_page(data: str) -> int | None:
+    # action:<booking_id>[:<page>] — страница есть у кнопок расписания
+    parts = data.split(":")
+    return int(parts[2]) if len(parts) > 2 else None
+
+
 @router.message(CommandStart())
-async def cmd_start(message: Message, state: FSMContext) -> None:
+async def cmd_start(message: Message, state: FSMContext, session: AsyncSession) -> None:
     await state.clear()
-    await _select_elevator_prompt(message, state)
+    await select_elevator_prompt(message, state, session)
 
 
 @router.message(Command("change_elevator"))
-async def cmd_change_elevator(message: Message, state: FSMContext) -> None:
-    await _select_elevator_prompt(message, state)
+async def cmd_change_elevator(message: Message, state: FSMContext, session: AsyncSession) -> None:
+    await select_elevator_prompt(message, state, session)
 
 
 @router.callback_query(F.data.startswith("elevator:"))
-async def choose_elevator(call: CallbackQuery, state: FSMContext) -> None:
+async def choose_elevator(call: CallbackQuery, state: FSMContext, session: AsyncSession) -> None:
     name = call.data.split(":", 1)[1]
-    with SessionLocal() as session:
-        elevator = session.query(Elevator).filter_by(name=name).one_or_none()
+    elevator = await session.scalar(select(Elevator).filter_by(name=name))
     if elevator is None:
         await call.answer("Элеватор не найден", show_alert=True)
         return
@@ -88,145 +187,197 @@ async def choose_elevator(call: CallbackQuery, state: FSMContext) -> None:
 
 
 @router.message(Command("today"))
-async def cmd_today(message: Message, state: FSMContext) -> None:
-    elevator_id = await _get_selected_elevator_id(state)
-    if not elevator_id:
-        await _select_elevator_prompt(message, state)
-        return
-    today = date.today()
-    with SessionLocal() as session:
-        bookings = (
-            session.query(Booking)
-            .join(Elevator)
-            .filter(
-                Booking.date == today,
-                Booking.status != BookingStatus.CANCELLED,
-                Booking.elevator_id == elevator_id,
-            )
-            .order_by(Booking.slot_start)
-            .all()
-        )
-        if not bookings:
-            await message.answer("На сегодня бронирований нет.")
-            return
-        for booking in bookings:
-            markup = booking_actions_keyboard(booking)
-            await message.answer(
-                _format_booking(booking), reply_markup=markup
-            )
+async def cmd_today(message: Message, state: FSMContext, session: AsyncSession) -> None:
+    await _send_schedule(message, state, session, date.today())
 
 
 @router.message(Command("schedule"))
-async def cmd_schedule(message: Message, state: FSMContext) -> None:
-    elevator_id = await _get_selected_elevator_id(state)
+async def cmd_schedule(message: Message, state: FSMContext, session: AsyncSession) -> None:
+    await _send_schedule(message, state, session, date.today() + timedelta(days=1))
+
+
+@router.callback_query(F.data.startswith("sched:"))
+async def schedule_page(call: CallbackQuery, state: FSMContext, session: AsyncSession) -> None:
+    _, day, page = call.data.split(":")
+    elevator_id = await get_selected_elevator_id(state)
     if not elevator_id:
-        await _select_elevator_prompt(message, state)
+        await call.answer("Сначала выберите элеватор: /change_elevator", show_alert=True)
         return
-    target_day = date.today() + timedelta(days=1)
-    with SessionLocal() as session:
-        bookings = (
-            session.query(Booking)
-            .join(Elevator)
-            .filter(
-                Booking.date == target_day,
-                Booking.status != BookingStatus.CANCELLED,
-                Booking.elevator_id == elevator_id,
-            )
-            .order_by(Booking.slot_start)
-            .all()
-        )
-        if not bookings:
-            await message.answer("На завтра бронирований нет.")
+    await _edit_schedule(call, session, elevator_id, parse_date(day), int(page))
+    await call.answer()
+
+
+async def _parse_period(
+    message: Message, command: CommandObject, state: FSMContext, session: AsyncSession
+) -> tuple[date, date, int | None] | None:
+    """Parse `[YYYY-MM-DD [YYYY-MM-DD]] [все]`; None if the user was already answered."""
+    args = (command.args or "").split()
+    all_elevators = bool(args) and args[-1].casefold() in {"все", "all"}
+    if all_elevators:
+        args.pop()
+    try:
+        dates = [parse_date(arg) for arg in args]
+    except ValueError:
+        dates = []
+    if len(dates) != len(args) or len(dates) > 2:
+        await message.answer(f"Формат: /{command.command} [с YYYY-MM-DD] [по YYYY-MM-DD] [все]")
+        return None
+    date_from = dates[0] if dates else date.today()
+    date_to = dates[-1] if dates else date_from
+    if date_to < date_from:
+        await message.answer("Дата окончания раньше даты начала.")
+        return None
+    elevator_id = None
+    if not all_elevators:
+        elevator_id = await get_selected_elevator_id(state)
+        if not elevator_id:
+            await select_elevator_prompt(message, state, session)
+            return None
+    return date_from, date_to, elevator_id
+
+
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject, state: FSMContext, session: AsyncSession) -> None:
+    """/export [YYYY-MM-DD [YYYY-MM-DD]] [все] — CSV броней выбранного элеватора за период."""
+    period = await _parse_period(message, command, state, session)
+    if period is None:
+        return
+    date_from, date_to, elevator_id = period
+    stmt = export_query(date_from, date_to, elevator_id)
+    with spooled_file() as out:
+        count = await session.run_sync(write_bookings_csv, stmt, out)
+        if not count:
+            await message.answer("За выбранный период бронирований нет.")
             return
-        for booking in bookings:
-            await message.answer(_format_booking(booking))
+        await message.answer_document(
+            SpooledInputFile(out, filename=f"bookings_{date_from}_{date_to}.csv"),
+            caption=f"Бронирований: {count}",
+        )
+
+
+@router.message(Command("stats"))
+async def cmd_stats(message: Message, command: CommandObject, state: FSMContext, session: AsyncSession) -> None:
+    """/stats [YYYY-MM-DD [YYYY-MM-DD]] [все] — показатели элеватора за период."""
+    period = await _parse_period(message, command, state, session)
+    if period is None:
+        return
+    stats = await session.run_sync(collect_stats, *period)
+    if not stats:
+        await message.answer("Нет данных.")
+        return
+    await message.answer("\n\n".join(format_stats(item) for item in stats))
 
 
 @router.message(F.text.casefold() == "сегодня")
-async def menu_today(message: Message, state: FSMContext) -> None:
-    await cmd_today(message, state)
+async def menu_today(message: Message, state: FSMContext, session: AsyncSession) -> None:
+    await cmd_today(message, state, session)
 
 
 @router.message(F.text.casefold() == "завтра")
-async def menu_schedule(message: Message, state: FSMContext) -> None:
-    await cmd_schedule(message, state)
+async def menu_schedule(message: Message, state: FSMContext, session: AsyncSession) -> None:
+    await cmd_schedule(message, state, session)
 
 
 @router.message(F.text.casefold() == "сменить элеватор")
-async def menu_change_elevator(message: Message, state: FSMContext) -> None:
-    await cmd_change_elevator(message, state)
+async def menu_change_elevator(message: Message, state: FSMContext, session: AsyncSession) -> None:
+    await cmd_change_elevator(message, state, session)
 
 
 @router.callback_query(F.data.startswith("arrive:"))
-async def mark_arrived(call: CallbackQuery, state: FSMContext) -> None:
+async def mark_arrived(call: CallbackQuery, state: FSMContext, session: AsyncSession) -> None:
     booking_id = int(call.data.split(":")[1])
     data = await state.get_data()
     elevator_id = data.get("elevator_id")
-    with SessionLocal() as session:
-        booking = session.get(Booking, booking_id)
-        if booking is None:
-            await call.answer("Бронирование не найдено", show_alert=True)
-            return
-        if elevator_id and booking.elevator_id != elevator_id:
-            await call.answer("Недоступно для этого бота", show_alert=True)
-            return
-        booking.arrived_at = now_tz()
-        booking.status = BookingStatus.ARRIVED
-        recalc_queue(session, booking.elevator_id, booking.date)
-        session.commit()
-        markup = booking_actions_keyboard(booking)
-        await call.message.edit_text(_format_booking(booking), reply_markup=markup)
-        await call.answer("Прибытие отмечено")
+    booking = await session.get(Booking, booking_id, options=_BOOKING_CARD)
+    if booking is None:
+        await call.answer("Бронирование не найдено", show_alert=True)
+        return
+    if elevator_id and booking.elevator_id != elevator_id:
+        await call.answer("Недоступно для этого бота", show_alert=True)
+        return
+    booking = await write(session, _arrive, booking.id)
+    await _show_after_action(call, session, booking)
+    await call.answer("Прибытие отмечено")
 
 
 @router.callback_query(F.data.startswith("unload:"))
-async def mark_unloaded(call: CallbackQuery, state: FSMContext) -> None:
+async def mark_unloaded(call: CallbackQuery, state: FSMContext, session: AsyncSession) -> None:
     booking_id = int(call.data.split(":")[1])
     data = await state.get_data()
     elevator_id = data.get("elevator_id")
-    with SessionLocal() as session:
-        booking = session.get(Booking, booking_id)
-        if booking is None:
-            await call.answer("Бронирование не найдено", show_alert=True)
-            return
-        if elevator_id and booking.elevator_id != elevator_id:
-            await call.answer("Недоступно для этого бота", show_alert=True)
-            return
-        booking.unloaded_at = now_tz()
-        booking.status = BookingStatus.UNLOADED
-        session.commit()
-        markup = booking_actions_keyboard(booking)
-        await call.message.edit_text(_format_booking(booking), reply_markup=markup)
-        await call.answer("Выгрузка отмечена")
-        await _offer_next_now(session, booking)
+    booking = await session.get(Booking, booking_id, options=_BOOKING_CARD)
+    if booking is None:
+        await call.answer("Бронирование не найдено", show_alert=True)
+        return
+    if elevator_id and booking.elevator_id != elevator_id:
+        await call.answer("Недоступно для этого бота", show_alert=True)
+        return
+    booking = await write(session, _unload, booking.id)
+    outbox_relay.wake()
+    await _show_after_action(call, session, booking)
+    await call.answer("Выгрузка отмечена")
+
+
+async def _show_after_action(call: CallbackQuery, session: AsyncSession, booking: Booking) -> None:
+    page = _callback_page(call.data)
+    if page is None:
+        await call.message.edit_text(_format_booking(booking), reply_markup=booking_actions_keyboard(booking))
+    else:
+        await _edit_schedule(call, session, booking.elevator_id, booking.date, page)
+
+
+def _arrive(session: Session, booking_id: int) -> Booking:
+    booking = session.get(Booking, booking_id, options=_BOOKING_CARD)
+    booking.arrived_at = now_tz()
+    booking.status = BookingStatus.ARRIVED
+    recalc_queue(session, booking.elevator_id, booking.date)
+    return booking
+
+
+def _unload(session: Session, booking_id: int) -> Booking:
+    booking = session.get(Booking, booking_id, options=_BOOKING_CARD)
+    booking.unloaded_at = now_tz()
+    booking.status = BookingStatus.UNLOADED
+    # предложение следующему пишется в outbox той же транзакцией
+    _offer_next_now(session, booking)
+    return booking
+
+
+def _cancel_booking(session: Session, booking_id: int) -> Booking:
+    booking = session.get(Booking, booking_id, options=_BOOKING_CARD)
+    booking.cancelled_at = now_tz()
+    booking.status = BookingStatus.CANCELLED
+    recalc_queue(session, booking.elevator_id, booking.date)
+    disarm_reminder(session, booking.id)
+    slot_local = to_tz(booking.slot_start)
+    add_message(
+        session,
+        booking.driver.telegram_user_id,
+        f"Бронь {slot_local.strftime('%d.%m %H:%M')} на элеваторе {booking.elevator.name} отменена диспетчером.",
+        dedup_key=f"cancel:{booking.id}",
+    )
+    return booking
 
 
 @router.callback_query(F.data.startswith("cancel:"))
-async def mark_cancelled(call: CallbackQuery, state: FSMContext) -> None:
+async def mark_cancelled(call: CallbackQuery, state: FSMContext, session: AsyncSession) -> None:
     booking_id = int(call.data.split(":")[1])
     data = await state.get_data()
     elevator_id = data.get("elevator_id")
-    with SessionLocal() as session:
-        booking = session.get(Booking, booking_id)
-        if booking is None:
-            await call.answer("Бронирование не найдено", show_alert=True)
-            return
-        if elevator_id and booking.elevator_id != elevator_id:
-            await call.answer("Недоступно для этого бота", show_alert=True)
-            return
-        booking.cancelled_at = now_tz()
-        booking.status = BookingStatus.CANCELLED
-        recalc_queue(session, booking.elevator_id, booking.date)
-        session.commit()
-        markup = booking_actions_keyboard(booking)
-        if markup:
-            await call.message.edit_text(_format_booking(booking), reply_markup=markup)
-        else:
-            await call.message.edit_text(_format_booking(booking))
-        await call.answer("Бронирование отменено")
-
-
-def _offer_next_now(session, unloaded_booking: Booking) -> None:
+    booking = await session.get(Booking, booking_id, options=_BOOKING_CARD)
+    if booking is None:
+        await call.answer("Бронирование не найдено", show_alert=True)
+        return
+    if elevator_id and booking.elevator_id != elevator_id:
+        await call.answer("Недоступно для этого бота", show_alert=True)
+        return
+    booking = await write(session, _cancel_booking, booking.id)
+    outbox_relay.wake()
+    await _show_after_action(call, session, booking)
+    await call.answer("Бронирование отменено")
+
+
+def _offer_next_now(session: Session, unloaded_booking: Booking) -> None:
     """
     Notify next in queue (and optionally second if first declines).
     """
@@ -234,18 +385,17 @@ def _offer_next_now(session, unloaded_booking: Booking) -> None:
         return
     today = unloaded_booking.date
     recalc_queue(session, unloaded_booking.elevator_id, today)
-    session.flush()
     # получаем список очереди без отмененных/разгруженных
-    candidates = (
-        session.query(Booking)
-        .filter(
+    candidates = session.scalars(
+        select(Booking)
+        .options(*_BOOKING_CARD)
+        .where(
             Booking.elevator_id == unloaded_booking.elevator_id,
             Booking.date == today,
             Booking.status.notin_([BookingStatus.CANCELLED, BookingStatus.UNLOADED]),
         )
         .order_by(Booking.queue_index)
-        .all()
-    )
+    ).all()
     if not candidates:
         return
     first = candidates[0]
@@ -254,14 +404,16 @@ def _offer_next_now(session, unloaded_booking: Booking) -> None:
     driver = first.driver
     if driver is None:
         return
-    bot = Bot(token=settings.truck_bot_token)
     text = (
         "Слот освободился. Можете подъехать сейчас?\n"
         f"Элеватор: {first.elevator.name}\n"
         f"Бронь: {first.date} {first.slot_start.strftime('%H:%M')}"
     )
     markup = driver_keyboards.inline_offer_keyboard(first.id, fallback)
-    # fire and forget
-    asyncio.get_event_loop().create_task(
-        bot.send_message(driver.telegram_user_id, text, reply_markup=markup)
+    add_message(
+        session,
+        driver.telegram_user_id,
+        text,
+        reply_markup=markup,
+        dedup_key=f"offer:{first.id}:unloaded:{unloaded_booking.id}",
     )
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from datetime import date
+
 from aiogram.types import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
@@ -8,46 +10,52 @@ from aiogram.types import (
 )
 
 from app.models import Booking, BookingStatus
+from app.utils.time_utils import to_tz
 
 
-def booking_actions_keyboard(booking: Booking) -> InlineKeyboardMarkup | None:
-    disabled: set[str] = set()
-    if booking.status in (
-        BookingStatus.ARRIVED,
-        BookingStatus.UNLOADED,
-        BookingStatus.CANCELLED,
-    ):
-        disabled.add("arrive")
+def booking_actions(booking: Booking) -> list[tuple[str, str]]:
+    """(button text, callback action) pairs available in the booking's status."""
+    if booking.status == BookingStatus.ARRIVED:
+        return [("Разгрузился", "unload")]
     if booking.status in (BookingStatus.UNLOADED, BookingStatus.CANCELLED):
-        disabled.add("unload")
-    if booking.status == BookingStatus.CANCELLED:
-        disabled.add("cancel")
-    if booking.status == BookingStatus.UNLOADED:
+        return []
+    return [("Прибыл", "arrive"), ("Отменить", "cancel")]
+
+
+def booking_actions_keyboard(booking: Booking) -> InlineKeyboardMarkup | None:
+    rows = [
+        [InlineKeyboardButton(text=text, callback_data=f"{action}:{booking.id}")]
+        for text, action in booking_actions(booking)
+    ]
+    if not rows:
         return None
+    return InlineKeyboardMarkup(inline_keyboard=rows)
 
-    rows: list[list[InlineKeyboardButton]] = []
-    action_row: list[InlineKeyboardButton] = []
-    show_arrive = booking.status not in (
-        BookingStatus.ARRIVED,
-        BookingStatus.UNLOADED,
-        BookingStatus.CANCELLED,
-    )
-    show_unload = booking.status in (BookingStatus.ARRIVED,)
 
-    if show_arrive:
-        action_row.append(
-            InlineKeyboardButton(text="Прибыл", callback_data=f"arrive:{booking.id}")
-        )
-    if show_unload and "unload" not in disabled:
-        action_row.append(
-            InlineKeyboardButton(text="Разгрузился", callback_data=f"unload:{booking.id}")
-        )
-    if action_row:
-        rows.append(action_row)
-    if "cancel" not in disabled and not show_unload:
-        rows.append(
-            [InlineKeyboardButton(text="Отменить", callback_data=f"cancel:{booking.id}")]
-        )
+def schedule_keyboard(
+    bookings: list[Booking], day: date, page: int, pages: int, with_actions: bool
+) -> InlineKeyboardMarkup | None:
+    """Per-booking action rows of a schedule page and page navigation."""
+    rows: list[list[InlineKeyboardButton]] = []
+    if with_actions:
+        for booking in bookings:
+            # время слота однозначно: на слот элеватора одна активная бронь
+            slot = to_tz(booking.slot_start).strftime("%H:%M")
+            buttons = [
+                # номер страницы в callback — после действия страница перерисовывается на месте
+                InlineKeyboardButton(text=f"{slot} {text}", callback_data=f"{action}:{booking.id}:{page}")
+                for text, action in booking_actions(booking)
+            ]
+            if buttons:
+                rows.append(buttons)
+    if pages > 1:
+        nav: list[InlineKeyboardButton] = []
+        if page > 0:
+            nav.append(InlineKeyboardButton(text="◀", callback_data=f"sched:{day.isoformat()}:{page - 1}"))
+        nav.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=f"sched:{day.isoformat()}:{page}"))
+        if page < pages - 1:
+            nav.append(InlineKeyboardButton(text="▶", callback_data=f"sched:{day.isoformat()}:{page + 1}"))
+        rows.append(nav)
     if not rows:
         return None
     return InlineKeyboardMarkup(inline_keyboard=rows)
@@ -1,19 +1,40 @@
 import asyncio
 import logging
 
-from aiogram import Bot, Dispatcher
+from aiogram import Dispatcher
 
+from app.bots import close_bots, get_bot
 from app.config import settings
-from app.db import init_db
+from app.db import AsyncSessionLocal, async_engine, init_db
+from app.elevator_bot.board import live_board
+from app.elevator_bot.board import router as board_router
 from app.elevator_bot.handlers import router
+from app.metrics import MetricsExporter
+from app.middlewares import DbSessionMiddleware, MetricsMiddleware
+from app.outbound import close_dispatchers
+from app.outbox import outbox_relay
+from app.writer import write_actor
 
 
 async def main() -> None:
     logging.basicConfig(level=logging.INFO)
     init_db()
-    bot = Bot(token=settings.elevator_bot_token)
+    bot = get_bot(settings.elevator_bot_token)
     dp = Dispatcher()
+    MetricsMiddleware("elevator").setup(dp, async_engine.sync_engine)
+    dp.update.outer_middleware(DbSessionMiddleware(AsyncSessionLocal))
+    dp.include_router(board_router)
     dp.include_router(router)
+    metrics = MetricsExporter("elevator_bot")
+    dp.startup.register(metrics.start)
+    dp.startup.register(outbox_relay.start)
+    dp.startup.register(live_board.start)
+    dp.shutdown.register(live_board.stop)
+    dp.shutdown.register(write_actor.stop)
+    dp.shutdown.register(outbox_relay.stop)
+    dp.shutdown.register(close_dispatchers)
+    dp.shutdown.register(close_bots)
+    dp.shutdown.register(metrics.stop)
     await dp.start_polling(bot)
 
 
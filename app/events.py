@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+from contextlib import suppress
+from datetime import timedelta
+
+from sqlalchemy import delete, func, inspect, insert, select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Booking, BookingEvent, BookingStatus
+from app.utils.time_utils import now_tz
+
+CREATED = "CREATED"
+RESCHEDULED = "RESCHEDULED"
+DELETED = "DELETED"
+
+_SLOT_FIELDS = ("elevator_id", "date", "slot_start")
+
+
+def _event_kind(booking: Booking) -> str | None:
+    attrs = inspect(booking).attrs
+    status = attrs.status.history
+    if status.has_changes() and status.added and status.added[0] in BookingStatus.ALL:
+        return status.added[0]
+    if any(attrs[name].history.has_changes() for name in _SLOT_FIELDS):
+        return RESCHEDULED
+    return None
+
+
+def _collect(session: Session) -> list[dict]:
+    now = now_tz()
+    events: list[dict] = []
+
+    def add(kind: str, booking: Booking) -> None:
+        events.append(
+            {
+                "kind": kind,
+                "booking_id": booking.id,
+                "elevator_id": booking.elevator_id,
+                "date": booking.date,
+                "created_at": now,
+            }
+        )
+
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            add(CREATED, obj)
+    for obj in session.dirty:
+        if isinstance(obj, Booking):
+            kind = _event_kind(obj)
+            if kind is not None:
+                add(kind, obj)
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            add(DELETED, obj)
+    return events
+
+
+def _log_events(session: Session, flush_context) -> None:
+    # событие пишется в той же транзакции, что и изменение брони
+    events = _collect(session)
+    if not events:
+        return
+    session.connection().execute(insert(BookingEvent.__table__).values(events))
+    session.info["events_published"] = True
+
+
+def _ring_after_commit(session: Session) -> None:
+    if session.info.pop("events_published", False):
+        ring()
+
+
+def _forget_events(session: Session) -> None:
+    session.info.pop("events_published", None)
+
+
+# ставятся app.hooks.install_session_hooks
+SESSION_HOOKS = (
+    ("after_flush", _log_events),
+    ("after_commit", _ring_after_commit),
+    ("after_rollback", _forget_events),
+)
+
+
+def _sockets_enabled() -> bool:
+    return bool(settings.event_socket_dir) and hasattr(socket, "AF_UNIX")
+
+
+_sender: socket.socket | None = None
+
+
+def ring() -> None:
+    """Wake subscribers in all processes.
+
+    The datagram carries no payload: subscribers read the log themselves, so a
+    lost or coalesced wakeup only delays them until their polling fallback.
+    """
+    global _sender
+    if not _sockets_enabled():
+        return
+    try:
+        names = os.listdir(settings.event_socket_dir)
+    except FileNotFoundError:
+        return
+    if _sender is None:
+        _sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        _sender.setblocking(False)
+    for name in names:
+        if not name.endswith(".sock"):
+            continue
+        path = os.path.join(settings.event_socket_dir, name)
+        try:
+            _sender.sendto(b"\x01", path)
+        except BlockingIOError:
+            pass  # очередь подписчика полна — он и так проснётся
+        except (ConnectionRefusedError, FileNotFoundError):
+            # сокет завершившегося процесса
+            with suppress(OSError):
+                os.unlink(path)
+        except OSError as exc:
+            logging.debug("Event bus ring to %s failed: %s", path, exc)
+
+
+def prune_events(session: Session, older_than: timedelta | None = None) -> int:
+    cutoff = now_tz() - (older_than or timedelta(hours=settings.event_retention_hours))
+    result = session.execute(delete(BookingEvent).where(BookingEvent.created_at < cutoff))
+    return result.rowcount or 0
+
+
+class EventSubscriber:
+    """Reader of the booking event log woken up by a Unix datagram socket.
+
+    ``poll`` returns events past the high-water mark and works without the
+    socket as well; the socket only shortens the wait between polls.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.high_water = 0
+        self._sock: socket.socket | None = None
+        self._path: str | None = None
+        self._bell = asyncio.Event()
+
+    def open(self) -> None:
+        if not _sockets_enabled():
+            return
+        path = os.path.join(settings.event_socket_dir, f"{self.name}-{os.getpid()}.sock")
+        try:
+            os.makedirs(settings.event_socket_dir, exist_ok=True)
+            with suppress(FileNotFoundError):
+                os.unlink(path)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            sock.bind(path)
+        except OSError as exc:
+            logging.warning("Event bus socket unavailable, falling back to polling: %s", exc)
+            return
+        self._sock, self._path = sock, path
+        asyncio.get_running_loop().add_reader(sock.fileno(), self._on_readable)
+
+    def close(self) -> None:
+        if self._sock is None:
+            return
+        with suppress(RuntimeError):
+            asyncio.get_running_loop().remove_reader(self._sock.fileno())
+        self._sock.close()
+        with suppress(OSError):
+            os.unlink(self._path)
+        self._sock = self._path = None
+
+    def _on_readable(self) -> None:
+        # несколько звонков подряд схлопываются в одно пробуждение
+        while True:
+            try:
+                self._sock.recv(64)
+            except (BlockingIOError, InterruptedError):
+                break
+        self._bell.set()
+
+    def wake(self) -> None:
+        self._bell.set()
+
+    async def wait(self, timeout: float | None) -> bool:
+        """Wait for a ring or the timeout; return True if woken up."""
+        try:
+            await asyncio.wait_for(self._bell.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._bell.clear()
+        return True
+
+    def start_from_now(self, session: Session) -> None:
+        self.high_water = session.scalar(select(func.max(BookingEvent.id))) or 0
+
+    def poll(self, session: Session) -> list[Row]:
+        rows = session.execute(
+            select(
+                BookingEvent.id,
+                BookingEvent.kind,
+                BookingEvent.booking_id,
+                BookingEvent.elevator_id,
+                BookingEvent.date,
+            )
+            .where(BookingEvent.id > self.high_water)
+            .order_by(BookingEvent.id)
+        ).all()
+        if rows:
+            self.high_water = rows[-1].id
+        return rows
@@ -0,0 +1,21 @@
+"""Session hooks that keep booking-derived tables in step with bookings.
+
+Every process gets them through ``init_db``; code that builds its own
+engine (benchmarks) calls ``install_session_hooks`` itself.
+"""
+from __future__ import annotations
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+def install_session_hooks() -> None:
+    """Register the booking hooks on ``Session``; repeated calls are no-ops."""
+    # Late import: модули хуков импортируют app.models
+    from app import events, queue_logic, queue_notifications, rollups
+
+    # порядок важен: события и сводки пишутся до пересчёта очереди, уведомления — до commit
+    for module in (events, rollups, queue_notifications, queue_logic):
+        for name, fn in module.SESSION_HOOKS:
+            if not event.contains(Session, name, fn):
+                event.listen(Session, name, fn)
@@ -0,0 +1,209 @@
+"""In-process metrics in the Prometheus text format.
+
+Counters and histograms are plain dicts keyed by label values, so recording
+costs a dict lookup and, for histograms, a bisect. ``MetricsExporter``
+serves ``REGISTRY`` on a local HTTP port and/or writes it to
+``<METRICS_DIR>/<process>.prom`` for the node_exporter textfile collector.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable
+
+from aiohttp import web
+
+from app.config import settings
+
+# задержки обработчиков и тиков, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# порт процесса = METRICS_PORT + смещение
+PORT_OFFSETS = {"truck_bot": 0, "elevator_bot": 1, "notifications": 2}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        # без меток ряд один и виден с нуля
+        self._values: dict[tuple[str, ...], float] = {} if labels else {(): 0.0}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, total in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, values)} {_number(total)}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at exposition time, so nothing is recorded on the hot path."""
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]) -> None:
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {_number(self.read())}"]
+
+
+class Histogram:
+    def __init__(
+        self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # на набор меток: [счётчики по корзинам (последняя — +Inf), сумма]
+        self._series: dict[tuple[str, ...], list] = {}
+        if not labels:
+            self._series[()] = [[0] * (len(buckets) + 1), 0.0]
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = bound if isinstance(bound, str) else _number(bound)
+                bucket = _labels(self.labels, values, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Counter | Gauge | Histogram] = {}
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Gauge:
+        return self._add(Gauge(name, help, read))
+
+    def histogram(
+        self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class MetricsExporter:
+    """Serve ``REGISTRY`` over HTTP and/or dump it to a file, as configured.
+
+    Both are off by default; ``start`` and ``stop`` fit the dispatcher's
+    startup and shutdown hooks.
+    """
+
+    def __init__(self, process: str, registry: Registry = REGISTRY) -> None:
+        self.process = process
+        self.registry = registry
+        self._runner: web.AppRunner | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = asyncio.Event()
+
+    @property
+    def path(self) -> Path | None:
+        return Path(settings.metrics_dir) / f"{self.process}.prom" if settings.metrics_dir else None
+
+    async def start(self) -> None:
+        if settings.metrics_port and self._runner is None:
+            port = settings.metrics_port + PORT_OFFSETS.get(self.process, 0)
+            app = web.Application()
+            app.router.add_get("/metrics", self._handle)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, settings.metrics_host, port).start()
+            logging.info("Metrics exposed on http://%s:%d/metrics", settings.metrics_host, port)
+        if self.path is not None and (self._task is None or self._task.done()):
+            self._stopping.clear()
+            self._task = asyncio.get_running_loop().create_task(self._write_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8")
+
+    def write(self) -> None:
+        path = self.path
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # textfile collector не должен увидеть недописанный файл
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(self.registry.render(), encoding="utf-8")
+        os.replace(tmp, path)
+
+    async def _write_loop(self) -> None:
+        while True:
+            try:
+                self.write()
+            except OSError as exc:  # pragma: no cover - runtime logging
+                logging.warning("Failed to write metrics to %s: %s", self.path, exc)
+            if self._stopping.is_set():
+                return
+            try:
+                await asyncio.wait_for(self._stopping.wait(), settings.metrics_write_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
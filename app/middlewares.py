@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject
+from sqlalchemy import Engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.metrics import REGISTRY
+
+# запросов к базе на одно обновление
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+UPDATE_SECONDS = REGISTRY.histogram(
+    "bot_update_duration_seconds", "Time to process one update, by bot and handler", ("bot", "handler")
+)
+UPDATE_ERRORS = REGISTRY.counter(
+    "bot_update_errors_total", "Updates whose handler raised, by bot, handler and exception", ("bot", "handler", "error")
+)
+UPDATE_STATEMENTS = REGISTRY.histogram(
+    "bot_update_sql_statements",
+    "SQL statements executed while processing one update, by bot and handler",
+    ("bot", "handler"),
+    STATEMENT_BUCKETS,
+)
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Open one AsyncSession per update and pass it to handlers as ``session``."""
+
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession]) -> None:
+        self.session_factory = session_factory
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        async with self.session_factory() as session:
+            data["session"] = session
+            return await handler(event, data)
+
+
+class _UpdateStats:
+    __slots__ = ("handler", "statements")
+
+    def __init__(self) -> None:
+        self.handler = "unhandled"
+        self.statements = 0
+
+
+_current_update: ContextVar[_UpdateStats | None] = ContextVar("current_update", default=None)
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = _current_update.get()
+    if stats is not None:
+        stats.statements += 1
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Record latency, errors and SQL statements of every update, by handler.
+
+    ``setup`` registers it as the outermost update middleware, so the time
+    includes opening and closing the session, and adds an inner middleware
+    on every observer that only notes which handler matched. Statements are
+    counted by an engine hook through a context variable, which follows the
+    update into ``run_sync``; writes batched by the write actor run in its
+    own task and are not counted.
+    """
+
+    def __init__(self, bot: str) -> None:
+        self.bot = bot
+
+    def setup(self, dp: Dispatcher, *engines: Engine) -> None:
+        dp.update.outer_middleware(self)
+        for name, observer in dp.observers.items():
+            if name not in ("update", "error"):
+                observer.middleware(self._note_handler)
+        for engine in engines:
+            if not event.contains(engine, "before_cursor_execute", _count_statement):
+                event.listen(engine, "before_cursor_execute", _count_statement)
+
+    @staticmethod
+    async def _note_handler(
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        stats = _current_update.get()
+        if stats is not None:
+            stats.handler = data["handler"].callback.__name__
+        return await handler(event, data)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        stats = _UpdateStats()
+        token = _current_update.set(stats)
+        started = perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as exc:
+            UPDATE_ERRORS.inc(self.bot, stats.handler, type(exc).__name__)
+            raise
+        finally:
+            UPDATE_SECONDS.observe(perf_counter() - started, self.bot, stats.handler)
+            UPDATE_STATEMENTS.observe(stats.statements, self.bot, stats.handler)
+            _current_update.reset(token)
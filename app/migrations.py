@@ -0,0 +1,219 @@
+"""Versioned schema migrations for existing databases.
+
+``create_all`` creates missing tables but never changes existing ones, so
+every index or column added to a table that may already exist in a live
+``queue.db`` gets a numbered step here. The applied version is stored in
+``PRAGMA user_version``; steps must be idempotent because fresh databases
+already get the declared indexes from ``create_all``.
+
+    python -m app.migrations            # применить миграции
+    python -m app.migrations --explain  # планы горячих запросов
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+from datetime import timedelta
+from typing import Callable, NamedTuple
+
+from sqlalchemy import Connection, Engine, func, select, text
+
+from app.utils.time_utils import now_tz
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+def _notifications_unique(conn: Connection) -> None:
+    # уникальный индекс не создастся при наличии дублей
+    conn.execute(
+        text(
+            "DELETE FROM notifications WHERE id NOT IN "
+            "(SELECT MIN(id) FROM notifications GROUP BY booking_id, notification_type)"
+        )
+    )
+    conn.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_notifications_booking_type "
+            "ON notifications (booking_id, notification_type)"
+        )
+    )
+
+
+def _bookings_active_slot(conn: Connection) -> None:
+    duplicates = conn.execute(
+        text(
+            "SELECT elevator_id, slot_start, COUNT(*) FROM bookings WHERE status != 'CANCELLED' "
+            "GROUP BY elevator_id, slot_start HAVING COUNT(*) > 1"
+        )
+    ).all()
+    if duplicates:
+        raise RuntimeError(
+            f"bookings has {len(duplicates)} slot(s) with several active bookings, "
+            f"cancel the extra ones first: {duplicates[:5]}"
+        )
+    conn.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_bookings_active_slot "
+            "ON bookings (elevator_id, slot_start) WHERE status != 'CANCELLED'"
+        )
+    )
+
+
+def _bookings_lookup_indexes(conn: Connection) -> None:
+    conn.execute(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_bookings_elevator_date_status "
+            "ON bookings (elevator_id, date, status)"
+        )
+    )
+    conn.execute(
+        text("CREATE INDEX IF NOT EXISTS ix_bookings_driver_slot_end ON bookings (driver_id, slot_end)")
+    )
+
+
+def _daily_stats_backfill(conn: Connection) -> None:
+    # Late import to avoid circular dependency
+    from app.rollups import rebuild_daily_stats
+
+    # таблицу создаёт create_all, здесь она заполняется по уже существующим броням
+    rebuild_daily_stats(conn)
+
+
+def _reset_position_baselines(conn: Connection) -> None:
+    # прежние значения — сырой queue_index с разгруженными бронями; пустая точка
+    # отсчёта задаётся заново при следующем пересчёте дня, без сообщения водителю
+    conn.execute(text("UPDATE bookings SET last_notified_queue_index = NULL"))
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "notifications: unique (booking_id, notification_type)", _notifications_unique),
+    Migration(2, "bookings: (elevator_id, date, status) and (driver_id, slot_end)", _bookings_lookup_indexes),
+    Migration(3, "bookings: one active booking per slot", _bookings_active_slot),
+    Migration(4, "daily_elevator_stats: backfill from bookings", _daily_stats_backfill),
+    Migration(5, "bookings: queue position baselines among active bookings", _reset_position_baselines),
+]
+
+
+def current_version(conn: Connection) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+
+def migrate(engine: Engine) -> int:
+    """Apply pending migrations, each in its own transaction; return the schema version.
+
+    A failing step is logged and stops the run, the database stays at the
+    previous version and the step is retried on the next start.
+    """
+    with engine.connect() as conn:
+        version = current_version(conn)
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        try:
+            with engine.begin() as conn:
+                migration.apply(conn)
+                # PRAGMA не принимает параметры; версия — целое из списка выше
+                conn.exec_driver_sql(f"PRAGMA user_version = {migration.version}")
+        except Exception as exc:
+            logging.error("Migration %d (%s) failed: %s", migration.version, migration.description, exc)
+            break
+        logging.info("Applied migration %d: %s", migration.version, migration.description)
+        version = migration.version
+    return version
+
+
+def _hot_queries() -> dict[str, object]:
+    # Late import to avoid circular dependency
+    from app.models import (
+        Booking,
+        BookingEvent,
+        BookingStatus,
+        DailyElevatorStats,
+        Notification,
+        OutboxMessage,
+        QueueDay,
+        ReminderSchedule,
+    )
+
+    now = now_tz()
+    today = now.date()
+    return {
+        "day queue / free slots": select(Booking.id, Booking.slot_start).where(
+            Booking.elevator_id == 1, Booking.date == today, Booking.status != BookingStatus.CANCELLED
+        ),
+        "offer candidates": select(Booking.id)
+        .where(
+            Booking.elevator_id == 1,
+            Booking.date == today,
+            Booking.status.notin_([BookingStatus.CANCELLED, BookingStatus.UNLOADED]),
+        )
+        .order_by(Booking.queue_index),
+        "my bookings": select(Booking.id)
+        .where(
+            Booking.driver_id == 1,
+            Booking.status != BookingStatus.CANCELLED,
+            Booking.slot_end >= now - timedelta(days=1),
+        )
+        .order_by(Booking.slot_start),
+        "sent notifications": select(Notification.booking_id, Notification.notification_type).where(
+            Notification.booking_id.in_([1, 2, 3])
+        ),
+        "reminder schedule sync": select(ReminderSchedule.id).where(ReminderSchedule.id > 0),
+        "dirty queue days": select(QueueDay.elevator_id, QueueDay.date).where(
+            QueueDay.version != QueueDay.recalculated_version
+        ),
+        "outbox pending": select(OutboxMessage.id).where(
+            OutboxMessage.sent_at.is_(None),
+            OutboxMessage.failed_at.is_(None),
+            OutboxMessage.available_at <= now,
+        ),
+        "booking events": select(BookingEvent.id).where(BookingEvent.id > 0),
+        "event high-water": select(func.max(BookingEvent.id)),
+        "daily stats row": select(DailyElevatorStats.booked).where(
+            DailyElevatorStats.elevator_id == 1, DailyElevatorStats.date == today
+        ),
+    }
+
+
+def explain_hot_queries(engine: Engine) -> list[str]:
+    """Print EXPLAIN QUERY PLAN of every hot query; return names of those that full-scan."""
+    scans: list[str] = []
+    with engine.connect() as conn:
+        for name, stmt in _hot_queries().items():
+            compiled = stmt.compile(dialect=engine.dialect, compile_kwargs={"render_postcompile": True})
+            params = tuple(compiled.params[key] for key in compiled.positiontup)
+            plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled.string}", params).all()
+            print(f"-- {name}")
+            for row in plan:
+                detail = row[-1]
+                print(f"   {detail}")
+                # SCAN <table> без USING INDEX — полный перебор таблицы
+                if detail.startswith("SCAN") and "USING" not in detail:
+                    scans.append(name)
+    return scans
+
+
+def main() -> None:
+    from app.db import engine, init_db
+
+    parser = argparse.ArgumentParser(description="Schema migrations")
+    parser.add_argument("--explain", action="store_true", help="print query plans of hot queries")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    with engine.connect() as conn:
+        print(f"Schema version: {current_version(conn)} of {MIGRATIONS[-1].version}")
+    if args.explain:
+        scans = explain_hot_queries(engine)
+        if scans:
+            print("Full scans: " + ", ".join(sorted(set(scans))))
+            raise SystemExit(1)
+        print("No full scans.")
+
+
+if __name__ == "__main__":
+    main()
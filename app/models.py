@@ -7,11 +7,15 @@ from sqlalchemy import (
     BigInteger,
     Date,
     DateTime,
+    Float,
     ForeignKey,
+    Index,
     Integer,
     String,
+    Text,
     Time,
     func,
+    text,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -59,21 +63,38 @@ class Driver(Base):
 
 class Booking(Base):
     __tablename__ = "bookings"
+    __table_args__ = (
+        Index("ix_bookings_elevator_date_status", "elevator_id", "date", "status"),
+        Index("ix_bookings_driver_slot_end", "driver_id", "slot_end"),
+        # одна активная бронь на слот: гонку подтверждений решает сама база
+        Index(
+            "ux_bookings_active_slot",
+            "elevator_id",
+            "slot_start",
+            unique=True,
+            sqlite_where=text("status != 'CANCELLED'"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     driver_id: Mapped[int] = mapped_column(ForeignKey("drivers.id"), nullable=False)
-    elevator_id: Mapped[int] = mapped_column(ForeignKey("elevators.id"), nullable=False)
+    # active_history: прежние значения нужны хуку дневных сводок (app/rollups.py)
+    # и тогда, когда поле меняют у объекта, устаревшего после commit
+    elevator_id: Mapped[int] = mapped_column(ForeignKey("elevators.id"), nullable=False, active_history=True)
     license_plate: Mapped[str] = mapped_column(String(32), nullable=False)
-    date: Mapped[date] = mapped_column(Date, nullable=False)
-    slot_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    date: Mapped[date] = mapped_column(Date, nullable=False, active_history=True)
+    slot_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, active_history=True)
     slot_end: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     queue_index: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
-    status: Mapped[str] = mapped_column(String(32), nullable=False, default=BookingStatus.PENDING)
+    status: Mapped[str] = mapped_column(
+        String(32), nullable=False, default=BookingStatus.PENDING, active_history=True
+    )
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    arrived_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
-    unloaded_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    arrived_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), active_history=True)
+    unloaded_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), active_history=True)
     cancelled_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
     updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), onupdate=func.now())
+    # позиция среди неразгруженных и неотменённых броней дня, о которой водитель знает
     last_notified_queue_index: Mapped[Optional[int]] = mapped_column(Integer)
 
     driver: Mapped["Driver"] = relationship("Driver", back_populates="bookings")
@@ -86,6 +107,9 @@ class Booking(Base):
 
 class Notification(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ux_notifications_booking_type", "booking_id", "notification_type", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     booking_id: Mapped[int] = mapped_column(ForeignKey("bookings.id"), nullable=False)
@@ -96,3 +120,128 @@ class Notification(Base):
 
     def __repr__(self) -> str:  # pragma: no cover - debug helper
         return f"Notification(id={self.id}, type={self.notification_type})"
+
+
+class ReminderSchedule(Base):
+    """Next reminder due time per booking.
+
+    Rows are written with INSERT OR REPLACE, so with AUTOINCREMENT the id grows in
+    commit order and the notification service can sync changes by high-water mark.
+    """
+
+    __tablename__ = "reminder_schedule"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    booking_id: Mapped[int] = mapped_column(ForeignKey("bookings.id"), unique=True, nullable=False)
+    due_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    notification_type: Mapped[Optional[str]] = mapped_column(String(64))
+
+    def __repr__(self) -> str:  # pragma: no cover - debug helper
+        return f"ReminderSchedule(booking_id={self.booking_id}, due_at={self.due_at})"
+
+
+class QueueDay(Base):
+    """Change journal per elevator-day.
+
+    ``version`` is bumped on every flush that touches the day's bookings;
+    the day is dirty until ``recalculated_version`` catches up.
+    """
+
+    __tablename__ = "queue_days"
+    __table_args__ = (
+        Index(
+            "ix_queue_days_dirty",
+            "elevator_id",
+            "date",
+            sqlite_where=text("version != recalculated_version"),
+        ),
+    )
+
+    elevator_id: Mapped[int] = mapped_column(ForeignKey("elevators.id"), primary_key=True)
+    date: Mapped[date] = mapped_column(Date, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    recalculated_version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    def __repr__(self) -> str:  # pragma: no cover - debug helper
+        return f"QueueDay(elevator_id={self.elevator_id}, date={self.date}, version={self.version})"
+
+
+class DailyElevatorStats(Base):
+    """Booking counters per elevator-day, kept up to date by a flush hook in app/rollups.py.
+
+    ``booked`` includes cancelled bookings; ``unload_seconds`` sums arrival to
+    unload time over the ``timed_unloads`` bookings that have both timestamps.
+    """
+
+    __tablename__ = "daily_elevator_stats"
+
+    elevator_id: Mapped[int] = mapped_column(ForeignKey("elevators.id"), primary_key=True)
+    date: Mapped[date] = mapped_column(Date, primary_key=True)
+    booked: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    arrived: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    late: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    unloaded: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    cancelled: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    timed_unloads: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    unload_seconds: Mapped[float] = mapped_column(Float, nullable=False, default=0)
+
+    def __repr__(self) -> str:  # pragma: no cover - debug helper
+        return f"DailyElevatorStats(elevator_id={self.elevator_id}, date={self.date}, booked={self.booked})"
+
+
+class QueueBoard(Base):
+    """Pinned live queue message of a dispatcher chat for one elevator."""
+
+    __tablename__ = "queue_boards"
+
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    elevator_id: Mapped[int] = mapped_column(ForeignKey("elevators.id"), primary_key=True)
+    message_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self) -> str:  # pragma: no cover - debug helper
+        return f"QueueBoard(chat_id={self.chat_id}, elevator_id={self.elevator_id}, message_id={self.message_id})"
+
+
+class OutboxMessage(Base):
+    """Outbound Telegram message written in the same transaction as the booking change."""
+
+    __tablename__ = "outbox"
+    __table_args__ = (
+        Index("ix_outbox_pending", "available_at", sqlite_where=text("sent_at IS NULL AND failed_at IS NULL")),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    dedup_key: Mapped[str] = mapped_column(String(128), unique=True, nullable=False)
+    bot: Mapped[str] = mapped_column(String(32), nullable=False)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    reply_markup: Mapped[Optional[str]] = mapped_column(Text)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    available_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    sent_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    failed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
+    def __repr__(self) -> str:  # pragma: no cover - debug helper
+        return f"OutboxMessage(id={self.id}, chat_id={self.chat_id}, sent_at={self.sent_at})"
+
+
+class BookingEvent(Base):
+    """Append-only log of committed booking changes, read by subscribers past a high-water mark."""
+
+    __tablename__ = "booking_events"
+    # AUTOINCREMENT: id не переиспользуются после очистки старых событий
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(32), nullable=False)
+    booking_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    elevator_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    date: Mapped[date] = mapped_column(Date, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self) -> str:  # pragma: no cover - debug helper
+        return f"BookingEvent(id={self.id}, kind={self.kind}, booking_id={self.booking_id})"
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.models import Notification
+
+Entry = tuple[int, str]
+
+
+def load_sent(session: Session, booking_ids: Iterable[int]) -> dict[int, set[str]]:
+    """Load already sent notification types for a batch of bookings in one query."""
+    ids = list(set(booking_ids))
+    sent: dict[int, set[str]] = {booking_id: set() for booking_id in ids}
+    if not ids:
+        return sent
+    rows = session.execute(
+        select(Notification.booking_id, Notification.notification_type).where(
+            Notification.booking_id.in_(ids)
+        )
+    )
+    for booking_id, notif_type in rows:
+        sent[booking_id].add(notif_type)
+    return sent
+
+
+def claim(session: Session, entries: Iterable[Entry]) -> set[Entry]:
+    """Insert-or-ignore ledger rows, return the entries this caller actually inserted.
+
+    The unique (booking_id, notification_type) index makes a concurrent worker's
+    insert a no-op, so only one of them gets the entry back and sends it.
+    """
+    values = [
+        {"booking_id": booking_id, "notification_type": notif_type}
+        for booking_id, notif_type in set(entries)
+    ]
+    if not values:
+        return set()
+    stmt = (
+        insert(Notification)
+        .values(values)
+        .on_conflict_do_nothing(index_elements=["booking_id", "notification_type"])
+        .returning(Notification.booking_id, Notification.notification_type)
+    )
+    return {(booking_id, notif_type) for booking_id, notif_type in session.execute(stmt)}
+
@@ -1,35 +1,21 @@
 from __future__ import annotations
 
 import logging
-from datetime import timedelta
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Iterable
 
-from aiogram import Bot
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 
 from app.config import settings
-from app.models import Booking, BookingStatus, Notification, Driver
-from app.queue_logic import recalc_queue
-from app.utils.time_utils import now_tz, get_timezone
-
-
-async def send_notification(bot: Bot, chat_id: int, text: str) -> None:
-    try:
-        await bot.send_message(chat_id, text)
-    except Exception as e:  # pragma: no cover - network error logging
-        logging.exception("Failed to send notification: %s", e)
-
-
-def _already_sent(session: Session, booking_id: int, notif_type: str) -> bool:
-    stmt = select(Notification).where(
-        Notification.booking_id == booking_id,
-        Notification.notification_type == notif_type,
-    )
-    return session.scalars(stmt).first() is not None
-
-
-def _notif_type_for_offset(minutes: int) -> str:
-    return f"REMINDER_{minutes}M"
+from app.models import Booking, BookingStatus
+from app.notification_service.ledger import claim, load_sent
+from app.notification_service.scheduler import ReminderScheduler
+from app.outbound import OutboundDispatcher
+from app.queue_logic import recalc_dirty_queues
+from app.reminders import arm_reminder, next_reminder, notif_type_for_offset, reminder_offsets
+from app.utils.time_utils import now_tz, to_tz
 
 
 def _human_offset(minutes: int) -> str:
@@ -39,62 +25,93 @@ def _human_offset(minutes: int) -> str:
     return f"{minutes} мин"
 
 
-async def process_notifications(session: Session, bot: Bot) -> None:
-    now = now_tz()
-    tz = get_timezone()
-    offsets = sorted({m for m in settings.notification_offsets_minutes if m > 0})
-
-    # Recalculate queues for all active days/elevators
-    pairs = (
-        session.query(Booking.elevator_id, Booking.date)
-        .filter(Booking.status != BookingStatus.CANCELLED)
-        .distinct()
-        .all()
-    )
-    for elevator_id, booking_date in pairs:
-        recalc_queue(session, elevator_id, booking_date)
-    session.commit()
+def _reminder_line(slot_start: datetime, elevator: str, minutes: int) -> str:
+    return f"слот {slot_start.strftime('%d.%m %H:%M')} на элеваторе {elevator} через ≈{_human_offset(minutes)}"
+
 
-    bookings = (
-        session.query(Booking)
-        .join(Driver)
-        .filter(Booking.status != BookingStatus.CANCELLED)
-        .all()
-    )
+def render_digest(lines: list[tuple[datetime, str]]) -> str:
+    """One message with all reminders of a driver, ordered by slot."""
+    lines = sorted(lines)
+    if len(lines) == 1:
+        return f"Напоминание: {lines[0][1]}."
+    return "Напоминания:\n" + "\n".join(f"• {line}" for _, line in lines)
 
+
+def _claim_due(
+    session: Session, due: Iterable[int], now: datetime, horizon: datetime
+) -> tuple[dict[tuple[int, str], tuple[int, datetime, str]], set[tuple[int, str]]]:
+    """Claim the reminders of due bookings in the ledger and re-arm them; commits."""
+    offsets = reminder_offsets()
+    bookings = session.scalars(
+        select(Booking)
+        .options(joinedload(Booking.driver), joinedload(Booking.elevator))
+        .where(Booking.id.in_(due))
+    ).all()
+    sent = load_sent(session, due)
+
+    to_send: dict[tuple[int, str], tuple[int, datetime, str]] = {}
     for booking in bookings:
-        driver = booking.driver
-        if driver is None:
-            continue
-        slot_start = booking.slot_start
-        if slot_start.tzinfo is None:
-            slot_start = slot_start.replace(tzinfo=tz)
-        else:
-            slot_start = slot_start.astimezone(tz)
-        booking.slot_start = slot_start
-        session.add(booking)
-
-        delta = slot_start - now
-        if delta <= timedelta(0):
+        if booking.driver is None or booking.status == BookingStatus.CANCELLED:
             continue
-
-        due_offsets: list[int] = []
-        for minutes in offsets:
-            threshold = timedelta(minutes=minutes)
-            notif_type = _notif_type_for_offset(minutes)
-            if delta <= threshold and not _already_sent(session, booking.id, notif_type):
-                due_offsets.append(minutes)
-        if due_offsets:
-            minutes = min(due_offsets)  # отправляем только самое близкое по времени
-            notif_type = _notif_type_for_offset(minutes)
-            human_delta = _human_offset(minutes)
-            await send_notification(
-                bot,
-                driver.telegram_user_id,
-                f"Напоминание: слот {slot_start.strftime('%d.%m %H:%M')} на элеваторе {booking.elevator.name} через ≈{human_delta}.",
-            )
-            session.add(
-                Notification(booking_id=booking.id, notification_type=notif_type)
+        slot_start = to_tz(booking.slot_start)
+        # ближайшее напоминание на конец окна; слот, начинающийся раньше, — как обычно
+        reminder = next_reminder(slot_start, horizon, offsets, sent[booking.id]) or next_reminder(
+            slot_start, now, offsets, sent[booking.id]
+        )
+        if reminder is not None and reminder[0] <= horizon:
+            minutes = reminder[1]
+            to_send[(booking.id, notif_type_for_offset(minutes))] = (
+                booking.driver.telegram_user_id,
+                slot_start,
+                _reminder_line(slot_start, booking.elevator.name, minutes),
             )
 
+    # параллельный воркер получит пустой claim и ничего не отправит
+    claimed = claim(session, to_send)
+    for booking_id, notif_type in claimed:
+        sent[booking_id].add(notif_type)
+    # ставим следующее напоминание только для затронутых броней; отсчёт от конца окна,
+    # иначе отправленное заранее напоминание снова оказалось бы ближайшим
+    for booking in bookings:
+        arm_reminder(session, booking, sent[booking.id], now=horizon)
+    session.commit()
+    return to_send, claimed
+
+
+async def process_notifications(session: Session, outbound: OutboundDispatcher, scheduler: ReminderScheduler) -> int:
+    """Queue reminders that are due now for sending, return how many were queued.
+
+    Reminders due within ``REMINDER_COALESCE_SECONDS`` are taken together and
+    each driver gets one digest message for all of them; every reminder is
+    still recorded in ``notifications`` on its own.
+    """
+    now = now_tz()
+    horizon = now + timedelta(seconds=settings.reminder_coalesce_seconds)
+
+    # Recalculate queues only for elevator-days changed since the last pass
+    recalc_dirty_queues(session)
     session.commit()
+
+    scheduler.sync(session)
+    due = scheduler.pop_due(horizon)
+    if not due:
+        return 0
+
+    try:
+        to_send, claimed = _claim_due(session, due, now, horizon)
+    except Exception:
+        # проход упал до commit: ничего не заявлено, напоминания уйдут при повторе
+        session.rollback()
+        scheduler.restore(due)
+        raise
+    scheduler.sync(session)
+
+    digests: dict[int, list[tuple[datetime, str]]] = defaultdict(list)
+    for entry in claimed:
+        chat_id, slot_start, line = to_send[entry]
+        digests[chat_id].append((slot_start, line))
+    for chat_id, lines in digests.items():
+        outbound.enqueue(chat_id, render_digest(lines))
+    if len(digests) < len(claimed):
+        logging.info("Coalesced %d reminder(s) into %d message(s)", len(claimed), len(digests))
+    return len(claimed)
@@ -1,26 +1,172 @@
+import argparse
 import asyncio
 import logging
+import signal
+from time import perf_counter
 
-from aiogram import Bot
-
+from app.bots import close_bots
 from app.config import settings
-from app.db import SessionLocal, init_db
+from app.db import SessionLocal, checkpoint_wal, engine, init_db
+from app.events import EventSubscriber, prune_events
+from app.metrics import REGISTRY, MetricsExporter
 from app.notification_service.logic import process_notifications
+from app.notification_service.scheduler import ReminderScheduler
+from app.outbound import OutboundDispatcher, close_dispatchers, get_dispatcher
+from app.outbox import outbox_relay
+from app.utils.time_utils import now_tz
+
+TICK_SECONDS = REGISTRY.histogram("notification_tick_duration_seconds", "Duration of one notification tick")
+TICK_ERRORS = REGISTRY.counter("notification_tick_errors_total", "Notification ticks that raised")
+REMINDERS_SENT = REGISTRY.counter("notification_reminders_total", "Reminders queued for sending")
+
+
+class NotificationDaemon:
+    """Resident notification loop sharing one outbound queue and one DB engine across ticks.
+
+    Poll ticks are planned on a monotonic grid (start + k * interval) so they
+    do not drift; the loop also wakes up early for the next due reminder and
+    whenever a bot publishes a booking event. Polling is the fallback for
+    lost wakeups and hosts without Unix sockets.
+    """
 
+    PRUNE_INTERVAL = 3600.0
+
+    def __init__(self, outbound: OutboundDispatcher, interval: float) -> None:
+        self.outbound = outbound
+        self.interval = interval
+        self.scheduler = ReminderScheduler()
+        self.events = EventSubscriber("notifications")
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        # текущий тик доводится до конца, новый не начинается
+        self._stopping.set()
+        self.events.wake()
+
+    async def tick(self) -> tuple[int, int]:
+        started = perf_counter()
+        with SessionLocal() as session:
+            # события нужны только для пробуждения: расписание и очереди
+            # синхронизируются по своим журналам внутри process_notifications
+            events = len(self.events.poll(session))
+            queued = await process_notifications(session, self.outbound, self.scheduler)
+        TICK_SECONDS.observe(perf_counter() - started)
+        REMINDERS_SENT.inc(amount=queued)
+        return queued, events
 
-async def worker() -> None:
+    def prune(self) -> None:
+        with SessionLocal() as session:
+            pruned = prune_events(session)
+            session.commit()
+        if pruned:
+            logging.info("Pruned %d booking event(s)", pruned)
+
+    def checkpoint(self) -> None:
+        # PASSIVE не ждёт читателей и писателей, WAL не разрастается между тиками
+        result = checkpoint_wal()
+        if result is not None:
+            busy, frames, checkpointed = result
+            logging.debug("WAL checkpoint: busy %d, frames %d, checkpointed %d", busy, frames, checkpointed)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.events.open()
+        with SessionLocal() as session:
+            self.events.start_from_now(session)
+            self.scheduler.bootstrap(session)
+        poll_deadline = loop.time()
+        housekeeping = [
+            (self.prune, self.PRUNE_INTERVAL),
+            (self.checkpoint, settings.sqlite_checkpoint_interval_seconds),
+        ]
+        due_at = [loop.time()] * len(housekeeping)
+        try:
+            while not self._stopping.is_set():
+                poll_deadline = await self._run_tick(loop, poll_deadline)
+                for i, (job, period) in enumerate(housekeeping):
+                    if period > 0 and loop.time() >= due_at[i]:
+                        due_at[i] = loop.time() + period
+                        try:
+                            job()
+                        except Exception as exc:  # pragma: no cover - runtime logging
+                            logging.exception("Housekeeping error in %s: %s", job.__name__, exc)
+                # спим до ближайшего напоминания, но не дольше следующего планового тика;
+                # событие от бота будит раньше
+                reminder_wait = self.scheduler.seconds_until_next(now_tz(), self.interval)
+                wake_at = min(poll_deadline, loop.time() + reminder_wait)
+                if not self._stopping.is_set():
+                    await self.events.wait(max(0.0, wake_at - loop.time()))
+        finally:
+            self.events.close()
+
+    async def _run_tick(self, loop: asyncio.AbstractEventLoop, poll_deadline: float) -> float:
+        started = loop.time()
+        try:
+            queued, events = await self.tick()
+        except Exception as exc:  # pragma: no cover - runtime logging
+            logging.exception("Notification run error: %s", exc)
+            TICK_ERRORS.inc()
+            queued = events = 0
+        finished = loop.time()
+        elapsed = finished - started
+        logging.info(
+            "Notification tick: %.3fs, events %d, queued %d, outbound %d, scheduled %d",
+            elapsed,
+            events,
+            queued,
+            len(self.outbound),
+            len(self.scheduler),
+        )
+        if finished >= poll_deadline:
+            skipped = int((finished - poll_deadline) // self.interval)
+            poll_deadline += (skipped + 1) * self.interval
+            if skipped:
+                logging.warning("Notification tick overran: %.3fs, skipped %d tick(s)", elapsed, skipped)
+        return poll_deadline
+
+
+async def worker(once: bool = False) -> None:
     logging.basicConfig(level=logging.INFO)
     init_db()
-    bot = Bot(token=settings.truck_bot_token)
+    daemon = NotificationDaemon(
+        get_dispatcher(settings.truck_bot_token), settings.notification_poll_interval_seconds
+    )
+    REGISTRY.gauge("notification_outbound_queue", "Messages waiting in the outbound queue", lambda: len(daemon.outbound))
+    REGISTRY.gauge("notification_scheduled_reminders", "Bookings with an armed reminder", lambda: len(daemon.scheduler))
+    metrics = MetricsExporter("notifications")
+    await metrics.start()
     try:
-        with SessionLocal() as session:
-            await process_notifications(session, bot)
-    except Exception as exc:  # pragma: no cover - runtime logging
-        logging.exception("Notification run error: %s", exc)
+        if once:
+            # разовый прогон (cron): синхронизация расписания и отправка наступивших напоминаний
+            with SessionLocal() as session:
+                daemon.events.start_from_now(session)
+                daemon.scheduler.bootstrap(session)
+            await daemon.tick()
+            await outbox_relay.relay_batch()
+            return
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, daemon.stop)
+        # подбирает сообщения outbox, которые боты не успели отправить
+        await outbox_relay.start()
+        await daemon.run()
+        await outbox_relay.stop()
+        logging.info("Notification service stopped")
+    finally:
+        SessionLocal.remove()
+        # дожидаемся отправки уже поставленных в очередь сообщений
+        await close_dispatchers()
+        await close_bots()
+        engine.dispose()
+        # последний снимок пишется после доотправки: в нём и сбои отправки
+        await metrics.stop()
 
 
 def main() -> None:
-    asyncio.run(worker())
+    parser = argparse.ArgumentParser(description="Truck queue notification service")
+    parser.add_argument("--once", action="store_true", help="run a single pass and exit")
+    args = parser.parse_args()
+    asyncio.run(worker(once=args.once))
 
 
 if __name__ == "__main__":
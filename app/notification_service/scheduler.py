@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import heapq
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import Booking, BookingStatus, ReminderSchedule
+from app.reminders import arm_reminder
+from app.utils.time_utils import now_tz, to_tz
+
+
+class ReminderScheduler:
+    """In-process min-heap of upcoming reminders.
+
+    The source of truth is the ``reminder_schedule`` table; the heap is kept in
+    sync with it by reading only rows with ``id`` above the last seen one.
+    Stale heap entries (re-armed or disarmed bookings) are dropped lazily.
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[datetime, int]] = []
+        self._due: dict[int, tuple[datetime, str]] = {}
+        self._high_water = 0
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def bootstrap(self, session: Session) -> None:
+        # Будущие брони, созданные до появления расписания напоминаний
+        scheduled = select(ReminderSchedule.booking_id)
+        bookings = session.scalars(
+            select(Booking).where(
+                Booking.status != BookingStatus.CANCELLED,
+                Booking.slot_start > now_tz(),
+                Booking.id.not_in(scheduled),
+            )
+        ).all()
+        for booking in bookings:
+            arm_reminder(session, booking)
+        session.commit()
+        self.sync(session)
+
+    def sync(self, session: Session) -> None:
+        rows = session.execute(
+            select(
+                ReminderSchedule.id,
+                ReminderSchedule.booking_id,
+                ReminderSchedule.due_at,
+                ReminderSchedule.notification_type,
+            )
+            .where(ReminderSchedule.id > self._high_water)
+            .order_by(ReminderSchedule.id)
+        ).all()
+        for row_id, booking_id, due_at, notif_type in rows:
+            if due_at is None:
+                self._due.pop(booking_id, None)
+            else:
+                self.arm(booking_id, to_tz(due_at), notif_type)
+            self._high_water = row_id
+
+    def arm(self, booking_id: int, due_at: datetime, notif_type: str) -> None:
+        self._due[booking_id] = (due_at, notif_type)
+        heapq.heappush(self._heap, (due_at, booking_id))
+
+    def _drop_stale(self) -> None:
+        while self._heap:
+            due_at, booking_id = self._heap[0]
+            entry = self._due.get(booking_id)
+            if entry is not None and entry[0] == due_at:
+                return
+            heapq.heappop(self._heap)
+
+    def next_due_at(self) -> datetime | None:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> dict[int, tuple[datetime, str]]:
+        """Take the reminders due by ``now``; give them back with ``restore`` if the pass fails."""
+        due: dict[int, tuple[datetime, str]] = {}
+        while True:
+            due_at = self.next_due_at()
+            if due_at is None or due_at > now:
+                return due
+            _, booking_id = heapq.heappop(self._heap)
+            due[booking_id] = self._due.pop(booking_id)
+
+    def restore(self, due: dict[int, tuple[datetime, str]]) -> None:
+        # sync читает только новые строки расписания: без возврата бронь
+        # осталась бы без напоминания до перезапуска процесса
+        for booking_id, (due_at, notif_type) in due.items():
+            if booking_id not in self._due:
+                self.arm(booking_id, due_at, notif_type)
+
+    def seconds_until_next(self, now: datetime, max_wait: float) -> float:
+        due_at = self.next_due_at()
+        if due_at is None:
+            return max_wait
+        return max(0.0, min(max_wait, (due_at - now).total_seconds()))
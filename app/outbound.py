@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from app.bots import get_bot
+from app.config import settings
+from app.metrics import REGISTRY
+
+
+OUTBOUND_MESSAGES = REGISTRY.counter(
+    "outbound_messages_total", "Messages sent through the outbound queue, by bot id and result", ("bot", "result")
+)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated: float | None = None
+
+    def delay(self, now: float) -> float:
+        """Take a token if available, otherwise return seconds until one is."""
+        if self._updated is not None:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+@dataclass(order=True)
+class OutboundMessage:
+    ready_at: float
+    seq: int
+    chat_id: int = field(compare=False)
+    text: str = field(compare=False)
+    kwargs: dict[str, Any] = field(compare=False, default_factory=dict)
+    attempts: int = field(compare=False, default=0)
+    result: asyncio.Future | None = field(compare=False, default=None)
+
+
+class OutboundDispatcher:
+    """Outbound send queue for one bot.
+
+    Messages are released by a single pump that honours a global token bucket
+    and a minimal interval per chat, and sent by up to ``concurrency`` tasks.
+    RetryAfter pauses the chat for the requested time; network and server
+    errors are requeued with exponential backoff up to ``max_attempts``.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        *,
+        rate: float | None = None,
+        chat_interval: float | None = None,
+        concurrency: int | None = None,
+        max_attempts: int | None = None,
+    ) -> None:
+        self.bot = bot
+        self.chat_interval = chat_interval if chat_interval is not None else settings.telegram_chat_interval_seconds
+        self.max_attempts = max_attempts or settings.telegram_send_max_attempts
+        self._bucket = TokenBucket(rate or settings.telegram_global_rate)
+        self._slots = asyncio.Semaphore(concurrency or settings.telegram_send_concurrency)
+        self._heap: list[OutboundMessage] = []
+        self._seq = itertools.count()
+        self._chat_free_at: dict[int, float] = {}
+        self._inflight: set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._pump_task: asyncio.Task | None = None
+        self.sent = 0
+        self.failed = 0
+
+    def __len__(self) -> int:
+        return len(self._heap) + len(self._inflight)
+
+    def enqueue(self, chat_id: int, text: str, **kwargs: Any) -> asyncio.Future:
+        """Queue a send_message call; the returned future resolves to True/False."""
+        loop = asyncio.get_running_loop()
+        message = OutboundMessage(loop.time(), next(self._seq), chat_id, text, kwargs, result=loop.create_future())
+        self._push(message)
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = loop.create_task(self._pump())
+        return message.result
+
+    def _push(self, message: OutboundMessage) -> None:
+        heapq.heappush(self._heap, message)
+        self._idle.clear()
+        self._wakeup.set()
+
+    def _check_idle(self) -> None:
+        if not self._heap and not self._inflight:
+            self._idle.set()
+
+    async def _sleep(self, timeout: float | None) -> None:
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _pump(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._heap:
+                self._check_idle()
+                await self._sleep(None)
+                continue
+            now = loop.time()
+            message = self._heap[0]
+            if message.ready_at > now:
+                await self._sleep(message.ready_at - now)
+                continue
+            heapq.heappop(self._heap)
+            chat_free_at = self._chat_free_at.get(message.chat_id, 0.0)
+            if chat_free_at > now:
+                message.ready_at = chat_free_at
+                heapq.heappush(self._heap, message)
+                continue
+            wait = self._bucket.delay(now)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self._bucket.delay(loop.time())
+            await self._slots.acquire()
+            self._chat_free_at[message.chat_id] = loop.time() + self.chat_interval
+            task = loop.create_task(self._send(message))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+            if len(self._chat_free_at) > 10_000:
+                now = loop.time()
+                self._chat_free_at = {c: t for c, t in self._chat_free_at.items() if t > now}
+
+    def _finish(self, message: OutboundMessage, ok: bool) -> None:
+        if ok:
+            self.sent += 1
+        else:
+            self.failed += 1
+        OUTBOUND_MESSAGES.inc(str(self.bot.id), "sent" if ok else "failed")
+        if message.result is not None and not message.result.done():
+            message.result.set_result(ok)
+
+    async def _send(self, message: OutboundMessage) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            await self.bot.send_message(message.chat_id, message.text, **message.kwargs)
+        except TelegramRetryAfter as exc:
+            retry_at = loop.time() + exc.retry_after
+            self._chat_free_at[message.chat_id] = retry_at
+            message.ready_at = retry_at
+            self._push(message)
+        except (TelegramNetworkError, TelegramServerError) as exc:
+            message.attempts += 1
+            if message.attempts >= self.max_attempts:
+                logging.error("Giving up sending to %s after %d attempts: %s", message.chat_id, message.attempts, exc)
+                self._finish(message, False)
+            else:
+                message.ready_at = loop.time() + min(60.0, 2.0 ** message.attempts)
+                self._push(message)
+        except Exception as exc:  # pragma: no cover - network error logging
+            logging.exception("Failed to send message to %s: %s", message.chat_id, exc)
+            self._finish(message, False)
+        else:
+            self._finish(message, True)
+        finally:
+            self._slots.release()
+            self._inflight.discard(asyncio.current_task())
+            self._check_idle()
+
+    async def drain(self, timeout: float | None = None) -> bool:
+        """Wait until everything queued so far is sent or given up."""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def close(self, timeout: float | None = 10.0) -> None:
+        if not await self.drain(timeout):
+            logging.warning("Outbound queue closed with %d undelivered message(s)", len(self))
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+        for task in list(self._inflight):
+            task.cancel()
+
+
+_dispatchers: dict[str, OutboundDispatcher] = {}
+
+
+def get_dispatcher(token: str) -> OutboundDispatcher:
+    """Process-wide dispatcher per bot token."""
+    dispatcher = _dispatchers.get(token)
+    if dispatcher is None:
+        dispatcher = _dispatchers[token] = OutboundDispatcher(get_bot(token))
+    return dispatcher
+
+
+async def close_dispatchers() -> None:
+    # HTTP-сессии ботов закрывает app.bots.close_bots
+    for dispatcher in list(_dispatchers.values()):
+        await dispatcher.close()
+    _dispatchers.clear()
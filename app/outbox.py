@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import timedelta
+
+from aiogram.types import InlineKeyboardMarkup
+from sqlalchemy import select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.models import OutboxMessage
+from app.outbound import get_dispatcher
+from app.utils.time_utils import now_tz
+
+BOT_TRUCK = "truck"
+BOT_ELEVATOR = "elevator"
+
+# аренда строки на время отправки; больше суммарных повторов OutboundDispatcher
+LEASE = timedelta(minutes=2)
+
+
+def _token(bot: str) -> str:
+    return {BOT_TRUCK: settings.truck_bot_token, BOT_ELEVATOR: settings.elevator_bot_token}[bot]
+
+
+def add_message(
+    session: Session,
+    chat_id: int,
+    text: str,
+    *,
+    dedup_key: str,
+    reply_markup: InlineKeyboardMarkup | None = None,
+    bot: str = BOT_TRUCK,
+) -> None:
+    """Write a message to the outbox in the caller's transaction.
+
+    A repeated ``dedup_key`` is ignored, so retried handlers do not queue twice.
+    """
+    session.execute(
+        insert(OutboxMessage)
+        .values(
+            dedup_key=dedup_key,
+            bot=bot,
+            chat_id=chat_id,
+            text=text,
+            reply_markup=reply_markup.model_dump_json(exclude_none=True) if reply_markup else None,
+            available_at=now_tz(),
+        )
+        .on_conflict_do_nothing(index_elements=["dedup_key"])
+    )
+
+
+class OutboxRelay:
+    """Drain the outbox in batches with at-least-once delivery.
+
+    Rows are leased with UPDATE ... RETURNING, so relays in several processes
+    never send the same row concurrently; a crashed relay's lease expires and
+    the row is picked up again.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+        batch_size: int | None = None,
+        poll_interval: float | None = None,
+    ) -> None:
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.outbox_batch_size
+        self.poll_interval = poll_interval or settings.outbox_poll_interval_seconds
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._stopping.clear()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        # текущая пачка доотправляется, новая не берётся
+        self._stopping.set()
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                relayed = await self.relay_batch()
+            except Exception as exc:  # pragma: no cover - runtime logging
+                logging.exception("Outbox relay error: %s", exc)
+                relayed = 0
+            if relayed >= self.batch_size:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self, session: AsyncSession) -> list:
+        now = now_tz()
+        table = OutboxMessage.__table__
+        pending = (
+            select(table.c.id)
+            .where(
+                table.c.sent_at.is_(None),
+                table.c.failed_at.is_(None),
+                table.c.available_at <= now,
+                (table.c.locked_until.is_(None)) | (table.c.locked_until <= now),
+            )
+            .order_by(table.c.id)
+            .limit(self.batch_size)
+        )
+        rows = (
+            await session.execute(
+                update(table)
+                .where(table.c.id.in_(pending))
+                .values(locked_until=now + LEASE, attempts=table.c.attempts + 1)
+                .returning(table.c.id, table.c.bot, table.c.chat_id, table.c.text, table.c.reply_markup, table.c.attempts)
+            )
+        ).all()
+        await session.commit()
+        return rows
+
+    async def relay_batch(self) -> int:
+        async with self.session_factory() as session:
+            rows = await self._claim(session)
+            if not rows:
+                return 0
+            futures = []
+            for row in rows:
+                markup = InlineKeyboardMarkup.model_validate_json(row.reply_markup) if row.reply_markup else None
+                futures.append(
+                    get_dispatcher(_token(row.bot)).enqueue(row.chat_id, row.text, reply_markup=markup)
+                )
+            results = await asyncio.gather(*futures)
+
+            now = now_tz()
+            table = OutboxMessage.__table__
+            sent = [row.id for row, ok in zip(rows, results) if ok]
+            retry = {row.id: row.attempts for row, ok in zip(rows, results) if not ok}
+            if sent:
+                await session.execute(
+                    update(table).where(table.c.id.in_(sent)).values(sent_at=now, locked_until=None)
+                )
+            for row_id, attempts in retry.items():
+                values: dict = {"locked_until": None}
+                if attempts >= settings.telegram_send_max_attempts:
+                    logging.error("Outbox gave up on message %s after %d attempts", row_id, attempts)
+                    values["failed_at"] = now
+                else:
+                    values["available_at"] = now + timedelta(seconds=min(3600, 30 * 2**attempts))
+                await session.execute(update(table).where(table.c.id == row_id).values(**values))
+            await session.commit()
+            return len(rows)
+
+
+outbox_relay = OutboxRelay()
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import bisect
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import NamedTuple
+
+from app.models import BookingStatus
+
+DayKey = tuple[int, date]
+SortKey = tuple[datetime, datetime, int]
+
+
+class QueueRow(NamedTuple):
+    id: int
+    elevator_id: int
+    date: date
+    slot_start: datetime
+    created_at: datetime
+    status: str
+    arrived_at: datetime | None
+    queue_index: int
+
+
+class QueueChange(NamedTuple):
+    booking_id: int
+    old_index: int
+    new_index: int
+
+
+@dataclass
+class _Entry:
+    key: SortKey
+    arrived: bool
+    index: int
+
+
+class DayQueue:
+    """Ordered queue of one elevator-day.
+
+    Keys are (slot_start, created_at, id) kept sorted with bisect; ``index`` of
+    each entry mirrors the persisted ``queue_index``. Changes are applied one
+    booking at a time and ``diff()`` only looks at the touched position range.
+    """
+
+    def __init__(self, version: int) -> None:
+        self.version = version
+        self._keys: list[SortKey] = []
+        self._entries: dict[int, _Entry] = {}
+        self._lo: int | None = None
+        self._hi: int | None = None
+        self._reordered = False
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _touch(self, pos: int) -> None:
+        self._lo = pos if self._lo is None else min(self._lo, pos)
+        self._hi = pos if self._hi is None else max(self._hi, pos)
+
+    def remove(self, booking_id: int) -> None:
+        entry = self._entries.pop(booking_id, None)
+        if entry is None:
+            return
+        pos = bisect.bisect_left(self._keys, entry.key)
+        del self._keys[pos]
+        self._touch(pos)
+        self._reordered = True
+
+    def apply(self, row: QueueRow, day: DayKey) -> None:
+        if (row.elevator_id, row.date) != day or row.status == BookingStatus.CANCELLED:
+            self.remove(row.id)
+            return
+        key = (row.slot_start, row.created_at, row.id)
+        entry = self._entries.get(row.id)
+        if entry is not None and entry.key == key:
+            if entry.arrived != (row.arrived_at is not None):
+                entry.arrived = row.arrived_at is not None
+                self._touch(bisect.bisect_left(self._keys, key))
+            return
+        if entry is not None:
+            self.remove(row.id)
+        pos = bisect.bisect_left(self._keys, key)
+        self._keys.insert(pos, key)
+        self._entries[row.id] = _Entry(key, row.arrived_at is not None, row.queue_index)
+        self._touch(pos)
+        self._reordered = True
+
+    def _order(self, lo: int, hi: int) -> list[int]:
+        ids = [key[2] for key in self._keys[lo:hi]]
+        # Late swap: if first has not arrived but second has arrived — swap their queue positions
+        if lo == 0 and len(ids) >= 2:
+            first, second = self._entries[ids[0]], self._entries[ids[1]]
+            if not first.arrived and second.arrived:
+                ids[0], ids[1] = ids[1], ids[0]
+        return ids
+
+    def diff(self) -> list[QueueChange]:
+        """Return bookings whose index changed since the last diff and remember them."""
+        if self._lo is None:
+            return []
+        # позиции 0 и 1 участвуют в обмене опоздавшего, поэтому пересчитываем с начала
+        lo = 0 if self._lo <= 1 else self._lo
+        hi = len(self._keys) if self._reordered else min(len(self._keys), max(self._hi + 1, 2))
+        changes: list[QueueChange] = []
+        for pos, booking_id in enumerate(self._order(lo, hi), start=lo):
+            entry = self._entries[booking_id]
+            if entry.index != pos:
+                changes.append(QueueChange(booking_id, entry.index, pos))
+                entry.index = pos
+        self._lo = self._hi = None
+        self._reordered = False
+        return changes
+
+
+class QueueEngine:
+    """Per-process LRU of DayQueue objects, validated by ``queue_days.version``."""
+
+    def __init__(self, max_days: int = 256) -> None:
+        self._days: OrderedDict[DayKey, DayQueue] = OrderedDict()
+        self._max_days = max_days
+
+    def get(self, day: DayKey, version: int) -> DayQueue | None:
+        queue = self._days.get(day)
+        if queue is None or queue.version != version:
+            return None
+        self._days.move_to_end(day)
+        return queue
+
+    def put(self, day: DayKey, queue: DayQueue) -> None:
+        self._days[day] = queue
+        self._days.move_to_end(day)
+        while len(self._days) > self._max_days:
+            self._days.popitem(last=False)
+
+    def discard(self, day: DayKey) -> None:
+        self._days.pop(day, None)
+
+    def clear(self) -> None:
+        self._days.clear()
+
+
+queue_engine = QueueEngine()
@@ -2,38 +2,171 @@ from __future__ import annotations
 
 from datetime import date
 
-from sqlalchemy import select
+from sqlalchemy import case, inspect, select, update
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
 
-from app.models import Booking, BookingStatus
+from app.models import Booking, BookingStatus, QueueDay
+from app.queue_engine import DayKey, DayQueue, QueueChange, QueueRow, queue_engine
+from app.queue_notifications import record_recalc
 
+# Поля, от которых зависит порядок очереди; queue_index сюда не входит,
+# иначе сам пересчёт помечал бы день грязным
+_QUEUE_FIELDS = ("elevator_id", "date", "slot_start", "status", "arrived_at")
 
-def recalc_queue(session: Session, elevator_id: int, booking_date: date) -> list[Booking]:
-    stmt = (
-        select(Booking)
-        .where(
+
+def _touched_days(session: Session) -> dict[DayKey, set[int]]:
+    days: dict[DayKey, set[int]] = {}
+    for obj in session.new | session.deleted:
+        if isinstance(obj, Booking):
+            days.setdefault((obj.elevator_id, obj.date), set()).add(obj.id)
+    for obj in session.dirty:
+        if not isinstance(obj, Booking):
+            continue
+        attrs = inspect(obj).attrs
+        if not any(attrs[name].history.has_changes() for name in _QUEUE_FIELDS):
+            continue
+        days.setdefault((obj.elevator_id, obj.date), set()).add(obj.id)
+        old_elevator = attrs.elevator_id.history.deleted
+        old_date = attrs.date.history.deleted
+        if old_elevator or old_date:
+            old_day = (
+                old_elevator[0] if old_elevator else obj.elevator_id,
+                old_date[0] if old_date else obj.date,
+            )
+            days.setdefault(old_day, set()).add(obj.id)
+    return days
+
+
+def _mark_dirty_days(session: Session, flush_context) -> None:
+    days = _touched_days(session)
+    if not days:
+        return
+    stmt = insert(QueueDay.__table__).values(
+        [
+            {"elevator_id": elevator_id, "date": day, "version": 1, "recalculated_version": 0}
+            for elevator_id, day in days
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["elevator_id", "date"],
+        set_={"version": QueueDay.__table__.c.version + 1},
+    )
+    session.connection().execute(stmt)
+    # запоминаем, какие брони и сколько раз меняли день в этой транзакции,
+    # чтобы движок очереди мог применить изменения инкрементально
+    pending = session.info.setdefault("queue_pending", {})
+    for day, booking_ids in days.items():
+        ids, bumps = pending.get(day, (set(), 0))
+        pending[day] = (ids | booking_ids, bumps + 1)
+
+
+def _forget_pending(session: Session) -> None:
+    session.info.pop("queue_pending", None)
+    session.info.pop("queue_recalculated", None)
+
+
+def _drop_uncommitted_queues(session: Session) -> None:
+    session.info.pop("queue_pending", None)
+    for day in session.info.pop("queue_recalculated", ()):
+        queue_engine.discard(day)
+
+
+# ставятся app.hooks.install_session_hooks
+SESSION_HOOKS = (
+    ("after_flush", _mark_dirty_days),
+    ("after_commit", _forget_pending),
+    ("after_rollback", _drop_uncommitted_queues),
+)
+
+
+def _load_rows(session: Session, *criteria) -> list[QueueRow]:
+    rows = session.execute(
+        select(
+            Booking.id,
+            Booking.elevator_id,
+            Booking.date,
+            Booking.slot_start,
+            Booking.created_at,
+            Booking.status,
+            Booking.arrived_at,
+            Booking.queue_index,
+        ).where(*criteria)
+    )
+    return [QueueRow(*row) for row in rows]
+
+
+def _persist_indexes(session: Session, changes: list[QueueChange]) -> None:
+    if not changes:
+        return
+    table = Booking.__table__
+    new_index = {change.booking_id: change.new_index for change in changes}
+    # один UPDATE на все сдвинувшиеся брони; updated_at присваиваем сам себе,
+    # чтобы onupdate не трогал строки, которые не двигались по существу
+    session.execute(
+        update(table)
+        .where(table.c.id.in_(new_index))
+        .values(queue_index=case(new_index, value=table.c.id), updated_at=table.c.updated_at)
+    )
+    for booking_id, index in new_index.items():
+        booking = session.identity_map.get(identity_key(Booking, booking_id))
+        if booking is not None:
+            set_committed_value(booking, "queue_index", index)
+
+
+def recalc_queue(session: Session, elevator_id: int, booking_date: date) -> list[QueueChange]:
+    """Bring queue_index of an elevator-day up to date, return only changed bookings."""
+    # сбрасываем изменения броней, чтобы движок видел актуальные статусы
+    session.flush()
+    day = (elevator_id, booking_date)
+    version = session.scalar(
+        select(QueueDay.version).where(QueueDay.elevator_id == elevator_id, QueueDay.date == booking_date)
+    ) or 0
+    changed_ids, bumps = session.info.get("queue_pending", {}).pop(day, (set(), 0))
+
+    queue = queue_engine.get(day, version - bumps)
+    if queue is not None:
+        rows = _load_rows(session, Booking.id.in_(changed_ids)) if changed_ids else []
+        for row in rows:
+            queue.apply(row, day)
+        # удалённые из базы брони не вернутся выборкой
+        for booking_id in changed_ids - {row.id for row in rows}:
+            queue.remove(booking_id)
+    else:
+        queue = DayQueue(version)
+        rows = _load_rows(
+            session,
             Booking.elevator_id == elevator_id,
             Booking.date == booking_date,
             Booking.status != BookingStatus.CANCELLED,
         )
-        # Ставим записи без created_at (вновь добавленные) после уже существующих
-        .order_by(
-            Booking.slot_start,
-            Booking.created_at.is_(None),
-            Booking.created_at,
-            Booking.id,
-        )
+        for row in rows:
+            queue.apply(row, day)
+    queue.version = version
+    queue_engine.put(day, queue)
+    session.info.setdefault("queue_recalculated", set()).add(day)
+
+    changes = queue.diff()
+    _persist_indexes(session, changes)
+    # водителей оповещает хук перед commit — одно сообщение на весь каскад
+    record_recalc(session, day)
+    session.execute(
+        update(QueueDay)
+        .where(QueueDay.elevator_id == elevator_id, QueueDay.date == booking_date)
+        .values(recalculated_version=QueueDay.version)
     )
-    bookings = list(session.scalars(stmt).all())
-    for idx, booking in enumerate(bookings):
-        booking.queue_index = idx
+    return changes
 
-    # Late swap: if first has not arrived but second has arrived — swap their queue positions
-    if len(bookings) >= 2:
-        first, second = bookings[0], bookings[1]
-        if first.arrived_at is None and second.arrived_at is not None:
-            first.queue_index, second.queue_index = 1, 0
-            bookings[0], bookings[1] = second, first
 
-    session.flush()
-    return bookings
+def recalc_dirty_queues(session: Session) -> int:
+    """Recalculate only elevator-days changed since their last recalculation."""
+    days = session.execute(
+        select(QueueDay.elevator_id, QueueDay.date).where(
+            QueueDay.version != QueueDay.recalculated_version
+        )
+    ).all()
+    for elevator_id, booking_date in days:
+        recalc_queue(session, elevator_id, booking_date)
+    return len(days)
@@ -0,0 +1,125 @@
+"""QUEUE_POSITION_CHANGED: tell drivers when today's queue moves them.
+
+``recalc_queue`` records the recalculated elevator-days in the session;
+right before commit each of today's recalculated days is read once and
+every active booking's position — among bookings that are neither
+unloaded nor cancelled, as on the board — is compared with
+``last_notified_queue_index``. Each affected driver gets one outbox
+message for the cascade, in the same transaction as the moves themselves.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
+
+from app.config import settings
+from app.models import Booking, BookingStatus
+from app.outbox import add_message, outbox_relay
+from app.queue_engine import DayKey
+from app.utils.time_utils import to_tz
+
+
+def record_recalc(session: Session, day: DayKey) -> None:
+    """Remember a recalculated elevator-day until the transaction commits."""
+    # разгрузка не меняет queue_index, но сдвигает позиции всех, кто за ней, —
+    # поэтому запоминается день, а не дифф индексов
+    session.info.setdefault("queue_days", set()).add(day)
+
+
+def _should_notify(reference: int, position: int) -> bool:
+    if position == reference:
+        return False
+    # первым в очереди водитель узнаёт о себе всегда, мелкие сдвиги гасит порог
+    return position == 0 or abs(position - reference) >= settings.queue_position_min_shift
+
+
+def _position_text(bookings: list[tuple[Booking, int, int]]) -> str:
+    lines = ["Очередь сдвинулась:"]
+    for booking, reference, position in bookings:
+        direction = "вперёд" if position < reference else "назад"
+        lines.append(
+            f"• {booking.elevator.name}, слот {to_tz(booking.slot_start).strftime('%H:%M')}: "
+            f"вы {position + 1}-й в очереди (были {reference + 1}-м, сдвиг {direction})"
+        )
+    if any(position == 0 for _, _, position in bookings):
+        lines.append("Вы следующий — будьте готовы подъехать.")
+    return "\n".join(lines)
+
+
+def _active_queues(session: Session, elevator_ids: set[int], day: date) -> dict[int, list[Booking]]:
+    """Active bookings of the elevators' day in queue order, as the board shows them."""
+    bookings = session.scalars(
+        select(Booking)
+        .options(joinedload(Booking.driver), joinedload(Booking.elevator))
+        .where(
+            Booking.elevator_id.in_(elevator_ids),
+            Booking.date == day,
+            Booking.status.notin_([BookingStatus.CANCELLED, BookingStatus.UNLOADED]),
+        )
+        .order_by(Booking.elevator_id, Booking.queue_index)
+    ).all()
+    queues: dict[int, list[Booking]] = defaultdict(list)
+    for booking in bookings:
+        queues[booking.elevator_id].append(booking)
+    return queues
+
+
+def _notify(session: Session, days: set[DayKey]) -> int:
+    today = date.today()
+    elevator_ids = {elevator_id for elevator_id, day in days if day == today}
+    if not elevator_ids:
+        return 0
+    by_driver: dict[int, list[tuple[Booking, int, int]]] = defaultdict(list)
+    for bookings in _active_queues(session, elevator_ids, today).values():
+        for position, booking in enumerate(bookings):
+            reference = booking.last_notified_queue_index
+            if reference is None:
+                # новая бронь: позиция становится точкой отсчёта без сообщения
+                booking.last_notified_queue_index = position
+                continue
+            if booking.driver is not None and _should_notify(reference, position):
+                by_driver[booking.driver.telegram_user_id].append((booking, reference, position))
+                booking.last_notified_queue_index = position
+    for chat_id, items in by_driver.items():
+        items.sort(key=lambda item: item[0].slot_start)
+        # ключ — сами сдвиги: повтор той же транзакции не дублирует сообщение,
+        # а следующий сдвиг идёт от новой точки отсчёта и получает свой ключ
+        moved = ",".join(f"{booking.id}:{reference}->{position}" for booking, reference, position in items)
+        add_message(
+            session,
+            chat_id,
+            _position_text(items),
+            dedup_key=f"position:{moved}",
+        )
+    return len(by_driver)
+
+
+def _notify_moves(session: Session) -> None:
+    days = session.info.pop("queue_days", None)
+    if not days:
+        return
+    # статусы и индексы этой транзакции должны попасть в выборку позиций
+    session.flush()
+    if _notify(session, days):
+        session.info["queue_notified"] = True
+
+
+def _wake_relay(session: Session) -> None:
+    if session.info.pop("queue_notified", False):
+        outbox_relay.wake()
+
+
+def _forget_moves(session: Session) -> None:
+    for key in ("queue_days", "queue_notified"):
+        session.info.pop(key, None)
+
+
+# ставятся app.hooks.install_session_hooks
+SESSION_HOOKS = (
+    ("before_commit", _notify_moves),
+    ("after_commit", _wake_relay),
+    ("after_rollback", _forget_moves),
+)
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Booking, BookingStatus, ReminderSchedule
+from app.notification_service.ledger import load_sent
+from app.utils.time_utils import now_tz, to_tz
+
+
+def notif_type_for_offset(minutes: int) -> str:
+    return f"REMINDER_{minutes}M"
+
+
+def reminder_offsets() -> list[int]:
+    return sorted({m for m in settings.notification_offsets_minutes if m > 0})
+
+
+def next_reminder(
+    slot_start: datetime,
+    now: datetime,
+    offsets: list[int],
+    sent: set[str],
+) -> tuple[datetime, int] | None:
+    """Return (due_at, offset_minutes) of the next reminder for a slot, or None.
+
+    If one or more offsets have already passed, only the closest one is due (now);
+    otherwise the reminder is due at ``slot_start - offset`` of the next offset.
+    """
+    delta = slot_start - now
+    if delta <= timedelta(0):
+        return None
+    passed = [m for m in offsets if delta <= timedelta(minutes=m)]
+    if passed:
+        minutes = min(passed)  # отправляем только самое близкое по времени
+        if notif_type_for_offset(minutes) not in sent:
+            return now, minutes
+    upcoming = [m for m in offsets if delta > timedelta(minutes=m)]
+    if upcoming:
+        minutes = max(upcoming)
+        return slot_start - timedelta(minutes=minutes), minutes
+    return None
+
+
+def _write_schedule(session: Session, booking_id: int, due: tuple[datetime, int] | None) -> None:
+    due_at, notif_type = (due[0], notif_type_for_offset(due[1])) if due else (None, None)
+    session.execute(
+        insert(ReminderSchedule)
+        .prefix_with("OR REPLACE")
+        .values(booking_id=booking_id, due_at=due_at, notification_type=notif_type)
+    )
+
+
+def arm_reminder(
+    session: Session, booking: Booking, sent: set[str] | None = None, now: datetime | None = None
+) -> None:
+    """Re-arm the reminder of a single booking after create/reschedule/cancel.
+
+    ``sent`` may be passed by callers that already preloaded the ledger; ``now``
+    by callers that sent reminders ahead of their due time.
+    """
+    if booking.id is None:
+        session.flush()
+    due = None
+    if booking.status != BookingStatus.CANCELLED:
+        if sent is None:
+            sent = load_sent(session, [booking.id])[booking.id]
+        due = next_reminder(to_tz(booking.slot_start), now or now_tz(), reminder_offsets(), sent)
+    _write_schedule(session, booking.id, due)
+
+
+def disarm_reminder(session: Session, booking_id: int) -> None:
+    _write_schedule(session, booking_id, None)
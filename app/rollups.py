@@ -0,0 +1,181 @@
+"""Daily per-elevator booking counters maintained in the writing transaction.
+
+Every flush that creates, changes or deletes a booking subtracts the
+booking's old contribution from its day and adds the new one with a single
+upsert, so dashboards read one ``daily_elevator_stats`` row per day. The
+same contribution is computed in SQL by ``rebuild_daily_stats`` for backfill:
+
+    python -m app.rollups [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+"""
+from __future__ import annotations
+
+import argparse
+from datetime import date, datetime
+
+from sqlalchemy import Connection, Integer, and_, case, cast, delete, func, inspect, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app.models import Booking, BookingStatus, DailyElevatorStats
+from app.utils.time_utils import parse_date, to_tz
+
+COUNTERS = ("booked", "arrived", "late", "unloaded", "cancelled", "timed_unloads", "unload_seconds")
+_FIELDS = ("elevator_id", "date", "slot_start", "status", "arrived_at", "unloaded_at")
+
+DayKey = tuple[int, date]
+
+
+def _values(booking: Booking, before: bool) -> tuple:
+    attrs = inspect(booking).attrs
+    values = []
+    for name in _FIELDS:
+        history = attrs[name].history
+        if before and history.added:
+            # None в прежнем значении история не хранит
+            values.append(history.deleted[0] if history.deleted else None)
+        else:
+            values.append(getattr(booking, name))
+    return tuple(values)
+
+
+def _contribution(
+    status: str, slot_start: datetime, arrived_at: datetime | None, unloaded_at: datetime | None
+) -> tuple[float, ...]:
+    arrived = arrived_at is not None
+    unloaded = unloaded_at is not None
+    timed = arrived and unloaded
+    return (
+        1,
+        int(arrived),
+        int(arrived and to_tz(arrived_at) > to_tz(slot_start)),
+        int(unloaded),
+        int(status == BookingStatus.CANCELLED),
+        int(timed),
+        _whole_seconds(arrived_at, unloaded_at) if timed else 0.0,
+    )
+
+
+def _whole_seconds(start: datetime, end: datetime) -> float:
+    # целые секунды, как strftime('%s') в rebuild_daily_stats: суммы обоих путей совпадают точно
+    return (to_tz(end).replace(microsecond=0) - to_tz(start).replace(microsecond=0)).total_seconds()
+
+
+def _deltas(session: Session) -> dict[DayKey, list[float]]:
+    deltas: dict[DayKey, list[float]] = {}
+
+    def add(values: tuple, sign: int) -> None:
+        elevator_id, day, slot_start, status, arrived_at, unloaded_at = values
+        totals = deltas.setdefault((elevator_id, day), [0] * len(COUNTERS))
+        for i, value in enumerate(_contribution(status, slot_start, arrived_at, unloaded_at)):
+            totals[i] += sign * value
+
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            add(_values(obj, before=False), 1)
+    for obj in session.dirty:
+        if not isinstance(obj, Booking):
+            continue
+        before, after = _values(obj, before=True), _values(obj, before=False)
+        if before != after:
+            add(before, -1)
+            add(after, 1)
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            add(_values(obj, before=True), -1)
+    return {day: totals for day, totals in deltas.items() if any(totals)}
+
+
+def _apply_deltas(session: Session, flush_context) -> None:
+    deltas = _deltas(session)
+    if not deltas:
+        return
+    stmt = insert(DailyElevatorStats.__table__).values(
+        [
+            {"elevator_id": elevator_id, "date": day, **dict(zip(COUNTERS, totals))}
+            for (elevator_id, day), totals in deltas.items()
+        ]
+    )
+    table = DailyElevatorStats.__table__
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["elevator_id", "date"],
+        set_={name: table.c[name] + stmt.excluded[name] for name in COUNTERS},
+    )
+    session.connection().execute(stmt)
+
+
+# ставятся app.hooks.install_session_hooks
+SESSION_HOOKS = (("after_flush", _apply_deltas),)
+
+
+def _epoch(column):
+    # доли секунды отрезаются до разбора: SQLite округляет их до миллисекунд, Python отбрасывает
+    return cast(func.strftime("%s", func.substr(column, 1, 19)), Integer)
+
+
+def _aggregate_query(*criteria):
+    arrived = Booking.arrived_at.is_not(None)
+    unloaded = Booking.unloaded_at.is_not(None)
+    timed = and_(arrived, unloaded)
+    late = and_(arrived, func.julianday(Booking.arrived_at) > func.julianday(Booking.slot_start))
+    unload_seconds = _epoch(Booking.unloaded_at) - _epoch(Booking.arrived_at)
+    return (
+        select(
+            Booking.elevator_id,
+            Booking.date,
+            func.count(),
+            func.sum(case((arrived, 1), else_=0)),
+            func.sum(case((late, 1), else_=0)),
+            func.sum(case((unloaded, 1), else_=0)),
+            func.sum(case((Booking.status == BookingStatus.CANCELLED, 1), else_=0)),
+            func.sum(case((timed, 1), else_=0)),
+            func.total(case((timed, unload_seconds))),
+        )
+        .where(*criteria)
+        .group_by(Booking.elevator_id, Booking.date)
+    )
+
+
+def rebuild_daily_stats(
+    conn: Connection | Session, date_from: date | None = None, date_to: date | None = None
+) -> int:
+    """Recompute the rollup of a date range (everything by default) from bookings; return the row count."""
+    table = DailyElevatorStats.__table__
+    criteria, bookings_criteria = [], []
+    if date_from is not None:
+        criteria.append(table.c.date >= date_from)
+        bookings_criteria.append(Booking.date >= date_from)
+    if date_to is not None:
+        criteria.append(table.c.date <= date_to)
+        bookings_criteria.append(Booking.date <= date_to)
+    conn.execute(delete(table).where(*criteria))
+    result = conn.execute(
+        insert(table).from_select(["elevator_id", "date", *COUNTERS], _aggregate_query(*bookings_criteria))
+    )
+    return result.rowcount or 0
+
+
+def format_day_stats(stats: DailyElevatorStats) -> str:
+    mean = f"{round(stats.unload_seconds / stats.timed_unloads / 60)} мин" if stats.timed_unloads else "—"
+    return (
+        f"Итоги {stats.date}: записано {stats.booked - stats.cancelled} (отменено {stats.cancelled}), "
+        f"прибыло {stats.arrived} (с опозданием {stats.late}), разгружено {stats.unloaded}, "
+        f"прибытие→разгрузка в среднем {mean}"
+    )
+
+
+def main() -> None:
+    from app.db import SessionLocal, init_db
+
+    parser = argparse.ArgumentParser(description="Rebuild daily elevator stats from bookings")
+    parser.add_argument("--from", dest="date_from", type=parse_date)
+    parser.add_argument("--to", dest="date_to", type=parse_date)
+    args = parser.parse_args()
+    init_db()
+    with SessionLocal() as session:
+        count = rebuild_daily_stats(session, args.date_from, args.date_to)
+        session.commit()
+    print(f"Rebuilt {count} elevator-day row(s).")
+
+
+if __name__ == "__main__":
+    main()
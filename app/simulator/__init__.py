@@ -0,0 +1 @@
+# Load simulator package
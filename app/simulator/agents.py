@@ -0,0 +1,233 @@
+"""Synthetic users: drivers booking through the truck bot, dispatchers working the schedule.
+
+Users only see what the bots sent to the fake Bot API (texts and keyboards)
+and answer with updates fed straight into the bot's dispatcher; each update
+is timed from arrival to the end of its handler, Bot API calls included.
+"""
+from __future__ import annotations
+
+import itertools
+import logging
+import random
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from app.simulator.fake_api import FakeBotApi
+from app.simulator.report import Latencies
+from app.utils.time_utils import combine_date_time
+
+# сколько ответов бота водитель обрабатывает, прежде чем сдаться
+DRIVER_MAX_STEPS = 40
+# нажатий диспетчера за один шаг виртуального времени
+DISPATCHER_MAX_CLICKS = 200
+
+
+class BotClient:
+    """Feeds updates of simulated users into one bot and records handler latency."""
+
+    def __init__(self, name: str, dp: Dispatcher, bot: Bot, api: FakeBotApi, latencies: Latencies) -> None:
+        self.name = name
+        self.dp = dp
+        self.bot = bot
+        self.api = api
+        self.latencies = latencies
+        self.updates = 0
+        self.errors: Counter[str] = Counter()
+        self._ids = itertools.count(1)
+
+    async def send(self, user_id: int, text: str, label: str) -> dict[str, Any] | None:
+        """Send a text message as the user; return the bot's last message in the chat."""
+        update_id = next(self._ids)
+        await self._feed(
+            label,
+            {
+                "update_id": update_id,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": _user(user_id),
+                    "text": text,
+                },
+            },
+        )
+        return self.api.last_message(user_id)
+
+    async def press(self, user_id: int, message_id: int, data: str, label: str) -> dict[str, Any] | None:
+        """Press an inline button of a bot message; return the message after the handler."""
+        update_id = next(self._ids)
+        await self._feed(
+            label,
+            {
+                "update_id": update_id,
+                "callback_query": {
+                    "id": str(update_id),
+                    "from": _user(user_id),
+                    "chat_instance": str(user_id),
+                    "data": data,
+                    "message": self.api.message(user_id, message_id),
+                },
+            },
+        )
+        return self.api.message(user_id, message_id)
+
+    async def _feed(self, label: str, raw: dict[str, Any]) -> None:
+        update = Update.model_validate(raw, context={"bot": self.bot})
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as exc:
+            self.errors[label] += 1
+            if self.errors[label] == 1:
+                logging.exception("%s: handler %s failed: %s", self.name, label, exc)
+        finally:
+            self.latencies.add(f"{self.name}.{label}", time.perf_counter() - started)
+            self.updates += 1
+
+
+def _user(user_id: int) -> dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": "Sim", "username": f"sim{user_id}"}
+
+
+def _reply_buttons(message: dict[str, Any] | None) -> list[str]:
+    markup = (message or {}).get("reply_markup") or {}
+    return [button["text"] for row in markup.get("keyboard", []) for button in row]
+
+
+def _inline_buttons(message: dict[str, Any] | None) -> list[tuple[str, str]]:
+    markup = (message or {}).get("reply_markup") or {}
+    return [(button["text"], button["callback_data"]) for row in markup.get("inline_keyboard", []) for button in row]
+
+
+async def book_slot(client: BotClient, user_id: int, plate: str, rng: random.Random, outcomes: Counter[str]) -> None:
+    """Walk /book → elevator → date → slot → plate → confirm, picking buttons at random.
+
+    A taken slot sends the driver back to the slot list; a day without free
+    slots to another day or elevator. Outcome counters: ``booked``,
+    ``slot_taken`` (per conflict), ``no_slots``, ``gave_up``.
+    """
+    full: set[tuple[str, str]] = set()
+    elevator = day = None
+    reply = await client.send(user_id, "/book", "book")
+    for _ in range(DRIVER_MAX_STEPS):
+        text = (reply or {}).get("text", "")
+        buttons = _reply_buttons(reply)
+        if text.startswith("Бронирование подтверждено"):
+            outcomes["booked"] += 1
+            return
+        if "Слот уже занят" in text:
+            outcomes["slot_taken"] += 1
+        if text.startswith("На эту дату нет"):
+            full.add((elevator, day))
+        if text.startswith("Выберите элеватор"):
+            candidates = [name for name in buttons if sum(e == name for e, _ in full) < 2]
+            if not candidates:
+                outcomes["no_slots"] += 1
+                return
+            elevator = rng.choice(candidates)
+            reply = await client.send(user_id, elevator, "elevator")
+        elif text.startswith(("Выберите дату", "На эту дату нет")):
+            days = [value for value in buttons if (elevator, value) not in full]
+            if not days:
+                reply = await client.send(user_id, "/book", "book")
+                continue
+            day = rng.choice(days)
+            reply = await client.send(user_id, day, "date")
+        elif "Выберите время" in text or "Выберите другое время" in text:
+            reply = await client.send(user_id, rng.choice(buttons), "slot")
+        elif text.startswith("Введите номер"):
+            reply = await client.send(user_id, plate, "plate")
+        elif text.startswith("Подтвердите"):
+            reply = await client.send(user_id, "Подтвердить", "confirm")
+        else:
+            if "свободных слотов на эту дату больше нет" in _previous_text(client, user_id, reply):
+                full.add((elevator, day))
+            # после занятого последнего слота бот показывает главное меню — начинаем заново
+            reply = await client.send(user_id, "/book", "book")
+    outcomes["gave_up"] += 1
+
+
+def _previous_text(client: BotClient, user_id: int, message: dict[str, Any] | None) -> str:
+    messages = client.api.chats.get(user_id, {})
+    earlier = [message_id for message_id in messages if message and message_id < message["message_id"]]
+    return messages[max(earlier)]["text"] if earlier else ""
+
+
+class DispatcherAgent:
+    """Dispatcher of one elevator working today's schedule message.
+
+    At each step of virtual time it presses "Прибыл" once a truck's arrival
+    time has come, "Разгрузился" ``unload_after`` later and "Отменить" for
+    the bookings picked as no-shows two hours before their slot, turning
+    pages when the current one has nothing left to do.
+    """
+
+    CANCEL_AHEAD = timedelta(hours=2)
+
+    def __init__(
+        self,
+        client: BotClient,
+        user_id: int,
+        elevator: str,
+        seed: int,
+        cancel_rate: float,
+        unload_after: timedelta,
+    ) -> None:
+        self.client = client
+        self.user_id = user_id
+        self.elevator = elevator
+        self.seed = seed
+        self.cancel_rate = cancel_rate
+        self.unload_after = unload_after
+        self.message_id: int | None = None
+        self.clicks: Counter[str] = Counter()
+        self._plans: dict[int, tuple[bool, timedelta]] = {}
+
+    async def start(self, board: bool) -> None:
+        reply = await self.client.send(self.user_id, "/start", "start")
+        await self.client.press(self.user_id, reply["message_id"], f"elevator:{self.elevator}", "elevator")
+        if board:
+            await self.client.send(self.user_id, "/board", "board")
+        reply = await self.client.send(self.user_id, "Сегодня", "schedule")
+        self.message_id = reply["message_id"]
+
+    def _plan(self, booking_id: int) -> tuple[bool, timedelta]:
+        # решение по брони не зависит от порядка обхода: отдельный генератор на бронь
+        plan = self._plans.get(booking_id)
+        if plan is None:
+            rng = random.Random(f"{self.seed}:{booking_id}")
+            plan = self._plans[booking_id] = (rng.random() < self.cancel_rate, timedelta(minutes=rng.randint(-15, 30)))
+        return plan
+
+    def _due(self, label: str, data: str, now: datetime, today: date) -> bool:
+        action, booking_id, _ = data.split(":")
+        slot_start = combine_date_time(today, datetime.strptime(label.split()[0], "%H:%M").time())
+        cancel, delay = self._plan(int(booking_id))
+        if action == "cancel":
+            return cancel and now >= slot_start - self.CANCEL_AHEAD
+        if action == "arrive":
+            return not cancel and now >= slot_start + delay
+        return action == "unload" and now >= slot_start + delay + self.unload_after
+
+    async def act(self, now: datetime) -> None:
+        if self.message_id is None:
+            return
+        today = date.today()
+        for _ in range(DISPATCHER_MAX_CLICKS):
+            buttons = _inline_buttons(self.client.api.message(self.user_id, self.message_id))
+            actions = [(label, data) for label, data in buttons if not data.startswith("sched:")]
+            due = [data for label, data in actions if self._due(label, data, now, today)]
+            if due:
+                action = due[0].split(":")[0]
+                self.clicks[action] += 1
+                await self.client.press(self.user_id, self.message_id, due[0], action)
+                continue
+            forward = [data for label, data in buttons if label == "▶"]
+            if actions or not forward:
+                return
+            await self.client.press(self.user_id, self.message_id, forward[0], "page")
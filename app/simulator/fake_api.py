@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from typing import Any
+
+from aiohttp import web
+
+# методы, которыми боты отправляют сообщения пользователям
+SEND_METHODS = frozenset({"sendMessage", "sendDocument", "editMessageText", "editMessageReplyMarkup"})
+
+
+class FakeBotApi:
+    """Local stand-in for the Telegram Bot API.
+
+    Answers the methods the bots call at ``/bot<token>/<method>`` and keeps
+    the last text and keyboard of every message per chat, which is all the
+    simulated users read. ``latency`` adds a fixed delay to every call.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self.chats: dict[int, dict[int, dict[str, Any]]] = {}
+        self._message_ids = itertools.count(1)
+        self._runner: web.AppRunner | None = None
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._app = app
+
+    async def start(self, host: str, port: int) -> None:
+        self._runner = web.AppRunner(self._app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @property
+    def sent(self) -> int:
+        return sum(count for method, count in self.calls.items() if method in SEND_METHODS)
+
+    def last_message(self, chat_id: int) -> dict[str, Any] | None:
+        messages = self.chats.get(chat_id)
+        if not messages:
+            return None
+        return messages[max(messages)]
+
+    def message(self, chat_id: int, message_id: int) -> dict[str, Any] | None:
+        return self.chats.get(chat_id, {}).get(message_id)
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        handler = getattr(self, f"_{method}", None)
+        if handler is None:
+            return _ok(True)
+        return handler(params)
+
+    def _store(self, chat_id: int, message_id: int, params: dict[str, Any]) -> dict[str, Any]:
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", ""),
+        }
+        markup = params.get("reply_markup")
+        if markup:
+            message["reply_markup"] = json.loads(markup)
+        self.chats.setdefault(chat_id, {})[message_id] = message
+        return message
+
+    @staticmethod
+    def _echo(message: dict[str, Any]) -> dict[str, Any]:
+        # в ответах Telegram у сообщения бывает только inline-клавиатура
+        if "inline_keyboard" in message.get("reply_markup", {}):
+            return message
+        return {key: value for key, value in message.items() if key != "reply_markup"}
+
+    def _sendMessage(self, params: dict[str, Any]) -> web.Response:
+        return _ok(self._echo(self._store(int(params["chat_id"]), next(self._message_ids), params)))
+
+    def _sendDocument(self, params: dict[str, Any]) -> web.Response:
+        message = self._store(int(params["chat_id"]), next(self._message_ids), {"text": params.get("caption", "")})
+        return _ok({**message, "document": {"file_id": "document", "file_unique_id": "document"}})
+
+    def _editMessageText(self, params: dict[str, Any]) -> web.Response:
+        chat_id, message_id = int(params["chat_id"]), int(params["message_id"])
+        current = self.message(chat_id, message_id)
+        if current is None:
+            return _error(400, "Bad Request: message to edit not found")
+        markup = json.loads(params["reply_markup"]) if params.get("reply_markup") else None
+        if current["text"] == params.get("text") and current.get("reply_markup") == markup:
+            return _error(400, "Bad Request: message is not modified")
+        return _ok(self._echo(self._store(chat_id, message_id, params)))
+
+    def _getMe(self, params: dict[str, Any]) -> web.Response:
+        return _ok({"id": 1, "is_bot": True, "first_name": "Simulator", "username": "simulator_bot"})
+
+
+def _ok(result: Any) -> web.Response:
+    return web.json_response({"ok": True, "result": result})
+
+
+def _error(code: int, description: str) -> web.Response:
+    return web.json_response({"ok": False, "error_code": code, "description": description}, status=code)
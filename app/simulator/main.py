@@ -0,0 +1,72 @@
+"""Load simulator: both bots against a local fake Bot API and a virtual clock.
+
+Synthetic drivers book slots through the truck bot's FSM, then a simulated
+day runs through the notification service while dispatchers mark arrivals,
+unloads and cancellations. The report has handler latency percentiles,
+SQLite write-lock waits and Bot API message rates per phase.
+
+    python -m app.simulator.main [--drivers 1000] [--elevators 20] [--concurrency 200]
+
+The database is a fresh temporary SQLite file unless ``--database`` is given;
+settings are read from the environment as usual, except that bot tokens,
+``TELEGRAM_API_URL`` and ``DATABASE_URL`` are always the simulator's own.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+from pathlib import Path
+
+
+def _free_port(host: str) -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Truck queue load simulator")
+    parser.add_argument("--drivers", type=int, default=1000)
+    parser.add_argument("--elevators", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=200, help="drivers booking at the same time")
+    parser.add_argument("--step-minutes", type=int, default=5, help="virtual clock step of the simulated day")
+    parser.add_argument("--cancel-rate", type=float, default=0.05, help="share of bookings cancelled by dispatchers")
+    parser.add_argument("--no-boards", dest="boards", action="store_false", help="do not open live queue boards")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="delay of every fake Bot API call")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database", type=Path, help="SQLite file to use, a temporary one by default")
+    args = parser.parse_args()
+
+    host = "127.0.0.1"
+    port = _free_port(host)
+    with tempfile.TemporaryDirectory(prefix="truck-queue-sim-") as tmp:
+        database = args.database or Path(tmp) / "simulation.db"
+        # настройки читаются при импорте app.config — задаём их до импорта приложения
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{database}",
+            TELEGRAM_API_URL=f"http://{host}:{port}",
+            TRUCK_BOT_TOKEN="100001:simulator-truck",
+            ELEVATOR_BOT_TOKEN="100002:simulator-elevator",
+        )
+        from app.simulator.run import Options, simulate
+
+        options = Options(
+            drivers=args.drivers,
+            elevators=args.elevators,
+            concurrency=args.concurrency,
+            step_minutes=args.step_minutes,
+            cancel_rate=args.cancel_rate,
+            boards=args.boards,
+            seed=args.seed,
+            host=host,
+            port=port,
+            api_latency=args.api_latency_ms / 1000,
+        )
+        print(asyncio.run(simulate(options)))
+
+
+if __name__ == "__main__":
+    main()
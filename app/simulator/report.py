@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import numpy as np
+from sqlalchemy import Engine, event
+
+PERCENTILES = (50, 95, 99)
+
+_WRITES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+class Latencies:
+    """Wall-clock durations in seconds grouped by label."""
+
+    def __init__(self) -> None:
+        self.samples: dict[str, list[float]] = defaultdict(list)
+
+    def add(self, label: str, seconds: float) -> None:
+        self.samples[label].append(seconds)
+
+    def all(self) -> list[float]:
+        return [value for values in self.samples.values() for value in values]
+
+
+class LockWaits:
+    """Time to take the SQLite write lock.
+
+    SQLite waits for the lock (up to ``busy_timeout``) inside the first
+    INSERT/UPDATE/DELETE of a transaction, so that statement is timed; the
+    rest of the transaction already holds the lock. Failures with
+    "database is locked" are counted separately.
+    """
+
+    def __init__(self) -> None:
+        self.waits: list[float] = []
+        self.locked_errors = 0
+
+    def attach(self, engine: Engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        event.listen(engine, "commit", self._end)
+        event.listen(engine, "rollback", self._end)
+        event.listen(engine, "handle_error", self._error)
+
+    def detach(self, engine: Engine) -> None:
+        for name, fn in (
+            ("before_cursor_execute", self._before),
+            ("after_cursor_execute", self._after),
+            ("commit", self._end),
+            ("rollback", self._end),
+            ("handle_error", self._error),
+        ):
+            event.remove(engine, name, fn)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        if not conn.info.get("sim_writing") and statement.lstrip()[:7].upper().startswith(_WRITES):
+            conn.info["sim_write_started"] = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        started = conn.info.pop("sim_write_started", None)
+        if started is not None:
+            self.waits.append(time.perf_counter() - started)
+            conn.info["sim_writing"] = True
+
+    def _end(self, conn) -> None:
+        conn.info.pop("sim_writing", None)
+        conn.info.pop("sim_write_started", None)
+
+    def _error(self, context) -> None:
+        if "database is locked" in str(context.original_exception):
+            self.locked_errors += 1
+        if context.connection is not None:
+            context.connection.info.pop("sim_write_started", None)
+
+
+@dataclass
+class Phase:
+    name: str
+    seconds: float
+    api_calls: int
+    messages: int
+    updates: int = 0
+    extra: dict[str, int] = field(default_factory=dict)
+
+
+def _ms(values: list[float]) -> str:
+    if not values:
+        return "—"
+    p = np.percentile(np.array(values) * 1000, PERCENTILES)
+    return ", ".join(f"p{q} {v:.1f} мс" for q, v in zip(PERCENTILES, p.tolist()))
+
+
+def _rate(count: int, seconds: float) -> str:
+    return f"{count / seconds:.1f}/с" if seconds > 0 else "—"
+
+
+def format_report(phases: list[Phase], latencies: Latencies, lock_waits: LockWaits) -> str:
+    lines = ["Фазы:"]
+    for phase in phases:
+        lines.append(
+            f"  {phase.name}: {phase.seconds:.1f} с, апдейтов {phase.updates} ({_rate(phase.updates, phase.seconds)}), "
+            f"вызовов Bot API {phase.api_calls}, сообщений {phase.messages} ({_rate(phase.messages, phase.seconds)})"
+        )
+        for name, value in phase.extra.items():
+            lines.append(f"    {name}: {value}")
+    lines.append("Задержка обработчиков:")
+    lines.append(f"  все ({len(latencies.all())}): {_ms(latencies.all())}")
+    for label, values in sorted(latencies.samples.items()):
+        lines.append(f"  {label} ({len(values)}): {_ms(values)}")
+    lines.append(f"Ожидание блокировки записи ({len(lock_waits.waits)} транзакций): {_ms(lock_waits.waits)}")
+    lines.append(f"Ошибок «database is locked»: {lock_waits.locked_errors}")
+    return "\n".join(lines)
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import asyncio
+import random
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, time, timedelta
+from time import perf_counter
+
+from aiogram import Dispatcher
+from sqlalchemy import func, select
+
+from app.bots import close_bots, get_bot
+from app.config import settings
+from app.db import AsyncSessionLocal, SessionLocal, async_engine, engine, init_db
+from app.elevator_bot.board import live_board
+from app.elevator_bot.board import router as board_router
+from app.elevator_bot.handlers import router as elevator_router
+from app.middlewares import DbSessionMiddleware
+from app.models import Booking, BookingStatus, Elevator, Notification, OutboxMessage
+from app.notification_service.main import NotificationDaemon
+from app.outbound import close_dispatchers, get_dispatcher
+from app.outbox import outbox_relay
+from app.simulator.agents import BotClient, DispatcherAgent, book_slot
+from app.simulator.fake_api import FakeBotApi
+from app.simulator.report import Latencies, LockWaits, Phase, format_report
+from app.truck_bot.handlers import router as truck_router
+from app.utils.time_utils import VirtualClock, combine_date_time
+from app.writer import write_actor
+
+DRIVER_ID_BASE = 10_000_000
+DISPATCHER_ID_BASE = 1_000
+
+
+@dataclass
+class Options:
+    drivers: int
+    elevators: int
+    concurrency: int
+    step_minutes: int
+    cancel_rate: float
+    boards: bool
+    seed: int
+    host: str
+    port: int
+    api_latency: float
+
+
+def _seed_elevators(count: int) -> list[str]:
+    names = [f"Элеватор {i + 1}" for i in range(count)]
+    with SessionLocal() as session:
+        existing = set(session.scalars(select(Elevator.name)))
+        for name in names:
+            if name not in existing:
+                # весь рабочий день бронируемый: ёмкость задаётся числом элеваторов
+                session.add(Elevator(name=name, work_day_start=time(6), work_day_end=time(22), bookable_slots_per_day=96))
+        session.commit()
+    return names
+
+
+def _outcome_counts() -> dict[str, int]:
+    with SessionLocal() as session:
+        statuses = dict(
+            session.execute(
+                select(Booking.status, func.count()).where(Booking.date == date.today()).group_by(Booking.status)
+            ).all()
+        )
+        return {
+            "броней сегодня": sum(statuses.values()),
+            "прибыло": statuses.get(BookingStatus.ARRIVED, 0) + statuses.get(BookingStatus.UNLOADED, 0),
+            "разгружено": statuses.get(BookingStatus.UNLOADED, 0),
+            "отменено": statuses.get(BookingStatus.CANCELLED, 0),
+            "напоминаний": session.scalar(select(func.count()).select_from(Notification)),
+            "сообщений outbox": session.scalar(select(func.count()).select_from(OutboxMessage)),
+        }
+
+
+async def _drivers_phase(options: Options, client: BotClient) -> Counter[str]:
+    outcomes: Counter[str] = Counter()
+    slots = asyncio.Semaphore(options.concurrency)
+
+    async def driver(number: int) -> None:
+        async with slots:
+            rng = random.Random(f"{options.seed}:driver:{number}")
+            await book_slot(client, DRIVER_ID_BASE + number, f"SIM{number:05d}", rng, outcomes)
+
+    await asyncio.gather(*(driver(number) for number in range(options.drivers)))
+    return outcomes
+
+
+async def _day_phase(options: Options, clock: VirtualClock, agents: list[DispatcherAgent]) -> int:
+    daemon = NotificationDaemon(get_dispatcher(settings.truck_bot_token), settings.notification_poll_interval_seconds)
+    with SessionLocal() as session:
+        daemon.events.start_from_now(session)
+        daemon.scheduler.bootstrap(session)
+    step = timedelta(minutes=options.step_minutes)
+    end = clock.now + timedelta(days=1) - step
+    steps = 0
+    while clock.now < end:
+        clock.advance(step)
+        await daemon.tick()
+        await asyncio.gather(*(agent.act(clock.now) for agent in agents))
+        steps += 1
+    SessionLocal.remove()
+    return steps
+
+
+async def simulate(options: Options) -> str:
+    init_db()
+    names = _seed_elevators(options.elevators)
+    api = FakeBotApi(latency=options.api_latency)
+    await api.start(options.host, options.port)
+    latencies = Latencies()
+    lock_waits = LockWaits()
+    lock_waits.attach(engine)
+    lock_waits.attach(async_engine.sync_engine)
+
+    clients = {}
+    for name, token, routers in (
+        ("driver", settings.truck_bot_token, [truck_router]),
+        ("dispatcher", settings.elevator_bot_token, [board_router, elevator_router]),
+    ):
+        dp = Dispatcher()
+        dp.update.outer_middleware(DbSessionMiddleware(AsyncSessionLocal))
+        dp.include_routers(*routers)
+        clients[name] = BotClient(name, dp, get_bot(token), api, latencies)
+
+    phases: list[Phase] = []
+    # сутки виртуального времени начинаются в полночь текущей даты
+    with VirtualClock(combine_date_time(date.today(), time(0))) as clock:
+        await outbox_relay.start()
+        if options.boards:
+            await live_board.start()
+        try:
+            started, calls, sent = perf_counter(), sum(api.calls.values()), api.sent
+            outcomes = await _drivers_phase(options, clients["driver"])
+            phases.append(
+                Phase(
+                    "запись водителей",
+                    perf_counter() - started,
+                    sum(api.calls.values()) - calls,
+                    api.sent - sent,
+                    clients["driver"].updates,
+                    dict(outcomes),
+                )
+            )
+
+            started, calls, sent = perf_counter(), sum(api.calls.values()), api.sent
+            dispatcher = clients["dispatcher"]
+            agents = [
+                DispatcherAgent(
+                    dispatcher,
+                    DISPATCHER_ID_BASE + i,
+                    name,
+                    options.seed,
+                    options.cancel_rate,
+                    timedelta(minutes=settings.slot_duration_minutes),
+                )
+                for i, name in enumerate(names)
+            ]
+            await asyncio.gather(*(agent.start(options.boards) for agent in agents))
+            steps = await _day_phase(options, clock, agents)
+            # уведомления и табло доотправляются до конца фазы
+            await outbox_relay.stop()
+            await live_board.stop()
+            await close_dispatchers()
+            clicks = sum((agent.clicks for agent in agents), Counter())
+            phases.append(
+                Phase(
+                    f"день ({steps} шагов по {options.step_minutes} мин)",
+                    perf_counter() - started,
+                    sum(api.calls.values()) - calls,
+                    api.sent - sent,
+                    dispatcher.updates,
+                    {**{f"нажатий {action}": count for action, count in clicks.items()}, **_outcome_counts()},
+                )
+            )
+        finally:
+            await outbox_relay.stop()
+            await live_board.stop()
+            await write_actor.stop()
+            await close_dispatchers()
+            await close_bots()
+            await api.stop()
+            lock_waits.detach(engine)
+            lock_waits.detach(async_engine.sync_engine)
+    errors = sum((client.errors for client in clients.values()), Counter())
+    report = format_report(phases, latencies, lock_waits)
+    if errors:
+        report += "\nОшибок обработчиков: " + ", ".join(f"{label} {count}" for label, count in errors.items())
+    return report
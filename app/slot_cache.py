@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from datetime import date, time
+from typing import NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Booking, BookingStatus, Elevator, QueueDay
+from app.queue_engine import DayKey
+from app.utils.time_utils import build_daily_slots, combine_date_time, now_tz, to_tz
+
+TemplateKey = tuple[time, time, int, int]
+
+
+class SlotTemplate(NamedTuple):
+    starts: list[time]
+    labels: list[str]
+    # минута суток -> номер слота
+    positions: dict[int, int]
+
+
+class _Availability(NamedTuple):
+    version: int
+    template: SlotTemplate
+    free: int  # бит i установлен — слот i свободен
+
+
+def _minute_of_day(value: time) -> int:
+    return value.hour * 60 + value.minute
+
+
+class SlotCache:
+    """Free-slot bitmaps per elevator-day.
+
+    An entry is valid while ``queue_days.version`` of its day is unchanged;
+    the version is bumped in the same transaction whenever a booking is
+    created, moved or cancelled, in any process.
+    """
+
+    def __init__(self, max_days: int = 1024) -> None:
+        self._templates: dict[TemplateKey, SlotTemplate] = {}
+        self._days: OrderedDict[DayKey, _Availability] = OrderedDict()
+        self._max_days = max_days
+
+    def template(self, elevator: Elevator) -> SlotTemplate:
+        key = (
+            elevator.work_day_start,
+            elevator.work_day_end,
+            elevator.bookable_slots_per_day,
+            settings.slot_duration_minutes,
+        )
+        template = self._templates.get(key)
+        if template is None:
+            starts = [start for start, _ in build_daily_slots(*key[:3])]
+            template = self._templates[key] = SlotTemplate(
+                starts,
+                [start.strftime("%H:%M") for start in starts],
+                {_minute_of_day(start): pos for pos, start in enumerate(starts)},
+            )
+        return template
+
+    def _load(self, session: Session, elevator: Elevator, booking_date: date, version: int) -> _Availability:
+        template = self.template(elevator)
+        free = (1 << len(template.starts)) - 1
+        existing = session.scalars(
+            select(Booking.slot_start).where(
+                Booking.elevator_id == elevator.id,
+                Booking.date == booking_date,
+                Booking.status != BookingStatus.CANCELLED,
+            )
+        )
+        for slot_start in existing:
+            pos = template.positions.get(_minute_of_day(to_tz(slot_start)))
+            if pos is not None:
+                free &= ~(1 << pos)
+        return _Availability(version, template, free)
+
+    def get(self, session: Session, elevator: Elevator, booking_date: date) -> _Availability:
+        day = (elevator.id, booking_date)
+        # версию читаем до броней: изменение между запросами лишь инвалидирует запись
+        version = session.scalar(
+            select(QueueDay.version).where(QueueDay.elevator_id == elevator.id, QueueDay.date == booking_date)
+        ) or 0
+        entry = self._days.get(day)
+        if entry is None or entry.version != version or entry.template is not self.template(elevator):
+            entry = self._load(session, elevator, booking_date, version)
+            # незакоммиченные изменения дня в этой сессии в кэш не попадают
+            if day in session.info.get("queue_pending", {}) or day in session.info.get("queue_recalculated", ()):
+                return entry
+            self._days[day] = entry
+            while len(self._days) > self._max_days:
+                self._days.popitem(last=False)
+        self._days.move_to_end(day)
+        return entry
+
+    def discard(self, day: DayKey) -> None:
+        self._days.pop(day, None)
+
+    def clear(self) -> None:
+        self._days.clear()
+        self._templates.clear()
+
+
+slot_cache = SlotCache()
+
+
+def available_slots(session: Session, elevator: Elevator, booking_date: date) -> list[str]:
+    """Labels of free slots of an elevator-day, without slots that already started."""
+    entry = slot_cache.get(session, elevator, booking_date)
+    now = now_tz()
+    available = []
+    for pos, label in enumerate(entry.template.labels):
+        if not entry.free >> pos & 1:
+            continue
+        # не предлагать слоты, которые уже начались
+        if booking_date == now.date() and combine_date_time(booking_date, entry.template.starts[pos]) <= now:
+            continue
+        available.append(label)
+    return available
@@ -1,19 +1,26 @@
 from __future__ import annotations
 
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 
 from aiogram import Router, F
 from aiogram.filters import Command, CommandStart
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message
+from sqlalchemy import Engine, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
 
 from app.config import settings
-from app.db import SessionLocal
 from app.models import Booking, BookingStatus, Driver, Elevator
+from app.outbox import add_message, outbox_relay
 from app.queue_logic import recalc_queue
+from app.reminders import arm_reminder
+from app.slot_cache import available_slots
+from app.writer import write
 from app.truck_bot import keyboards
 from app.truck_bot.states import BookingState
-from app.utils.time_utils import build_daily_slots, combine_date_time, now_tz, parse_date
+from app.utils.time_utils import combine_date_time, now_tz, parse_date
 from aiogram.types import CallbackQuery
 
 
@@ -29,8 +36,12 @@ STATUS_TEXT = {
 }
 
 
-def _get_or_create_driver(session, tg_user_id: int, tg_username: str | None) -> Driver:
-    driver = session.query(Driver).filter_by(telegram_user_id=tg_user_id).one_or_none()
+class SlotTaken(Exception):
+    """The slot was reserved by a concurrent confirmation."""
+
+
+def _get_or_create_driver(session: Session, tg_user_id: int, tg_username: str | None) -> Driver:
+    driver = session.scalar(select(Driver).filter_by(telegram_user_id=tg_user_id))
     if driver is None:
         driver = Driver(telegram_user_id=tg_user_id, telegram_username=tg_username)
         session.add(driver)
@@ -38,28 +49,64 @@ def _get_or_create_driver(session, tg_user_id: int, tg_username: str | None) ->
     return driver
 
 
-def _available_slots(session, elevator: Elevator, booking_date: date) -> list[str]:
-    existing = (
-        session.query(Booking)
-        .filter(
-            Booking.elevator_id == elevator.id,
-            Booking.date == booking_date,
-            Booking.status != BookingStatus.CANCELLED,
-        )
-        .all()
-    )
-    taken = {b.slot_start.timetz() for b in existing}
-    slots = build_daily_slots(elevator.work_day_start, elevator.work_day_end, elevator.bookable_slots_per_day)
+def _requeue(session: Session, booking: Booking) -> None:
+    recalc_queue(session, booking.elevator_id, booking.date)
+    arm_reminder(session, booking)
+
+
+def _slot_is_taken(bind: Engine, elevator_id: int, slot_start: datetime) -> bool:
+    # транзакция сессии после неудачного flush непригодна: смотрим отдельным соединением,
+    # где уже видна бронь, закоммиченная конкурентом
+    with bind.connect() as conn:
+        return conn.scalar(
+            select(Booking.id)
+            .where(
+                Booking.elevator_id == elevator_id,
+                Booking.slot_start == slot_start,
+                Booking.status != BookingStatus.CANCELLED,
+            )
+            .limit(1)
+        ) is not None
+
+
+def _reserve(session: Session, booking: Booking, tg_user_id: int, tg_username: str | None) -> Booking:
+    """Insert a booking for the driver, raise SlotTaken if its slot is already reserved.
+
+    Uniqueness is enforced by the partial index ux_bookings_active_slot, so the
+    losing transaction is simply rolled back without locking the table.
+    """
+    booking.driver_id = _get_or_create_driver(session, tg_user_id, tg_username).id
+    session.add(booking)
+    try:
+        session.flush()
+    except IntegrityError as exc:
+        if _slot_is_taken(session.get_bind(), booking.elevator_id, booking.slot_start):
+            raise SlotTaken from exc
+        raise
+    _requeue(session, booking)
+    return booking
+
+
+def _come_now(session: Session, booking_id: int) -> Booking:
+    booking = session.get(Booking, booking_id, options=[joinedload(Booking.driver), joinedload(Booking.elevator)])
     now = now_tz()
-    available = []
-    for slot_start, _ in slots:
-        if slot_start not in taken:
-            if booking_date == now.date():
-                # не предлагать слоты, которые уже начались
-                if combine_date_time(booking_date, slot_start) <= now:
-                    continue
-            available.append(slot_start.strftime("%H:%M"))
-    return available
+    booking.slot_start = now
+    booking.slot_end = now + timedelta(minutes=settings.slot_duration_minutes)
+    booking.updated_at = now
+    _requeue(session, booking)
+    return booking
+
+
+async def _slot_taken(message: Message, state: FSMContext, session: AsyncSession, elevator: Elevator, booking_date: date) -> None:
+    slots = await session.run_sync(available_slots, elevator, booking_date)
+    if not slots:
+        await state.clear()
+        await message.answer("Слот уже занят, свободных слотов на эту дату больше нет.", reply_markup=keyboards.remove_keyboard())
+        await message.answer("Выберите действие:", reply_markup=keyboards.main_menu_keyboard())
+        return
+    await state.update_data(slots=slots)
+    await state.set_state(BookingState.choosing_slot)
+    await message.answer("Слот уже занят. Выберите другое время:", reply_markup=keyboards.slots_keyboard(slots))
 
 
 @router.message(CommandStart())
@@ -84,59 +131,59 @@ async def cmd_help(message: Message) -> None:
 
 
 @router.message(Command("my_bookings"))
-async def cmd_my_bookings(message: Message) -> None:
-    with SessionLocal() as session:
-        driver = session.query(Driver).filter_by(telegram_user_id=message.from_user.id).one_or_none()
-        if driver is None:
-            await message.answer("Бронирования не найдены.")
-            return
-        now = now_tz()
-        bookings = (
-            session.query(Booking)
-            .filter(
+async def cmd_my_bookings(message: Message, session: AsyncSession) -> None:
+    driver = await session.scalar(select(Driver).filter_by(telegram_user_id=message.from_user.id))
+    if driver is None:
+        await message.answer("Бронирования не найдены.")
+        return
+    now = now_tz()
+    bookings = (
+        await session.scalars(
+            select(Booking)
+            .options(joinedload(Booking.elevator))
+            .where(
                 Booking.driver_id == driver.id,
                 Booking.status != BookingStatus.CANCELLED,
                 Booking.slot_end >= now - timedelta(days=1),
             )
             .order_by(Booking.slot_start)
-            .all()
         )
-        if not bookings:
-            await message.answer("Бронирования не найдены.")
-            return
-        lines = []
-        for b in bookings:
-            status = STATUS_TEXT.get(b.status, b.status)
-            lines.append(
-                f"{b.date.isoformat()} {b.slot_start.astimezone(now.tzinfo).strftime('%H:%M')} — элеватор {b.elevator.name}, номер {b.license_plate}, статус {status}"
-            )
-        await message.answer("\n".join(lines))
+    ).all()
+    if not bookings:
+        await message.answer("Бронирования не найдены.")
+        return
+    lines = []
+    for b in bookings:
+        status = STATUS_TEXT.get(b.status, b.status)
+        lines.append(
+            f"{b.date.isoformat()} {b.slot_start.astimezone(now.tzinfo).strftime('%H:%M')} — элеватор {b.elevator.name}, номер {b.license_plate}, статус {status}"
+        )
+    await message.answer("\n".join(lines))
     await message.answer("Выберите действие:", reply_markup=keyboards.main_menu_keyboard())
 
 
 @router.message(Command("book"))
-async def cmd_book(message: Message, state: FSMContext) -> None:
-    with SessionLocal() as session:
-        elevators = session.query(Elevator).order_by(Elevator.name).all()
-        if not elevators:
-            await message.answer(
-                "Элеваторы не настроены. Свяжитесь с диспетчером.",
-                reply_markup=keyboards.main_menu_keyboard(),
-            )
-            return
+async def cmd_book(message: Message, state: FSMContext, session: AsyncSession) -> None:
+    elevators = (await session.scalars(select(Elevator).order_by(Elevator.name))).all()
+    if not elevators:
+        await message.answer(
+            "Элеваторы не настроены. Свяжитесь с диспетчером.",
+            reply_markup=keyboards.main_menu_keyboard(),
+        )
+        return
     await state.set_state(BookingState.choosing_elevator)
     await message.answer("Выберите элеватор:", reply_markup=keyboards.elevators_keyboard(elevators))
     # no main menu here to keep focus on flow
 
 
 @router.message(F.text.casefold() == "записаться")
-async def menu_book(message: Message, state: FSMContext) -> None:
-    await cmd_book(message, state)
+async def menu_book(message: Message, state: FSMContext, session: AsyncSession) -> None:
+    await cmd_book(message, state, session)
 
 
 @router.message(F.text.casefold() == "мои бронирования")
-async def menu_my_bookings(message: Message, state: FSMContext) -> None:
-    await cmd_my_bookings(message)
+async def menu_my_bookings(message: Message, state: FSMContext, session: AsyncSession) -> None:
+    await cmd_my_bookings(message, session)
 
 
 @router.message(F.text.casefold() == "помощь")
@@ -145,7 +192,7 @@ async def menu_help(message: Message, state: FSMContext) -> None:
 
 
 @router.callback_query(F.data.startswith("come:"))
-async def on_come_offer(callback: CallbackQuery) -> None:
+async def on_come_offer(callback: CallbackQuery, session: AsyncSession) -> None:
     """
     Handle dispatcher offer to come now.
     callback data: come:<action>:<booking_id>[:<fallback_id>]
@@ -155,49 +202,45 @@ async def on_come_offer(callback: CallbackQuery) -> None:
     booking_id = int(booking_id)
     fallback_id = int(rest[0]) if rest else None
 
-    with SessionLocal() as session:
-        booking = session.get(Booking, booking_id)
-        if booking is None:
-            await callback.answer("Бронь не найдена", show_alert=True)
-            return
-        if booking.driver.telegram_user_id != callback.from_user.id:
-            await callback.answer("Это предложение не для вас", show_alert=True)
-            return
-
-        if action == "yes":
-            now = now_tz()
-            booking.slot_start = now
-            booking.slot_end = now + timedelta(minutes=settings.slot_duration_minutes)
-            booking.updated_at = now
-            recalc_queue(session, booking.elevator_id, booking.date)
-            session.commit()
-            await callback.message.edit_text(
-                f"Спасибо! Подъезжайте сейчас.\n"
-                f"Элеватор: {booking.elevator.name}\n"
-                f"Слот: сейчас–{booking.slot_end.astimezone(now.tzinfo).strftime('%H:%M')}\n"
-                f"Номер: {booking.license_plate}"
-            )
-            await callback.answer("Принято")
-        elif action == "no":
-            session.commit()
-            await callback.message.edit_text("Вы отказались. Предложим следующему.")
-            await callback.answer("Отказ")
-            if fallback_id:
-                _notify_next_offer(session, fallback_id)
-        else:
-            await callback.answer()
-
-
-def _notify_next_offer(session, booking_id: int) -> None:
-    from aiogram import Bot
+    booking = await session.get(
+        Booking, booking_id, options=[joinedload(Booking.driver), joinedload(Booking.elevator)]
+    )
+    if booking is None:
+        await callback.answer("Бронь не найдена", show_alert=True)
+        return
+    if booking.driver.telegram_user_id != callback.from_user.id:
+        await callback.answer("Это предложение не для вас", show_alert=True)
+        return
 
-    booking = session.get(Booking, booking_id)
+    if action == "yes":
+        booking = await write(session, _come_now, booking.id)
+        now = now_tz()
+        await callback.message.edit_text(
+            f"Спасибо! Подъезжайте сейчас.\n"
+            f"Элеватор: {booking.elevator.name}\n"
+            f"Слот: сейчас–{booking.slot_end.astimezone(now.tzinfo).strftime('%H:%M')}\n"
+            f"Номер: {booking.license_plate}"
+        )
+        await callback.answer("Принято")
+    elif action == "no":
+        if fallback_id:
+            await write(session, _notify_next_offer, fallback_id, booking.id)
+            outbox_relay.wake()
+        await callback.message.edit_text("Вы отказались. Предложим следующему.")
+        await callback.answer("Отказ")
+    else:
+        await callback.answer()
+
+
+def _notify_next_offer(session: Session, booking_id: int, declined_id: int) -> None:
+    booking = session.get(
+        Booking, booking_id, options=[joinedload(Booking.driver), joinedload(Booking.elevator)]
+    )
     if booking is None:
         return
     driver = booking.driver
     if driver is None:
         return
-    bot = Bot(settings.truck_bot_token)
     text = (
         f"Слот освободился. Можете подъехать сейчас?\n"
         f"Элеватор: {booking.elevator.name}\n"
@@ -207,25 +250,28 @@ def _notify_next_offer(session, booking_id: int) -> None:
     fallback = ""
     # no further offers beyond this one per требования
     markup = keyboards.inline_offer_keyboard(booking.id, fallback_id=None)
-    asyncio.get_event_loop().create_task(
-        bot.send_message(driver.telegram_user_id, text, reply_markup=markup)
+    add_message(
+        session,
+        driver.telegram_user_id,
+        text,
+        reply_markup=markup,
+        dedup_key=f"offer:{booking.id}:declined:{declined_id}",
     )
 
 
 @router.message(BookingState.choosing_elevator)
-async def choose_elevator(message: Message, state: FSMContext) -> None:
-    with SessionLocal() as session:
-        elevator = session.query(Elevator).filter_by(name=message.text).one_or_none()
-        if elevator is None:
-            await message.answer("Не могу найти такой элеватор. Выберите из списка.")
-            return
+async def choose_elevator(message: Message, state: FSMContext, session: AsyncSession) -> None:
+    elevator = await session.scalar(select(Elevator).filter_by(name=message.text))
+    if elevator is None:
+        await message.answer("Не могу найти такой элеватор. Выберите из списка.")
+        return
     await state.update_data(elevator_id=elevator.id)
     await state.set_state(BookingState.choosing_date)
     await message.answer("Выберите дату (формат YYYY-MM-DD):", reply_markup=keyboards.dates_keyboard())
 
 
 @router.message(BookingState.choosing_date)
-async def choose_date(message: Message, state: FSMContext) -> None:
+async def choose_date(message: Message, state: FSMContext, session: AsyncSession) -> None:
     try:
         booking_date = parse_date(message.text.strip())
     except ValueError:
@@ -237,13 +283,12 @@ async def choose_date(message: Message, state: FSMContext) -> None:
 
     data = await state.get_data()
     elevator_id = data.get("elevator_id")
-    with SessionLocal() as session:
-        elevator = session.query(Elevator).get(elevator_id)
-        if elevator is None:
-            await message.answer("Элеватор не найден, начните заново /book.")
-            await state.clear()
-            return
-        slots = _available_slots(session, elevator, booking_date)
+    elevator = await session.get(Elevator, elevator_id)
+    if elevator is None:
+        await message.answer("Элеватор не найден, начните заново /book.")
+        await state.clear()
+        return
+    slots = await session.run_sync(available_slots, elevator, booking_date)
     if not slots:
         await message.answer("На эту дату нет свободных слотов. Выберите другую дату.", reply_markup=keyboards.dates_keyboard())
         return
@@ -284,7 +329,7 @@ async def enter_license(message: Message, state: FSMContext) -> None:
 
 
 @router.message(BookingState.confirming)
-async def confirm_booking(message: Message, state: FSMContext) -> None:
+async def confirm_booking(message: Message, state: FSMContext, session: AsyncSession) -> None:
     if message.text not in {"Подтвердить", "Отмена"}:
         await message.answer("Выберите действие: Подтвердить или Отмена.")
         return
@@ -295,45 +340,40 @@ async def confirm_booking(message: Message, state: FSMContext) -> None:
         return
 
     data = await state.get_data()
-    with SessionLocal() as session:
-        elevator = session.query(Elevator).get(data["elevator_id"])
-        if elevator is None:
-            await message.answer("Элеватор не найден. Начните заново /book.")
-            await state.clear()
-            await message.answer("Выберите действие:", reply_markup=keyboards.main_menu_keyboard())
-            return
-        booking_date = parse_date(data["date"])
-        available_slots = _available_slots(session, elevator, booking_date)
-        if data["slot_time"] not in available_slots:
-            await message.answer("Слот уже занят, выберите другой /book.")
-            await state.clear()
-            await message.answer("Выберите действие:", reply_markup=keyboards.main_menu_keyboard())
-            return
-
-        driver = _get_or_create_driver(session, message.from_user.id, message.from_user.username)
-        slot_hour, slot_minute = map(int, data["slot_time"].split(":"))
-        slot_time = elevator.work_day_start.replace(hour=slot_hour, minute=slot_minute, second=0, microsecond=0)
-        slot_start_dt = combine_date_time(booking_date, slot_time)
-        slot_end_dt = slot_start_dt + timedelta(minutes=settings.slot_duration_minutes)
-        booking = Booking(
-            driver_id=driver.id,
-            elevator_id=elevator.id,
-            license_plate=data["license_plate"],
-            date=booking_date,
-            slot_start=slot_start_dt,
-            slot_end=slot_end_dt,
-            status=BookingStatus.CONFIRMED,
-        )
-        session.add(booking)
-        session.flush()
-        recalc_queue(session, elevator.id, booking_date)
-        session.commit()
+    elevator = await session.get(Elevator, data["elevator_id"])
+    if elevator is None:
+        await message.answer("Элеватор не найден. Начните заново /book.")
         await state.clear()
-        await message.answer(
-            "Бронирование подтверждено.\n"
-            f"Элеватор: {elevator.name}\n"
-            f"Дата: {booking_date}\n"
-            f"Время: {data['slot_time']}\n"
-            f"Номер: {booking.license_plate}",
-            reply_markup=keyboards.main_menu_keyboard(),
-        )
+        await message.answer("Выберите действие:", reply_markup=keyboards.main_menu_keyboard())
+        return
+    booking_date = parse_date(data["date"])
+    if data["slot_time"] not in await session.run_sync(available_slots, elevator, booking_date):
+        await _slot_taken(message, state, session, elevator, booking_date)
+        return
+
+    slot_hour, slot_minute = map(int, data["slot_time"].split(":"))
+    slot_time = elevator.work_day_start.replace(hour=slot_hour, minute=slot_minute, second=0, microsecond=0)
+    slot_start_dt = combine_date_time(booking_date, slot_time)
+    slot_end_dt = slot_start_dt + timedelta(minutes=settings.slot_duration_minutes)
+    booking = Booking(
+        elevator_id=elevator.id,
+        license_plate=data["license_plate"],
+        date=booking_date,
+        slot_start=slot_start_dt,
+        slot_end=slot_end_dt,
+        status=BookingStatus.CONFIRMED,
+    )
+    try:
+        booking = await write(session, _reserve, booking, message.from_user.id, message.from_user.username)
+    except SlotTaken:
+        await _slot_taken(message, state, session, elevator, booking_date)
+        return
+    await state.clear()
+    await message.answer(
+        "Бронирование подтверждено.\n"
+        f"Элеватор: {elevator.name}\n"
+        f"Дата: {booking_date}\n"
+        f"Время: {data['slot_time']}\n"
+        f"Номер: {booking.license_plate}",
+        reply_markup=keyboards.main_menu_keyboard(),
+    )
@@ -1,20 +1,36 @@
 import asyncio
 import logging
 
-from aiogram import Bot, Dispatcher
+from aiogram import Dispatcher
 
+from app.bots import close_bots, get_bot
 from app.config import settings
-from app.db import init_db
+from app.db import AsyncSessionLocal, async_engine, init_db
 from app.truck_bot.handlers import router
+from app.metrics import MetricsExporter
+from app.middlewares import DbSessionMiddleware, MetricsMiddleware
+from app.outbound import close_dispatchers
+from app.outbox import outbox_relay
+from app.writer import write_actor
 
 
 async def main() -> None:
     logging.basicConfig(level=logging.INFO)
     init_db()
     print("token:", settings.truck_bot_token)
-    bot = Bot(token=settings.truck_bot_token)
+    bot = get_bot(settings.truck_bot_token)
     dp = Dispatcher()
+    MetricsMiddleware("truck").setup(dp, async_engine.sync_engine)
+    dp.update.outer_middleware(DbSessionMiddleware(AsyncSessionLocal))
     dp.include_router(router)
+    metrics = MetricsExporter("truck_bot")
+    dp.startup.register(metrics.start)
+    dp.startup.register(outbox_relay.start)
+    dp.shutdown.register(write_actor.stop)
+    dp.shutdown.register(outbox_relay.stop)
+    dp.shutdown.register(close_dispatchers)
+    dp.shutdown.register(close_bots)
+    dp.shutdown.register(metrics.stop)
     await dp.start_polling(bot)
 
 
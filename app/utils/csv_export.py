@@ -1,24 +1,102 @@
+from __future__ import annotations
+
 import csv
 import io
-from typing import Iterable
-
-from app.models import Booking
-
-
-def bookings_to_csv(bookings: Iterable[Booking]) -> bytes:
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["license_plate", "slot_start", "slot_end", "is_late", "unloaded"])
-    for booking in bookings:
-        is_late = booking.arrived_at is not None and booking.arrived_at > booking.slot_start
-        unloaded = booking.unloaded_at is not None
-        writer.writerow(
-            [
-                booking.license_plate,
-                booking.slot_start.isoformat(),
-                booking.slot_end.isoformat(),
-                str(is_late),
-                str(unloaded),
-            ]
+import tempfile
+from datetime import date
+from typing import IO, TYPE_CHECKING, AsyncGenerator
+
+from aiogram.types import InputFile
+from sqlalchemy import Select, and_, case, select
+from sqlalchemy.orm import Session
+
+from app.models import Booking, Driver, Elevator
+from app.utils.time_utils import to_tz
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+# первые пять колонок — формат из спецификации, дополнительные идут после них
+HEADER = ["license_plate", "slot_start", "slot_end", "is_late", "unloaded", "elevator", "date", "driver", "status"]
+
+# строк на одну выборку из курсора и на один блок кодирования
+CHUNK_ROWS = 500
+# до этого размера файл держится в памяти, дальше уходит на диск
+SPOOL_MAX_BYTES = 1024 * 1024
+
+
+def export_query(date_from: date, date_to: date, elevator_id: int | None = None) -> Select:
+    """Bookings of a date range with lateness and unloaded flags computed by the database."""
+    is_late = case(
+        (and_(Booking.arrived_at.is_not(None), Booking.arrived_at > Booking.slot_start), True),
+        else_=False,
+    )
+    unloaded = case((Booking.unloaded_at.is_not(None), True), else_=False)
+    stmt = (
+        select(
+            Booking.license_plate,
+            Booking.slot_start,
+            Booking.slot_end,
+            is_late,
+            unloaded,
+            Elevator.name,
+            Booking.date,
+            Driver.telegram_username,
+            Driver.telegram_user_id,
+            Booking.status,
         )
-    return output.getvalue().encode("utf-8")
+        .join(Elevator, Elevator.id == Booking.elevator_id)
+        .join(Driver, Driver.id == Booking.driver_id)
+        .where(Booking.date >= date_from, Booking.date <= date_to)
+        .order_by(Booking.date, Booking.elevator_id, Booking.slot_start)
+    )
+    if elevator_id is not None:
+        stmt = stmt.where(Booking.elevator_id == elevator_id)
+    return stmt
+
+
+def write_bookings_csv(session: Session, stmt: Select, out: IO[bytes]) -> int:
+    """Stream query rows into ``out`` as UTF-8 CSV, one chunk at a time; return the row count."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HEADER)
+    count = 0
+    result = session.execute(stmt.execution_options(yield_per=CHUNK_ROWS))
+    for rows in result.partitions():
+        for plate, slot_start, slot_end, is_late, unloaded, elevator, day, username, user_id, status in rows:
+            writer.writerow(
+                [
+                    plate,
+                    to_tz(slot_start).isoformat(),
+                    to_tz(slot_end).isoformat(),
+                    str(bool(is_late)),
+                    str(bool(unloaded)),
+                    elevator,
+                    day.isoformat(),
+                    f"@{username}" if username else user_id,
+                    status,
+                ]
+            )
+        count += len(rows)
+        out.write(buffer.getvalue().encode("utf-8"))
+        buffer.seek(0)
+        buffer.truncate()
+    out.write(buffer.getvalue().encode("utf-8"))
+    return count
+
+
+def spooled_file() -> tempfile.SpooledTemporaryFile:
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode="w+b")
+
+
+class SpooledInputFile(InputFile):
+    """Upload a (spooled) temporary file in chunks without reading it into memory."""
+
+    def __init__(self, file: IO[bytes], filename: str, chunk_size: int = 64 * 1024) -> None:
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.file = file
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from datetime import date, datetime, time, timedelta
+from typing import Callable
 from zoneinfo import ZoneInfo
 
 from app.config import settings
@@ -10,10 +11,57 @@ def get_timezone() -> ZoneInfo:
     return ZoneInfo(settings.default_timezone)
 
 
+# источник текущего времени; симулятор нагрузки и бенчмарки подставляют виртуальные часы
+_clock: Callable[[], datetime] | None = None
+
+
+def set_clock(clock: Callable[[], datetime] | None) -> None:
+    """Make ``now_tz`` return ``clock()``; None restores the system clock."""
+    global _clock
+    _clock = clock
+
+
+class VirtualClock:
+    """Settable time source for ``now_tz`` while the ``with`` block runs.
+
+    Only ``now_tz`` is replaced: calendar days still come from
+    ``date.today()``. The simulator moves the clock in steps, benchmarks
+    keep it pinned.
+    """
+
+    def __init__(self, start: datetime) -> None:
+        self.now = start
+        self._previous: Callable[[], datetime] | None = None
+
+    def __call__(self) -> datetime:
+        return self.now
+
+    def advance(self, delta: timedelta) -> None:
+        self.now += delta
+
+    def __enter__(self) -> VirtualClock:
+        self._previous = _clock
+        set_clock(self)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        set_clock(self._previous)
+
+
 def now_tz() -> datetime:
+    if _clock is not None:
+        return _clock()
     return datetime.now(tz=get_timezone())
 
 
+def to_tz(value: datetime) -> datetime:
+    # SQLite возвращает naive datetime — считаем их локальным временем DEFAULT_TIMEZONE
+    tz = get_timezone()
+    if value.tzinfo is None:
+        return value.replace(tzinfo=tz)
+    return value.astimezone(tz)
+
+
 def combine_date_time(day: date, t: time) -> datetime:
     tz = get_timezone()
     if t.tzinfo is None:
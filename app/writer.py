@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db import AsyncSessionLocal
+
+T = TypeVar("T")
+Intent = Callable[..., Any]
+
+
+@dataclass
+class _Pending:
+    fn: Intent
+    args: tuple
+    future: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+
+class WriteActor:
+    """Single writer task with group commit.
+
+    Intents are plain ``fn(session, *args)`` callables, the same ones handlers
+    run with ``session.run_sync``. Intents arriving within ``window`` seconds
+    are applied in one transaction and committed with one fsync; if any of
+    them fails, the batch is rolled back and each intent is retried alone so
+    a single failure only reaches its own caller.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession] = AsyncSessionLocal,
+        window: float | None = None,
+        max_batch: int | None = None,
+    ) -> None:
+        self.session_factory = session_factory
+        self.window = window if window is not None else settings.write_batch_window_ms / 1000
+        self.max_batch = max_batch or settings.write_batch_max
+        self._queue: asyncio.Queue[_Pending | None] | None = None
+        self._task: asyncio.Task | None = None
+        self.batches = 0
+        self.intents = 0
+
+    async def submit(self, fn: Callable[..., T], *args: Any) -> T:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        pending = _Pending(fn, args)
+        await self._queue.put(pending)
+        return await pending.future
+
+    async def _next_batch(self) -> tuple[list[_Pending], bool]:
+        """Collect intents for one transaction; the flag is set when stop() was requested."""
+        loop = asyncio.get_running_loop()
+        first = await self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                pending = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if pending is None:
+                return batch, True
+            batch.append(pending)
+        return batch, False
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._next_batch()
+            if not batch:
+                continue
+            try:
+                await self._commit(batch)
+            except Exception as exc:
+                if len(batch) == 1:
+                    if not batch[0].future.done():
+                        batch[0].future.set_exception(exc)
+                    continue
+                # один интент портит пачку — повторяем каждый в своей транзакции
+                logging.info("Write batch of %d failed (%s), retrying one by one", len(batch), exc)
+                for pending in batch:
+                    try:
+                        await self._commit([pending])
+                    except Exception as single_exc:
+                        if not pending.future.done():
+                            pending.future.set_exception(single_exc)
+
+    async def _commit(self, batch: list[_Pending]) -> None:
+        batch = [pending for pending in batch if not pending.future.cancelled()]
+        if not batch:
+            return
+        async with self.session_factory() as session:
+            results = await session.run_sync(self._apply, batch)
+            await session.commit()
+        self.batches += 1
+        self.intents += len(batch)
+        for pending, result in zip(batch, results):
+            if not pending.future.done():
+                pending.future.set_result(result)
+
+    @staticmethod
+    def _apply(session: Session, batch: list[_Pending]) -> list[Any]:
+        return [pending.fn(session, *pending.args) for pending in batch]
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        # уже принятые интенты будут закоммичены до остановки
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+
+write_actor = WriteActor()
+
+
+async def write(session: AsyncSession, fn: Callable[..., T], *args: Any) -> T:
+    """Apply a write intent and commit it.
+
+    With ``WRITE_ACTOR`` enabled the intent goes to the process' writer task and
+    is committed together with concurrent intents; otherwise it runs in the
+    caller's session. On error the caller's transaction is rolled back.
+    """
+    if settings.write_actor_enabled:
+        return await write_actor.submit(fn, *args)
+    try:
+        result = await session.run_sync(fn, *args)
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    return result
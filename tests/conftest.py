@@ -0,0 +1,61 @@
+import os
+import tempfile
+from pathlib import Path
+
+# настройки читаются при импорте app.config: окружение задаётся до него
+_DB_DIR = Path(tempfile.mkdtemp(prefix="truck-queue-tests-"))
+_DB_PATH = _DB_DIR / "queue.db"
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_PATH}"
+os.environ["EVENT_SOCKET_DIR"] = ""
+os.environ["TRUCK_BOT_TOKEN"] = "1:test"
+os.environ["ELEVATOR_BOT_TOKEN"] = "2:test"
+os.environ["NOTIFICATION_OFFSETS_MINUTES"] = "60,1440"
+os.environ["QUEUE_POSITION_MIN_SHIFT"] = "2"
+os.environ["REMINDER_COALESCE_SECONDS"] = "60"
+
+import asyncio  # noqa: E402
+from datetime import time  # noqa: E402
+
+import pytest  # noqa: E402
+
+from app.db import SessionLocal, async_engine, engine, init_db  # noqa: E402
+from app.models import Driver, Elevator  # noqa: E402
+from app.queue_engine import queue_engine  # noqa: E402
+from app.slot_cache import slot_cache  # noqa: E402
+
+
+@pytest.fixture
+def session():
+    """Session on a fresh database file."""
+    engine.dispose()
+    # соединения aiosqlite привязаны к циклу прошлого asyncio.run и к удалённому файлу
+    asyncio.run(async_engine.dispose())
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{_DB_PATH}{suffix}").unlink(missing_ok=True)
+    queue_engine.clear()
+    slot_cache.clear()
+    init_db()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        SessionLocal.remove()
+
+
+@pytest.fixture
+def elevator(session):
+    elevator = Elevator(name="Элеватор 1", work_day_start=time(6), work_day_end=time(22), bookable_slots_per_day=16)
+    session.add(elevator)
+    session.commit()
+    return elevator
+
+
+@pytest.fixture
+def make_driver(session):
+    def make(telegram_user_id: int) -> Driver:
+        driver = Driver(telegram_user_id=telegram_user_id)
+        session.add(driver)
+        session.flush()
+        return driver
+
+    return make
@@ -0,0 +1,34 @@
+import csv
+import io
+from datetime import date, time, timedelta
+
+from app.models import Booking, BookingStatus
+from app.utils.csv_export import export_query, write_bookings_csv
+from app.utils.time_utils import combine_date_time
+
+SPEC_COLUMNS = ["license_plate", "slot_start", "slot_end", "is_late", "unloaded"]
+
+
+def test_spec_columns_come_first(session, elevator, make_driver):
+    day = date.today()
+    slot_start = combine_date_time(day, time(9))
+    session.add(
+        Booking(
+            driver_id=make_driver(100).id,
+            elevator_id=elevator.id,
+            license_plate="А001АА",
+            date=day,
+            slot_start=slot_start,
+            slot_end=slot_start + timedelta(hours=1),
+            status=BookingStatus.UNLOADED,
+            arrived_at=slot_start + timedelta(minutes=5),
+            unloaded_at=slot_start + timedelta(minutes=40),
+        )
+    )
+    session.commit()
+    out = io.BytesIO()
+    assert write_bookings_csv(session, export_query(day, day), out) == 1
+    header, row = list(csv.reader(io.StringIO(out.getvalue().decode("utf-8"))))
+    assert header[:5] == SPEC_COLUMNS
+    assert row[:5] == ["А001АА", slot_start.isoformat(), (slot_start + timedelta(hours=1)).isoformat(), "True", "True"]
+    assert dict(zip(header, row))["status"] == BookingStatus.UNLOADED
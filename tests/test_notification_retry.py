@@ -0,0 +1,54 @@
+import asyncio
+import sqlite3
+from datetime import date, time, timedelta
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.models import Booking, BookingStatus, Notification
+from app.notification_service import logic
+from app.notification_service.scheduler import ReminderScheduler
+from app.utils.time_utils import VirtualClock, combine_date_time
+
+
+class Sink:
+    def __init__(self) -> None:
+        self.messages: list[tuple[int, str]] = []
+
+    def enqueue(self, chat_id: int, text: str, **kwargs) -> None:
+        self.messages.append((chat_id, text))
+
+
+def test_reminder_is_sent_after_failed_pass(session, elevator, make_driver, monkeypatch):
+    now = combine_date_time(date.today(), time(12))
+    with VirtualClock(now):
+        driver = make_driver(100)
+        slot_start = now + timedelta(minutes=30)
+        session.add(
+            Booking(
+                driver_id=driver.id,
+                elevator_id=elevator.id,
+                license_plate="А001АА",
+                date=slot_start.date(),
+                slot_start=slot_start,
+                slot_end=slot_start + timedelta(hours=1),
+                status=BookingStatus.CONFIRMED,
+            )
+        )
+        session.commit()
+        scheduler = ReminderScheduler()
+        scheduler.bootstrap(session)
+        outbound = Sink()
+
+        def locked(*args, **kwargs):
+            raise OperationalError("INSERT INTO notifications", {}, sqlite3.OperationalError("database is locked"))
+
+        monkeypatch.setattr(logic, "claim", locked)
+        with pytest.raises(OperationalError):
+            asyncio.run(logic.process_notifications(session, outbound, scheduler))
+        assert len(scheduler) == 1
+
+        monkeypatch.undo()
+        assert asyncio.run(logic.process_notifications(session, outbound, scheduler)) == 1
+        assert [chat_id for chat_id, _ in outbound.messages] == [100]
+        assert session.query(Notification).count() == 1
@@ -0,0 +1,78 @@
+from datetime import date, time, timedelta
+
+from sqlalchemy import select
+
+from app.elevator_bot.handlers import _cancel_booking, _unload
+from app.models import Booking, BookingStatus, OutboxMessage
+from app.queue_logic import recalc_queue
+from app.utils.time_utils import combine_date_time
+
+
+def _positions(session) -> dict[int, str]:
+    rows = session.execute(
+        select(OutboxMessage.chat_id, OutboxMessage.text).where(OutboxMessage.dedup_key.startswith("position:"))
+    )
+    return dict(rows.all())
+
+
+def _queue(session, elevator, make_driver, count: int) -> list[Booking]:
+    day = date.today()
+    bookings = []
+    for number in range(count):
+        slot_start = combine_date_time(day, time(9 + number))
+        bookings.append(
+            Booking(
+                driver_id=make_driver(100 + number).id,
+                elevator_id=elevator.id,
+                license_plate=f"А00{number}АА",
+                date=day,
+                slot_start=slot_start,
+                slot_end=slot_start + timedelta(hours=1),
+                status=BookingStatus.CONFIRMED,
+            )
+        )
+    session.add_all(bookings)
+    session.flush()
+    recalc_queue(session, elevator.id, day)
+    session.commit()
+    return bookings
+
+
+def test_positions_skip_unloaded_trucks(session, elevator, make_driver):
+    bookings = _queue(session, elevator, make_driver, 5)
+    assert [booking.last_notified_queue_index for booking in bookings] == [0, 1, 2, 3, 4]
+    assert _positions(session) == {}
+
+    _unload(session, bookings[0].id)
+    session.commit()
+    # queue_index не изменился, но второй стал первым; остальных сдвиг на одно место гасит порог
+    messages = _positions(session)
+    assert list(messages) == [101]
+    assert "вы 1-й в очереди (были 2-м" in messages[101]
+    assert "Вы следующий" in messages[101]
+
+    _unload(session, bookings[1].id)
+    session.commit()
+    messages = _positions(session)
+    assert "вы 1-й в очереди (были 3-м" in messages[102]
+    assert "Вы следующий" in messages[102]
+    assert "вы 2-й в очереди (были 4-м" in messages[103]
+    assert "Вы следующий" not in messages[103]
+    assert "вы 3-й в очереди (были 5-м" in messages[104]
+
+
+def test_next_after_cancel_behind_unloaded_trucks(session, elevator, make_driver):
+    bookings = _queue(session, elevator, make_driver, 4)
+    for booking in bookings[:2]:
+        booking.status = BookingStatus.UNLOADED
+    recalc_queue(session, elevator.id, date.today())
+    session.commit()
+    session.execute(OutboxMessage.__table__.delete())
+    session.commit()
+
+    _cancel_booking(session, bookings[2].id)
+    session.commit()
+    # сырой queue_index 3 -> 2 — сдвиг на одно место, но среди активных это первое место
+    assert bookings[3].queue_index == 2
+    assert "вы 1-й в очереди (были 2-м" in _positions(session)[103]
+    assert "Вы следующий" in _positions(session)[103]
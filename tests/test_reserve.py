@@ -0,0 +1,44 @@
+import asyncio
+from datetime import date, time, timedelta
+
+import pytest
+
+from app.db import AsyncSessionLocal
+from app.models import Booking, BookingStatus
+from app.truck_bot.handlers import SlotTaken, _reserve
+from app.utils.time_utils import combine_date_time
+
+
+def _booking(elevator, slot_start, plate):
+    return Booking(
+        elevator_id=elevator.id,
+        license_plate=plate,
+        date=slot_start.date(),
+        slot_start=slot_start,
+        slot_end=slot_start + timedelta(hours=1),
+        status=BookingStatus.CONFIRMED,
+    )
+
+
+def test_taken_slot_raises_slot_taken(session, elevator):
+    slot_start = combine_date_time(date.today() + timedelta(days=1), time(9))
+    _reserve(session, _booking(elevator, slot_start, "А001АА"), 100, None)
+    session.commit()
+
+    # конкурент: своя сессия, слот уже закоммичен первой бронью
+    async def confirm():
+        async with AsyncSessionLocal() as other:
+            return await other.run_sync(_reserve, _booking(elevator, slot_start, "В002ВВ"), 200, None)
+
+    with pytest.raises(SlotTaken):
+        asyncio.run(confirm())
+
+
+def test_cancelled_booking_frees_the_slot(session, elevator):
+    slot_start = combine_date_time(date.today() + timedelta(days=1), time(10))
+    first = _reserve(session, _booking(elevator, slot_start, "А001АА"), 100, None)
+    first.status = BookingStatus.CANCELLED
+    session.commit()
+    second = _reserve(session, _booking(elevator, slot_start, "В002ВВ"), 200, None)
+    session.commit()
+    assert second.id != first.id
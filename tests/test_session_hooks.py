@@ -0,0 +1,44 @@
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+from sqlalchemy import func, select
+
+from app.models import BookingEvent, DailyElevatorStats, QueueDay
+
+# пишет бронь в отдельном процессе, который знает только db и models
+WRITER = textwrap.dedent(
+    """
+    from datetime import date, datetime, time, timedelta
+
+    from app.db import SessionLocal, init_db
+    from app.models import Booking, Driver, Elevator
+
+    init_db()
+    session = SessionLocal()
+    elevator = Elevator(name="Элеватор 1", work_day_start=time(6), work_day_end=time(22), bookable_slots_per_day=16)
+    driver = Driver(telegram_user_id=100)
+    session.add_all([elevator, driver])
+    session.flush()
+    start = datetime.combine(date.today(), time(9))
+    session.add(
+        Booking(
+            driver_id=driver.id,
+            elevator_id=elevator.id,
+            license_plate="А001АА",
+            date=start.date(),
+            slot_start=start,
+            slot_end=start + timedelta(hours=1),
+        )
+    )
+    session.commit()
+    """
+)
+
+
+def test_init_db_installs_booking_hooks(session):
+    subprocess.run([sys.executable, "-c", WRITER], check=True, cwd=Path(__file__).parent.parent)
+    assert session.scalar(select(func.count()).select_from(BookingEvent)) == 1
+    assert session.scalar(select(DailyElevatorStats.booked)) == 1
+    assert session.scalar(select(QueueDay.version)) == 1